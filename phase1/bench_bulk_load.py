@@ -0,0 +1,77 @@
+# Benchmark: bulk_load.append (+ load PRAGMA session) vs the previous DataFrame.to_sql append_sql,
+# on a synthetic SRC_Holdings frame shaped like the compiler output (date objects, floats, strings, NaN).
+#   python bench_bulk_load.py --rows 5000000
+# Each variant loads into its own fresh database built from phase1_schema_ddl.sql (in --dir, default temp).
+
+import argparse, sqlite3, tempfile, time
+from datetime import date, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import bulk_load as bl
+
+HERE = Path(__file__).resolve().parent
+
+def synthetic_holdings(rows: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = np.array([date(2020, 1, 1) + timedelta(days=i) for i in range(2000)], dtype=object)
+    qty = rng.normal(0, 1e5, rows).round(4)
+    qty[rng.random(rows) < 0.02] = np.nan
+    return pd.DataFrame({
+        "portfolio_nk": pd.Series(rng.integers(1, 500, rows)).map("P{:05d}".format),
+        "value_date": days[rng.integers(0, len(days), rows)],
+        "security_nk": pd.Series(rng.integers(1, 20000, rows)).map("CH{:010d}".format),
+        "position_id": pd.Series(np.arange(rows)).map("POS{:08d}".format),
+        "security_name": "Synthetic Security AG",
+        "qty_raw": qty,
+        "price_raw": rng.uniform(1, 500, rows).round(6),
+        "native_ccy": np.array(["CHF", "EUR", "USD"], dtype=object)[rng.integers(0, 3, rows)],
+        "load_batch_id": 1,
+    })
+
+def fresh_db(path: Path) -> sqlite3.Connection:
+    if path.exists():
+        path.unlink()
+    conn = sqlite3.connect(path)
+    conn.executescript((HERE / "phase1_schema_ddl.sql").read_text(encoding="utf-8"))
+    return conn
+
+def legacy_append_sql(conn, table: str, df: pd.DataFrame) -> int:
+    # append_sql as it was before bulk_load (kept here as the baseline)
+    cols = set(r[1] for r in conn.execute(f"PRAGMA table_info({table})"))
+    df = df[[c for c in df.columns if c in cols]]
+    if df.empty:
+        return 0
+    df.to_sql(table, conn, if_exists="append", index=False)
+    return len(df)
+
+def run(label: str, db: Path, load, df: pd.DataFrame, chunk: int) -> float:
+    conn = fresh_db(db)
+    t = time.perf_counter()
+    n = load(conn, df, chunk)
+    conn.commit()
+    dt = time.perf_counter() - t
+    got = conn.execute("SELECT COUNT(*) FROM SRC_Holdings").fetchone()[0]
+    conn.close()
+    print(f"{label:10s} {n:>10,d} rows {dt:8.2f}s {n / dt:14,.0f} rows/s  (table: {got:,d})")
+    return dt
+
+def load_legacy(conn, df, chunk):
+    return sum(legacy_append_sql(conn, "SRC_Holdings", df.iloc[i:i + chunk]) for i in range(0, len(df), chunk))
+
+def load_bulk(conn, df, chunk):
+    with bl.session(conn):
+        return sum(bl.append(conn, "SRC_Holdings", df.iloc[i:i + chunk]) for i in range(0, len(df), chunk))
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=1000000)
+    p.add_argument("--chunk", type=int, default=200000, help="rows per append call (the compiler's streaming chunksize)")
+    p.add_argument("--dir", default=None, help="folder for the scratch databases (default: system temp)")
+    args = p.parse_args()
+
+    df = synthetic_holdings(args.rows)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        t_old = run("to_sql", Path(tmp) / "legacy.db", load_legacy, df, args.chunk)
+        t_new = run("bulk_load", Path(tmp) / "bulk.db", load_bulk, df, args.chunk)
+    print(f"speedup: {t_old / t_new:.1f}x")
@@ -0,0 +1,214 @@
+# End-to-end benchmark of Moves 1-5 on synthetic sources (make_synthetic.py): wall time per Move and per
+# instrumented stage (run_metrics), one line per run appended to a history file, and a regression check
+# against a baseline run of the same scale.
+#   python bench_pipeline.py --rows 1000000                  # run, compare with the baseline, exit 1 on regression
+#   python bench_pipeline.py --rows 1000000 --save-baseline  # run and mark this run as the baseline
+#   python bench_pipeline.py --history                       # list the recorded runs
+#
+# Everything runs in --work (default ..\phase1_bench): data\source is generated once per (rows, seed, options)
+# and reused; the database, snapshot store and compiler profiles are recreated on every run so runs compare.
+# The Moves are the real entry points with their module globals pointed at the work folder:
+#   Move-1 load_phase1.main + migrate_sqlite_schema_all   Move-2 load_src_phase1.load_all   Move-3 load_cdm_phase1.refresh
+#   Move-4 snapshot_phase1.create   Move-5 source_compiler.run_compiler(full=True) (reloads what Move-2 loaded)
+# Baseline: --baseline RUN_ID, else the latest run saved with --save-baseline at the same rows/seed, else the
+# previous run at the same rows/seed. A Move or stage regresses when it is slower than the baseline by more
+# than --threshold (and by more than --min-seconds, so sub-second stages do not flap).
+
+import argparse, contextlib, io, json, platform, shutil, sqlite3, subprocess, sys, time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+HERE = Path(__file__).resolve().parent
+sys.path.append(str(HERE / "source-compiler" / "src"))
+import make_synthetic as ms
+import run_metrics as rm
+import fx_engine as fx
+import load_phase1 as l1
+import migrate_sqlite_schema_all as mig
+import load_src_phase1 as ls
+import load_cdm_phase1 as lc
+import snapshot_phase1 as sn
+import source_compiler as sc
+
+BASE    = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+WORK    = BASE.parent / "phase1_bench"
+HISTORY = BASE / r"reports\bench\pipeline_history.jsonl"
+CONFIG  = BASE / r"source-compiler\config\source_generic.yaml"
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+def prepare_sources(work: Path, rows: int, seed: int, serial_rate: float, euro: list) -> tuple:
+    # regenerate only when the requested data differs from what is on disk
+    src = work / "data" / "source"
+    spec = {"rows": rows, "seed": seed, "serial_rate": serial_rate, "euro": sorted(euro)}
+    stamp = work / "synthetic.json"
+    if stamp.exists() and json.loads(stamp.read_text(encoding="utf-8")).get("spec") == spec and src.exists():
+        return json.loads(stamp.read_text(encoding="utf-8"))["counts"], 0.0
+    shutil.rmtree(src, ignore_errors=True)
+    t0 = time.perf_counter()
+    counts = ms.generate(src, rows, seed, serial_rate, euro)
+    stamp.write_text(json.dumps({"spec": spec, "counts": counts}, indent=1), encoding="utf-8")
+    return counts, time.perf_counter() - t0
+
+def point_modules(work: Path, config: Path) -> Path:
+    # module globals -> work folder (the same globals the scripts read at run time)
+    src = work / "data" / "source"
+    db = work / "phase1.db"
+    for p in [db, db.with_name(db.name + "-wal"), db.with_name(db.name + "-shm")]:
+        p.unlink(missing_ok=True)
+    ls.files = {name: src / Path(p).relative_to(ls.SRC).as_posix().replace("\\", "/") for name, p in ls.files.items()}
+    ls.BASE, ls.SRC, ls.DB = work, src, db
+    sc.BASE, sc.DB = work, db
+    sn.BASE, sn.DB, sn.STORE = work, db, work / "snapshots"
+    shutil.rmtree(sn.STORE, ignore_errors=True)
+    fx.PARAMS, fx.RATES = src / "ref_specs" / "Parameters.csv", src / "fx"
+    # compiler config copy in the work folder: its learned profiles start empty and stay out of the real one
+    cfg = sc.load_config(config)
+    for item in cfg.get("files", []):
+        item["path"] = item["path"].replace("\\", "/")
+    bench_cfg = work / "source_generic.bench.json"
+    bench_cfg.write_text(json.dumps(cfg, indent=1), encoding="utf-8")
+    sc.fp.profile_path(bench_cfg).unlink(missing_ok=True)
+    return db
+
+def run_moves(work: Path, db: Path, config: Path, workers: int, verbose: bool, run_id: str) -> tuple:
+    """Moves 1-5 in order; returns ({move: wall_s}, {move/stage: wall_s}, {table: rows})."""
+    def move1():
+        l1.main(str(db), str(HERE / "phase1_schema_ddl.sql"), str(HERE / "ref_transaction_map.csv"),
+                str(HERE / "ref_accounting_map.csv"), str(HERE / "ref_assetclass_map.csv"), str(fx.RATES))
+        with contextlib.closing(sqlite3.connect(db)) as conn:
+            mig.migrate(conn)  # CDM dimension tables/columns the DDL leaves to the migration
+        return {}
+    def move2():
+        with contextlib.closing(sqlite3.connect(db)) as conn:
+            return ls.load_all(conn, full=True)[0]
+    def move3():
+        with contextlib.closing(sqlite3.connect(db)) as conn:
+            with rm.stage("ensure_schema"):
+                lc.ensure_schema(conn)
+            lc.refresh(conn, full=True)
+            return {t: lc.count(conn.cursor(), t) for t in ("CDM_Holdings", "CDM_Transactions",
+                                                           "CDM_PortfolioDailyValues", "CDM_CashAgenda")}
+    def move4():
+        sn.create()
+        return {}
+    def move5():
+        return {f"compiler:{k}": v for k, v in sc.run_compiler(config, full=True, workers=workers).items()}
+
+    moves, stages, rows = {}, {}, {}
+    for name, fn in [("move1", move1), ("move2", move2), ("move3", move3), ("move4", move4), ("move5", move5)]:
+        rm.start(name, run_id, memory="off")
+        out = io.StringIO()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stdout if verbose else out):
+            rows.update(fn())
+        moves[name] = round(time.perf_counter() - t0, 3)
+        for r in rm.finish(out_dir=work / "metrics", quiet=True):
+            if r["parent"] is None:  # top-level stages (nested ones are inside their parent's time)
+                stages[f"{name}/{r['stage']}"] = r["wall_s"]
+        print(f"  {name}: {moves[name]:9.3f}s")
+    return moves, stages, rows
+
+def read_history(path: Path) -> list:
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+def pick_baseline(history: list, entry: dict, baseline_id: str = None) -> dict:
+    if baseline_id:
+        return next((h for h in history if h["run_id"] == baseline_id), None)
+    same = [h for h in history if h["rows"] == entry["rows"] and h["seed"] == entry["seed"]]
+    flagged = [h for h in same if h.get("baseline")]
+    return (flagged or same or [None])[-1]
+
+def compare(entry: dict, base: dict, threshold: float, min_seconds: float) -> pd.DataFrame:
+    cur = {"total": entry["total_s"], **entry["moves"], **entry["stages"]}
+    old = {"total": base["total_s"], **base["moves"], **base["stages"]}
+    df = pd.DataFrame([{"step": k, "baseline_s": old[k], "current_s": v} for k, v in cur.items() if k in old])
+    df["change"] = np.where(df["baseline_s"] > 0, df["current_s"] / df["baseline_s"].where(df["baseline_s"] > 0) - 1,
+                            np.nan)
+    df["regression"] = (df["change"] > threshold) & (df["current_s"] - df["baseline_s"] > min_seconds)
+    return df
+
+def run(args) -> int:
+    work = Path(args.work)
+    work.mkdir(parents=True, exist_ok=True)
+    euro = list(ms.BUILDERS) if args.euro == ["all"] else args.euro
+    print(f"Synthetic sources: {args.rows:,d} holdings rows, seed {args.seed} ({work})")
+    counts, gen_s = prepare_sources(work, args.rows, args.seed, args.serial_rate, euro)
+    print(f"  generated in {gen_s:.1f}s" if gen_s else "  reused (same rows/seed/options)")
+    db = point_modules(work, Path(args.config))
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    moves, stages, rows = run_moves(work, db, work / "source_generic.bench.json", args.workers, args.verbose, run_id)
+
+    entry = {"run_id": run_id, "commit": git_commit(), "rows": args.rows,
+             "seed": args.seed, "serial_rate": args.serial_rate, "euro": sorted(euro), "workers": args.workers,
+             "source_rows": counts, "rows_loaded": rows, "total_s": round(sum(moves.values()), 3), "moves": moves,
+             "stages": stages, "python": platform.python_version(), "pandas": pd.__version__,
+             "numpy": np.__version__, "sqlite": sqlite3.sqlite_version, "platform": platform.platform(),
+             "baseline": bool(args.save_baseline)}
+    history_path = Path(args.history_file)
+    history = read_history(history_path)
+    base = pick_baseline(history, entry, args.baseline)
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    print(f"Run {entry['run_id']} (commit {entry['commit']}): total {entry['total_s']:.3f}s -> {history_path}")
+
+    if args.save_baseline:
+        print(f"Saved as the baseline for {args.rows:,d} rows / seed {args.seed}.")
+    if base is None:
+        if not args.save_baseline:
+            print("No baseline at this scale yet" + (f" ({args.baseline} not found)" if args.baseline else "")
+                  + "; rerun with --save-baseline to set one.")
+        return 0
+    df = compare(entry, base, args.threshold, args.min_seconds)
+    print(f"Against baseline {base['run_id']} (commit {base.get('commit')}), threshold +{args.threshold:.0%}:")
+    show = df if args.verbose else df[df["step"].isin(["total", *moves]) | df["regression"]]
+    print(show.to_string(index=False, formatters={"change": "{:+.1%}".format}))
+    bad = df[df["regression"]]
+    if not bad.empty:
+        print(f"REGRESSION: {len(bad)} step(s) slower than the baseline by more than {args.threshold:.0%}:",
+              ", ".join(bad["step"]))
+        return 1
+    return 0
+
+def list_history(path: Path):
+    history = read_history(path)
+    if not history:
+        print(f"No runs in {path}")
+        return
+    df = pd.DataFrame([{"run_id": h["run_id"], "commit": h.get("commit"), "rows": h["rows"], "seed": h["seed"],
+                        "baseline": "*" if h.get("baseline") else "", "total_s": h["total_s"], **h["moves"]}
+                       for h in history])
+    print(df.to_string(index=False))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Moves 1-5 on synthetic data: timings, history, regression check")
+    ap.add_argument("--rows", type=int, default=100000, help="synthetic Holdings rows (other files scale with it)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--serial-rate", type=float, default=0.002, help="see make_synthetic.py")
+    ap.add_argument("--euro", nargs="*", default=["CashAgenda"], help="see make_synthetic.py")
+    ap.add_argument("--workers", type=int, default=1, help="Source Compiler worker processes (Move-5)")
+    ap.add_argument("--work", default=str(WORK), help="scratch folder (sources, db, snapshots, metrics)")
+    ap.add_argument("--config", default=str(CONFIG), help="Source Compiler config to benchmark")
+    ap.add_argument("--history-file", default=str(HISTORY))
+    ap.add_argument("--baseline", default=None, help="run_id to compare with")
+    ap.add_argument("--save-baseline", action="store_true", help="mark this run as the baseline for its scale")
+    ap.add_argument("--threshold", type=float, default=0.15, help="relative slowdown flagged as a regression")
+    ap.add_argument("--min-seconds", type=float, default=0.5, help="ignore slowdowns smaller than this")
+    ap.add_argument("--history", action="store_true", help="list the recorded runs and exit")
+    ap.add_argument("--verbose", action="store_true", help="show the Moves' own output and every stage")
+    args = ap.parse_args()
+
+    if args.history:
+        list_history(Path(args.history_file))
+        sys.exit(0)
+    sys.exit(run(args))
@@ -0,0 +1,123 @@
+# Bulk loading of DataFrames into the SQLite landing tables (shared by load_src_phase1.py and the Source Compiler).
+# Replaces DataFrame.to_sql on the hot path:
+#   - column -> native Python values once per column (None for NaN/NaT, ISO strings for dates), zipped into tuples
+#   - prepared multi-row INSERTs, executemany over slices of rows inside the caller's transaction
+#     (nothing is committed here: the ingestion manifest commits once per file)
+#   - inside session(): table schemas are cached and a load-time PRAGMA profile is applied, then restored
+#
+# Values are stored exactly as to_sql stored them (dates 'YYYY-MM-DD', timestamps 'YYYY-MM-DD HH:MM:SS',
+# booleans 0/1), so the SRC_* contents do not depend on which path wrote them.
+
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+# Load-time profile. WAL + synchronous=NORMAL still survives a process crash (only an OS crash can lose the
+# last commits, which the manifest then reloads); journal_mode is restored so phase1.db stays a single file.
+LOAD_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -262144,   # KiB (negative) = 256 MB page cache
+    "temp_store": "MEMORY",
+}
+SLICE_ROWS = 100000     # rows converted at a time (bounds the parameter memory of very large frames)
+ROWS_PER_INSERT = 50    # rows per INSERT ... VALUES (...),(...) statement: one VM step per 50 rows
+MAX_VARIABLES = 999     # SQLITE_MAX_VARIABLE_NUMBER of older builds
+
+_SESSIONS: Dict[int, dict] = {}  # id(conn) -> {table: [columns]} while a session is open
+
+def _pragma(conn, name: str):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+@contextmanager
+def session(conn, pragmas: Optional[dict] = None):
+    """Apply the load PRAGMA profile (LOAD_PRAGMAS updated with `pragmas`) and cache schemas; restore on exit."""
+    prof = dict(LOAD_PRAGMAS)
+    prof.update(pragmas or {})
+    conn.commit()  # journal_mode cannot change inside a transaction
+    saved = {k: _pragma(conn, k) for k in prof}
+    for k, v in prof.items():
+        conn.execute(f"PRAGMA {k}={v}")
+    _SESSIONS[id(conn)] = {}
+    try:
+        yield conn
+    finally:
+        _SESSIONS.pop(id(conn), None)
+        conn.commit()
+        for k, v in saved.items():
+            conn.execute(f"PRAGMA {k}={v}")
+
+def table_columns(conn, table: str) -> List[str]:
+    cache = _SESSIONS.get(id(conn))
+    if cache is not None and table in cache:
+        return cache[table]
+    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+    if cache is not None:
+        cache[table] = cols
+    return cols
+
+def _iso(v):
+    if isinstance(v, datetime):  # before date: datetime is a date subclass
+        return v.isoformat(" ")
+    if isinstance(v, date):
+        return v.isoformat()
+    return v.item() if isinstance(v, np.generic) else v
+
+def native_column(s: pd.Series) -> np.ndarray:
+    """Object array of sqlite3-native values (None, int, float, str) for one column."""
+    dt = s.dtype
+    if isinstance(dt, pd.api.extensions.ExtensionDtype) and not pd.api.types.is_datetime64_any_dtype(dt):
+        # nullable Int64/boolean/string: tolist() already yields Python scalars
+        out = np.array(s.astype(object).tolist(), dtype=object)
+        out[pd.isna(out)] = None
+        return out
+    if pd.api.types.is_datetime64_any_dtype(dt):
+        if getattr(s.dt, "tz", None) is not None:
+            s = s.dt.tz_localize(None)
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if (s.dt.microsecond.fillna(0) != 0).any() else "%Y-%m-%d %H:%M:%S"
+        return s.dt.strftime(fmt).to_numpy(dtype=object, na_value=None)
+    if dt.kind == "b":
+        return s.to_numpy(dtype=np.int64).astype(object)
+    if dt.kind in "iu":
+        return s.to_numpy().astype(object)
+    if dt.kind == "f":
+        a = s.to_numpy()
+        out = a.astype(object)
+        out[np.isnan(a)] = None
+        return out
+    # object: str / date / datetime / NaN mix
+    out = s.to_numpy(dtype=object, copy=True)
+    out[pd.isna(out)] = None
+    kind = pd.api.types.infer_dtype(out, skipna=True)
+    if kind in ("date", "datetime", "mixed"):
+        # a date column repeats a few thousand distinct days: format each once
+        codes, uniq = pd.factorize(out)
+        out = np.array([_iso(v) for v in uniq] + [None], dtype=object).take(codes)
+    elif kind not in ("string", "empty"):
+        out = np.array([v.item() if isinstance(v, np.generic) else v for v in out], dtype=object)
+    return out
+
+def append(conn, table: str, df: pd.DataFrame, slice_rows: int = SLICE_ROWS) -> int:
+    """Insert the columns of `df` that exist in `table`; returns the row count (0 when no column matches)."""
+    schema = set(table_columns(conn, table))
+    keep = [c for c in df.columns if c in schema]
+    if not keep or df.empty:
+        return 0
+    ncols = len(keep)
+    head = f"INSERT INTO {table} (" + ", ".join('"%s"' % c for c in keep) + ") VALUES "
+    row = "(" + ",".join("?" * ncols) + ")"
+    k = max(1, min(ROWS_PER_INSERT, MAX_VARIABLES // ncols))
+    multi = head + ",".join([row] * k)
+    for start in range(0, len(df), slice_rows):
+        part = df.iloc[start:start + slice_rows]
+        params = np.empty((len(part), ncols), dtype=object)
+        for j, c in enumerate(keep):
+            params[:, j] = native_column(part[c])
+        full = len(part) // k * k
+        if full:
+            conn.executemany(multi, params[:full].reshape(-1, k * ncols).tolist())
+        if full < len(part):
+            conn.executemany(head + row, params[full:].tolist())
+    return len(df)
@@ -0,0 +1,162 @@
+# Calendar dimension: SRC_GenericCalendar (three overlapping source calendars, appended per file) -> CDM_Calendar,
+# and an in-memory BusinessCalendar for whole-column date arithmetic.
+#
+# CDM_Calendar holds every day from the first to the last source date. A business day is a weekday listed by
+# at least one source calendar (weekend month-end valuation dates stay non-business; a weekday no source lists
+# is a holiday). Month/quarter/year ends are calendar period ends, the dates the sources report on.
+# BusinessCalendar keeps the calendar as int day numbers (days since 1970-01-01) with a cumulative business-day
+# count, so "next business day", "business days between" are O(1) index lookups and "period end on or before"
+# is one np.searchsorted -- over whole columns at once:
+#   cal = BusinessCalendar.from_db(conn)
+#   cal.next_business_day(df["trade_date"]); cal.business_days_between(df["trade_date"], df["settle_date"])
+#   cal.period_end(df["event_date"], "Q")
+#   python business_calendar.py [--db phase1.db]      (rebuild CDM_Calendar)
+
+import argparse, sqlite3
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import bulk_load as bl
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+
+MARKET = "GEN"
+PERIODS = {"M": "is_month_end", "Q": "is_quarter_end", "Y": "is_year_end"}
+
+def to_days(values) -> np.ndarray:
+    """Dates (ISO strings, date/datetime, datetime64 or day numbers) -> int64 day numbers; NaT -> NaT sentinel."""
+    a = np.asarray(values)
+    if a.dtype.kind in "iu":
+        return a.astype(np.int64)
+    if a.dtype.kind != "M":
+        codes, uniq = pd.factorize(a.astype(object))  # a date column repeats few distinct values: parse once
+        parsed = pd.to_datetime(pd.Series(uniq, dtype=object).astype(str).str[:10], errors="coerce", format="%Y-%m-%d")
+        a = np.append(parsed.to_numpy().astype("datetime64[D]"), np.datetime64("NaT", "D"))[codes]
+    return a.astype("datetime64[D]").astype(np.int64)
+
+NAT = np.datetime64("NaT", "D").astype(np.int64)
+
+def source_dates(conn) -> pd.Series:
+    # union of the source calendars, deduplicated (each file lands as its own batch)
+    df = pd.read_sql("SELECT DISTINCT cal_date FROM SRC_GenericCalendar WHERE cal_date IS NOT NULL", conn)
+    d = pd.to_datetime(df["cal_date"].astype(str).str[:10], errors="coerce", format="%Y-%m-%d").dropna()
+    return d.drop_duplicates().sort_values()
+
+def calendar_frame(listed: pd.Series) -> pd.DataFrame:
+    """One row per day from the first to the last listed date, with the CDM_Calendar flags and parts."""
+    if listed.empty:
+        return pd.DataFrame(columns=["cal_date", "market", "is_business_day", "is_month_end", "is_quarter_end",
+                                     "is_year_end", "day", "week", "month", "quarter", "year"])
+    d = pd.Series(pd.date_range(listed.iloc[0], listed.iloc[-1], freq="D"))
+    return pd.DataFrame({
+        "cal_date": d.dt.date,
+        "market": MARKET,
+        "is_business_day": (d.dt.weekday < 5) & d.isin(listed),
+        "is_month_end": d.dt.is_month_end,
+        "is_quarter_end": d.dt.is_quarter_end,
+        "is_year_end": d.dt.is_year_end,
+        "day": d.dt.day,
+        "week": d.dt.isocalendar().week.astype("int64").to_numpy(),
+        "month": d.dt.month,
+        "quarter": d.dt.quarter,
+        "year": d.dt.year,
+    })
+
+def build(conn) -> int:
+    """Rebuild CDM_Calendar from SRC_GenericCalendar (a few thousand rows); no commit."""
+    cal = calendar_frame(source_dates(conn))
+    conn.execute("DELETE FROM CDM_Calendar")
+    return bl.append(conn, "CDM_Calendar", cal)
+
+class BusinessCalendar:
+    """Sorted day-number arrays over a contiguous calendar: day i of the calendar is day number first + i."""
+
+    def __init__(self, days: np.ndarray, is_business_day: np.ndarray, period_flags: dict):
+        self.first = int(days[0]) if len(days) else 0
+        self.n = len(days)
+        if self.n and not np.array_equal(days, np.arange(self.first, self.first + self.n)):
+            raise ValueError("calendar days must be contiguous")
+        self.is_bd = np.asarray(is_business_day, dtype=bool)
+        self.cum_bd = np.cumsum(self.is_bd, dtype=np.int64)  # business days on or before day i
+        self.bdays = days[self.is_bd]                          # sorted business day numbers
+        self.ends = {k: days[np.asarray(v, dtype=bool)] for k, v in period_flags.items()}
+
+    @classmethod
+    def from_db(cls, conn, market: str = MARKET):
+        df = pd.read_sql("SELECT cal_date, is_business_day, is_month_end, is_quarter_end, is_year_end "
+                         "FROM CDM_Calendar WHERE market = ? ORDER BY cal_date", conn, params=(market,))
+        return cls.from_frame(df)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        flags = {k: df[c].fillna(0).astype(bool).to_numpy() for k, c in PERIODS.items()}
+        return cls(to_days(df["cal_date"]), df["is_business_day"].fillna(0).astype(bool).to_numpy(), flags)
+
+    def _bd_count(self, d: np.ndarray) -> np.ndarray:
+        # business days on or before d (0 before the calendar, all of them after it)
+        if not self.n:
+            return np.zeros(len(d), dtype=np.int64)
+        i = np.clip(d - self.first, -1, self.n - 1)
+        return np.where(i >= 0, self.cum_bd[np.maximum(i, 0)], 0)
+
+    def _pick(self, arr: np.ndarray, k: np.ndarray) -> np.ndarray:
+        ok = (k >= 0) & (k < len(arr))
+        out = np.full(len(k), NAT, dtype=np.int64)
+        out[ok] = arr[k[ok]]
+        return out.astype("datetime64[D]")
+
+    def is_business_day(self, dates) -> np.ndarray:
+        d = to_days(dates)
+        i = d - self.first
+        ok = (i >= 0) & (i < self.n) & (d != NAT)
+        out = np.zeros(len(d), dtype=bool)
+        out[ok] = self.is_bd[i[ok]]
+        return out
+
+    def next_business_day(self, dates, strict: bool = True) -> np.ndarray:
+        """First business day after each date (on or after with strict=False); NaT past the calendar."""
+        d = to_days(dates)
+        k = self._bd_count(d if strict else d - 1)
+        return self._pick(self.bdays, np.where(d == NAT, -1, k))
+
+    def previous_business_day(self, dates, strict: bool = True) -> np.ndarray:
+        d = to_days(dates)
+        k = self._bd_count(d - 1 if strict else d) - 1
+        return self._pick(self.bdays, np.where(d == NAT, -1, k))
+
+    def add_business_days(self, dates, n) -> np.ndarray:
+        """Roll back to a business day (if not one), then move n business days (n may be negative/an array)."""
+        d = to_days(dates)
+        k = self._bd_count(d) - 1 + np.asarray(n, dtype=np.int64)
+        return self._pick(self.bdays, np.where(d == NAT, -1, k))
+
+    def business_days_between(self, start, end) -> np.ndarray:
+        """Business days in (start, end] (negative when end < start); NaN where either date is missing."""
+        a, b = to_days(start), to_days(end)
+        out = (self._bd_count(b) - self._bd_count(a)).astype(float)
+        out[(a == NAT) | (b == NAT)] = np.nan
+        return out
+
+    def period_end(self, dates, freq: str = "M", business: bool = False) -> np.ndarray:
+        """Last month/quarter/year end (freq M/Q/Y) on or before each date; business=True rolls it back to
+        a business day. NaT before the first period end of the calendar."""
+        d = to_days(dates)
+        ends = self.ends[freq]
+        k = np.searchsorted(ends, d, side="right") - 1
+        out = self._pick(ends, np.where(d == NAT, -1, k))
+        return self.previous_business_day(out, strict=False) if business else out
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Rebuild CDM_Calendar from SRC_GenericCalendar")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    n = build(conn)
+    conn.commit()
+    cal = BusinessCalendar.from_db(conn)
+    conn.close()
+    print(f"CDM_Calendar: {n} days, {len(cal.bdays)} business days, "
+          f"{len(cal.ends['M'])} month ends" + (f" ({np.datetime64(cal.first, 'D')} .. "
+                                                f"{np.datetime64(cal.first + cal.n - 1, 'D')})" if n else ""))
@@ -0,0 +1,103 @@
+# Incremental-vs-full guard for the CDM build (load_cdm_phase1.py), on scratch copies of the db.
+# For each arrival order in ORDERS, the current batches of the listed SRC tables are held back (rows moved aside,
+# manifest status 'held'), the CDM is built in full, the batches are put back and the CDM refreshed incrementally;
+# every fact must then equal a full build of the same SRC content. Facts are compared by natural keys
+# (portfolio_nk / security_nk: dimension surrogate keys depend on the order the rows arrived in).
+# Exits 1 on a difference.
+#   python check_cdm_incremental.py --db phase1.db [--order holdings-last]
+
+import argparse, sqlite3, sys, tempfile
+from pathlib import Path
+import load_cdm_phase1 as cdm
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+
+# order -> SRC tables landing after the others
+ORDERS = {
+    "holdings-last": ["SRC_Holdings"],     # Movements before their Holdings: security_sk resolved later
+    "movements-last": ["SRC_Movements"],
+    "facts-last": ["SRC_DailyValues", "SRC_CashAgenda"],
+}
+NATURAL = {"portfolio_sk": ("CDM_Portfolio", "portfolio_nk"), "security_sk": ("CDM_SecurityMaster", "security_nk")}
+
+def copy_db(src: str, dst: Path):
+    a, b = sqlite3.connect(src), sqlite3.connect(dst)
+    a.backup(b)
+    a.close(), b.close()
+
+def hold_back(conn, tables):
+    for t in tables:
+        conn.execute(f"DROP TABLE IF EXISTS _held_{t}")
+        conn.execute(f"CREATE TABLE _held_{t} AS SELECT * FROM {t}")
+        conn.execute(f"DELETE FROM {t}")
+        conn.execute("UPDATE SRC_IngestManifest SET status='held' WHERE target_table=? AND status='current'", (t,))
+    conn.commit()
+
+def put_back(conn, tables):
+    for t in tables:
+        conn.execute(f"INSERT INTO {t} SELECT * FROM _held_{t}")
+        conn.execute(f"DROP TABLE _held_{t}")
+        conn.execute("UPDATE SRC_IngestManifest SET status='current' WHERE target_table=? AND status='held'", (t,))
+    conn.commit()
+
+def fact_select(conn, table: str, schema: str) -> tuple:
+    """(SELECT of the fact's rows without its own key, surrogate keys replaced by natural keys; column count)."""
+    cols, joins = [], []
+    for r in conn.execute(f"PRAGMA {schema}.table_info({table})"):
+        c, pk = r[1], r[5]
+        if pk:
+            continue
+        if c in NATURAL:
+            dim, nk = NATURAL[c]
+            joins.append(f"LEFT JOIN {schema}.{dim} {c}_d ON {c}_d.{c} = f.{c}")
+            cols.append(f"{c}_d.{nk}")
+        else:
+            cols.append(f"f.{c}")
+    return f"SELECT {', '.join(cols)} FROM {schema}.{table} f {' '.join(joins)}", len(cols)
+
+def compare(conn, table: str) -> tuple:
+    """(rows, rows only in the incremental build, rows only in the full build); duplicates count."""
+    (a, k), (b, _) = fact_select(conn, table, "main"), fact_select(conn, table, "ref")
+    # EXCEPT is a set operation: compare (row, copies) so a doubled row is a difference too
+    groups = ", ".join(str(i) for i in range(1, k + 1))
+    a, b = (f"SELECT *, COUNT(*) FROM ({q}) GROUP BY {groups}" for q in (a, b))
+    n = conn.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0]
+    return (n, conn.execute(f"SELECT COUNT(*) FROM ({a} EXCEPT {b})").fetchone()[0],
+            conn.execute(f"SELECT COUNT(*) FROM ({b} EXCEPT {a})").fetchone()[0])
+
+def main(db: str, orders) -> int:
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        ref = Path(tmp) / "full.db"
+        copy_db(db, ref)
+        conn = sqlite3.connect(ref)
+        cdm.ensure_schema(conn)
+        cdm.refresh(conn, full=True)
+        conn.close()
+        for order in orders:
+            inc = Path(tmp) / f"{order}.db"
+            copy_db(db, inc)
+            conn = sqlite3.connect(inc)
+            cdm.ensure_schema(conn)
+            hold_back(conn, ORDERS[order])
+            cdm.refresh(conn, full=True)
+            put_back(conn, ORDERS[order])
+            cdm.refresh(conn)
+            conn.execute("ATTACH ? AS ref", (str(ref),))
+            for f in cdm.FACTS:
+                n, only_inc, only_full = compare(conn, f["table"])
+                bad = only_inc or only_full
+                print(f"  {'FAIL' if bad else 'ok':4s} {order:15s} {f['table']:28s} {n} row(s)"
+                      + (f", {only_inc} only incremental, {only_full} only full" if bad else ""))
+                failed += bool(bad)
+            conn.close()
+    print(f"\n{failed} fact(s) differ from a full build" if failed else "\nIncremental builds equal the full build.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Check incremental CDM refreshes against a full build")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file (read only: scratch copies are used)")
+    ap.add_argument("--order", action="append", choices=sorted(ORDERS), help="arrival order (repeatable; default all)")
+    args = ap.parse_args()
+    sys.exit(main(args.db, args.order or list(ORDERS)))
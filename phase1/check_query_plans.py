@@ -0,0 +1,100 @@
+# Physical-design guard: EXPLAIN QUERY PLAN over the CDM build (load_cdm_phase1.py, its FX stage), the DQ
+# engine passes and the dashboard queries (query_service.py).
+# Exits 1 when a plan scans a large table (physical_design.LARGE_TABLES) without an index -- i.e. a missing
+# index or a join key the planner cannot use. Covering-index scans are accepted; a full CDM load may scan
+# its own SRC driving table. Plans are taken on an empty copy of the schema (no statistics), so the check
+# asks "can an index serve this?" the same way on a sample and on a production-size db; --with-stats
+# explains against the db itself with its ANALYZE statistics.
+#   python check_query_plans.py --db phase1.db [--with-stats]
+
+import argparse, re, sqlite3, sys
+from pathlib import Path
+import load_cdm_phase1 as cdm
+import physical_design as phys
+import dq_engine as dq
+import fx_engine as fx
+import query_service as qs
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+
+# FROM/JOIN <table> [AS] <alias>: plans name tables by alias
+ALIAS_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|JOIN|LEFT|INNER|CROSS|GROUP|ORDER)\b)(\w+))?",
+                      re.IGNORECASE)
+SCAN_RE = re.compile(r"SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(.*)")
+
+def statements() -> list:
+    # (label, sql, table a full scan is allowed on)
+    out = []
+    f = {k: cdm.batch_filter({1}) for k in cdm.DIM_FILTERS}
+    out.append(("CDM_Portfolio new keys", cdm.DIM_PORTFOLIO.format(**f), None))
+    out.append(("CDM_SecurityMaster new keys", cdm.DIM_SECURITY.format(**f), None))
+    for fact in cdm.FACTS:
+        delete, insert = cdm.partition_sql(fact)
+        out.append((f"{fact['table']} partition delete", delete, None))
+        out.append((f"{fact['table']} partition insert", insert, None))
+        out.append((f"{fact['table']} full load", fact["sql"].format(scope=""), fact["src"]))
+        out.append((f"{fact['src']} new-batch digest",
+                    f"SELECT * FROM {fact['src']} WHERE {cdm.batch_filter({1})}", None))
+        out.append((f"{fact['table']} FX new rows", fx.new_rows_sql(fact["table"]).replace("?", "0"), None))
+        out.append((f"{fact['table']} FX restated rows",
+                    fx.restated_sql(fact["table"], "2000-01-01").replace("?", "0"), None))
+    out.append(("CDM_Transactions new-holdings partitions", cdm.RESOLVE_NEW.format(batches=cdm.batch_filter({1})), None))
+    out.append(("CDM_Transactions retired-holdings partitions", cdm.RESOLVE_GONE.format(batches="1"), None))
+    # a DQ pass reads its table once by design; its batch-key probe must not
+    for t in dq.TABLES:
+        out.append((f"DQ {t} pass", dq.pass_sql(t), t))
+        if t.startswith("SRC_"):
+            out.append((f"DQ {t} batch key", f"SELECT 1 FROM {t} WHERE load_batch_id IS NULL LIMIT 1", None))
+    for name, (sql, _) in qs.QUERIES.items():
+        out.append((f"query_service {name}", re.sub(r":\w+", "'0'", sql), None))
+    return out
+
+def full_scans(conn, sql: str, allowed=None) -> list:
+    names = {}
+    for t, a in ALIAS_RE.findall(sql):
+        names[t] = t
+        if a:
+            names[a] = t
+    bad = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+        m = SCAN_RE.match(row[-1])
+        if not m or "INDEX" in m.group(3):
+            continue
+        table = names.get(m.group(1), m.group(1))
+        if table in phys.LARGE_TABLES and table != allowed:
+            bad.append(row[-1])
+    return bad
+
+def schema_copy(conn) -> sqlite3.Connection:
+    mem = sqlite3.connect(":memory:")
+    for (sql,) in conn.execute("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+                               "ORDER BY type = 'index'"):
+        mem.execute(sql)
+    return mem
+
+def main(db: str, with_stats: bool = False) -> int:
+    conn = sqlite3.connect(db)
+    if not with_stats:
+        src, conn = conn, schema_copy(conn)
+        src.close()
+    conn.execute(cdm.PARTS_DDL)
+    failed = 0
+    for label, sql, allowed in statements():
+        try:
+            bad = full_scans(conn, sql, allowed)
+        except sqlite3.OperationalError as e:
+            print(f"  SKIP {label:45s} ({e})")
+            continue
+        print(f"  {'FAIL' if bad else 'ok':4s} {label:45s} {'; '.join(bad)}")
+        failed += bool(bad)
+    conn.close()
+    print(f"\n{failed} statement(s) with full scans of large tables" if failed else "\nNo full scans of large tables.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Fail on full-table scans in the CDM build / DQ query plans")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    ap.add_argument("--with-stats", action="store_true", help="explain against the db and its ANALYZE statistics")
+    args = ap.parse_args()
+    sys.exit(main(args.db, args.with_stats))
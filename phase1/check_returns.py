@@ -0,0 +1,62 @@
+# MWR-vs-TWR guard for returns_engine.py: without external flows the money-weighted and the time-weighted
+# return of a window are the same number, so every no-flow ITD window must give mwr_period == r_itd.
+# Runs on synthetic portfolios (value_start delivered / missing on the first day / missing everywhere) and on
+# the no-flow portfolios of the db (recomputed from CDM_PortfolioDailyValues, nothing is written).
+# A delivered value_start that differs from the previous value_end (a gap the TWR links over) is reported too.
+# Exits 1 on a difference.
+#   python check_returns.py --db phase1.db [--tol 1e-6]
+
+import argparse, sqlite3, sys
+from pathlib import Path
+import numpy as np
+import returns_engine as ret
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+
+def synthetic(days: int = 400, seed: int = 7) -> dict:
+    # portfolios 1-3: the same random walk without flows; 1 delivers value_start on every day, 2 from the second
+    # day on, 3 never
+    rng = np.random.default_rng(seed)
+    end = 1e6 * np.cumprod(1.0 + rng.normal(0.0003, 0.01, days))
+    start = np.concatenate([[1e6], end[:-1]])
+    n = 3 * days
+    a = {c: np.zeros(n) for c in ret.VALUE_COLS}
+    a["adj_inflow"][:] = a["avg_capital"][:] = np.nan
+    a["value_start"] = np.concatenate([start, np.r_[np.nan, start[1:]], np.full(days, np.nan)])
+    a["value_end"] = np.tile(end, 3)
+    a["portfolio_sk"] = np.repeat(np.arange(1, 4), days)
+    a["date"] = np.tile(np.datetime64("2024-01-01") + np.arange(days), 3)
+    return a
+
+def itd_gaps(a: dict) -> list:
+    """(portfolio_sk, start, end, mwr_period, r_itd) of the ITD windows without flows."""
+    daily, mwr = ret.compute(a)
+    flows = np.nan_to_num(a["inflow"]) - np.abs(np.nan_to_num(a["outflow"]))
+    with_flows = set(a["portfolio_sk"][flows != 0].tolist())
+    itd = mwr[(mwr["period"] == "ITD") & ~mwr["portfolio_sk"].isin(with_flows)]
+    m = itd.merge(daily, left_on=["portfolio_sk", "end_date"], right_on=["portfolio_sk", "value_date"])
+    return list(m[["portfolio_sk", "start_date", "end_date", "mwr_period", "r_itd"]].itertuples(index=False))
+
+def main(db: str, tol: float) -> int:
+    conn = sqlite3.connect(db)
+    runs = [("synthetic", synthetic()), ("db", ret.load_values(conn))]
+    conn.close()
+    failed = checked = 0
+    for source, a in runs:
+        for p, start, end, mwr, twr in itd_gaps(a):
+            bad = not abs(mwr - twr) <= tol
+            print(f"  {'FAIL' if bad else 'ok':4s} {source:9s} portfolio {p:<6} {start}..{end}  "
+                  f"MWR {mwr:.6%}  TWR {twr:.6%}")
+            failed += bad
+            checked += 1
+    print(f"\n{failed} of {checked} no-flow ITD window(s) with MWR != TWR" if failed
+          else f"\n{checked} no-flow ITD window(s): MWR equals TWR.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Check that ITD MWR equals TWR on portfolios without flows")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file (read only)")
+    ap.add_argument("--tol", type=float, default=1e-6, help="largest accepted |MWR - TWR|")
+    args = ap.parse_args()
+    sys.exit(main(args.db, args.tol))
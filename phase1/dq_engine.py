@@ -0,0 +1,172 @@
+# Data-quality metrics for report_dq_phase1.py: one aggregate pass per table instead of one query per check.
+# Each pass returns the row count, null / null-or-blank counts per column, duplicate-key groups and date
+# ranges together; a table with a duplicate key is grouped on it once and the metrics are summed over the
+# groups. CDM_PortfolioDailyValues also yields its by-date / by-portfolio distributions from the same pass.
+#
+# Results are cached in DQ_MetricCache under the table's load state: the current SRC_IngestManifest batches
+# for SRC_* tables, and the SRC batches applied by load_cdm_phase1.py (+ REF dependencies and the insert
+# sequence) for CDM facts. A table whose state did not move since the last report is not read again.
+
+import json, sqlite3
+from datetime import datetime
+from typing import Optional
+import run_metrics as rm
+
+CACHE_DDL = """
+CREATE TABLE IF NOT EXISTS DQ_MetricCache (
+  table_name VARCHAR(64) PRIMARY KEY,
+  batch_key TEXT,
+  metrics TEXT,
+  computed_at TIMESTAMP
+)
+"""
+
+# null_or_blank / null: columns counted; dates: MIN/MAX columns; dup_key: duplicate-check key, in the column
+# order of the table's dupkey index so the grouping streams off that (covering) index without a sort.
+# blank_as_null: key column whose NULL and '' count as the same value (the old check's COALESCE(col,'')).
+# The sk columns' COALESCE(sk,-1) needs no such handling: AUTOINCREMENT surrogate keys are never -1.
+TABLES = {
+    "SRC_Holdings":        {"null_or_blank": ["portfolio_nk"], "null": ["value_date"]},
+    "SRC_Movements":       {"null_or_blank": ["portfolio_nk"], "null": ["trade_date"]},
+    "SRC_DailyValues":     {"null_or_blank": ["portfolio_nk"], "null": ["value_date"]},
+    "SRC_CashAgenda":      {"null_or_blank": ["portfolio_nk"], "null": ["event_date"]},
+    "SRC_GenericCalendar": {},
+    "CDM_Portfolio":       {},
+    "CDM_SecurityMaster":  {},
+    "CDM_Holdings": {
+        "null": ["portfolio_sk", "security_sk"], "dates": ["value_date"],
+        "dup_key": ["portfolio_sk", "security_sk", "value_date", "asof_datetime"], "blank_as_null": "asof_datetime"},
+    "CDM_PortfolioDailyValues": {
+        "null": ["portfolio_sk"], "dates": ["value_date"], "dup_key": ["portfolio_sk", "value_date"],
+        "distribution": True},
+    "CDM_Transactions": {
+        "null": ["portfolio_sk", "security_sk"], "dates": ["trade_date", "settle_date"],
+        "dup_key": ["portfolio_sk", "trade_id"]},
+    "CDM_CashAgenda": {
+        "null": ["portfolio_sk", "security_sk"], "dates": ["event_date"],
+        "dup_key": ["portfolio_sk", "security_sk", "event_date", "cash_type"], "blank_as_null": "cash_type"},
+}
+CDM_FACTS = ["CDM_Holdings", "CDM_PortfolioDailyValues", "CDM_Transactions", "CDM_CashAgenda"]
+FETCH_ROWS = 500000
+
+def _measures(spec: dict) -> list:
+    # (name, aggregate over rows, how groups combine it)
+    m = [("rows", "COUNT(*)", "SUM")]
+    m += [(f"null_or_blank:{c}", f"SUM({c} IS NULL OR TRIM(COALESCE({c},''))='')", "SUM") for c in spec.get("null_or_blank", [])]
+    m += [(f"null:{c}", f"SUM({c} IS NULL)", "SUM") for c in spec.get("null", [])]
+    for d in spec.get("dates", []):
+        m += [(f"min:{d}", f"MIN({d})", "MIN"), (f"max:{d}", f"MAX({d})", "MAX")]
+    return m
+
+def pass_sql(table: str) -> str:
+    """The single statement that computes every metric of `table` (distribution tables: the grouped rows)."""
+    spec = TABLES[table]
+    m = _measures(spec)
+    key = spec.get("dup_key")
+    if not key:
+        return f"SELECT {', '.join(f'{agg} AS m{i}' for i, (_, agg, _) in enumerate(m))} FROM {table}"
+    inner = ", ".join(f"{agg} AS m{i}" for i, (_, agg, _) in enumerate(m))
+    groups = f"SELECT {', '.join(key)}, {inner} FROM {table} GROUP BY {', '.join(key)}"
+    if spec.get("distribution"):
+        # one row per (portfolio_sk, value_date) group, with its portfolio_nk for the by-portfolio output
+        return f"SELECT g.*, p.portfolio_nk FROM ({groups}) g LEFT JOIN CDM_Portfolio p ON p.portfolio_sk = g.portfolio_sk"
+    outer = ", ".join(f"{comb}(m{i})" for i, (_, _, comb) in enumerate(m))
+    dup = "SUM(m0 > 1)"
+    blank = spec.get("blank_as_null")
+    if blank:
+        # groups keyed NULL and '' on the blank column are merged before they are judged
+        nullish = f"({blank} IS NULL OR {blank} = '')"
+        prefix = ", ".join(k for k in key if k != blank)
+        dup = (f"SUM(CASE WHEN {nullish} THEN 0 ELSE m0 > 1 END) + (SELECT COUNT(*) FROM "
+               f"(SELECT SUM(m0) AS c FROM g WHERE {nullish} GROUP BY {prefix}) WHERE c > 1)")
+    return f"WITH g AS ({groups}) SELECT COUNT(*), {dup}, {outer} FROM g"
+
+def _zero(name: str, v):
+    # SUM over no rows is NULL; counts report 0 like COUNT(*) did
+    return (v or 0) if not name.startswith(("min:", "max:")) else v
+
+def compute(conn, table: str) -> dict:
+    spec = TABLES[table]
+    m = _measures(spec)
+    if spec.get("distribution"):
+        return _compute_distribution(conn, table, m)
+    row = conn.execute(pass_sql(table)).fetchone()
+    if spec.get("dup_key"):
+        dup, row = row[1], row[2:]
+    out = {name: _zero(name, v) for (name, _, _), v in zip(m, row)}
+    if spec.get("dup_key"):
+        out["dup_groups"] = dup or 0
+    return out
+
+def _compute_distribution(conn, table: str, m: list) -> dict:
+    # grouped rows streamed in fetchmany() slices: bounded memory, still one pass over the table
+    out = {name: None for name, _, _ in m}
+    for name in out:
+        if not name.startswith(("min:", "max:")):
+            out[name] = 0
+    out["dup_groups"] = 0
+    by_date, by_port = {}, {}
+    cur = conn.execute(pass_sql(table))
+    while True:
+        rows = cur.fetchmany(FETCH_ROWS)
+        if not rows:
+            break
+        for sk, vdate, *vals, nk in rows:
+            c = vals[0]
+            out["dup_groups"] += c > 1
+            by_date[vdate] = by_date.get(vdate, 0) + c
+            if nk is not None:
+                by_port[nk] = by_port.get(nk, 0) + c
+            for (name, _, comb), v in zip(m, vals):
+                if comb == "SUM":
+                    out[name] += v or 0
+                elif v is not None:
+                    cur_v = out[name]
+                    out[name] = v if cur_v is None else (min(cur_v, v) if comb == "MIN" else max(cur_v, v))
+    # NULL dates sort first, like ORDER BY value_date
+    out["by_date"] = sorted(by_date.items(), key=lambda kv: (kv[0] is not None, kv[0]))
+    out["by_portfolio"] = sorted(by_port.items(), key=lambda kv: (-kv[1], kv[0]))
+    return out
+
+def batch_key(conn, table: str) -> Optional[str]:
+    """Load state of `table`, or None when it cannot be pinned down (then the table is always measured)."""
+    try:
+        if table.startswith("SRC_"):
+            if conn.execute(f"SELECT 1 FROM {table} WHERE load_batch_id IS NULL LIMIT 1").fetchone():
+                return None  # rows from before the manifest
+            ids = [r[0] for r in conn.execute(
+                "SELECT batch_id FROM SRC_IngestManifest WHERE target_table=? AND status='current' ORDER BY batch_id",
+                (table,))]
+            return "src:" + ",".join(map(str, ids))
+        if table in CDM_FACTS:
+            ids = [r[0] for r in conn.execute(
+                "SELECT DISTINCT src_batch_id FROM CDM_FactPartition WHERE fact_table=? ORDER BY 1", (table,))]
+            state = conn.execute("SELECT deps_sha256 FROM CDM_RefreshState WHERE fact_table=?", (table,)).fetchone()
+            seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table,)).fetchone()
+            if not state:
+                return None  # not built by the incremental loader
+            return f"cdm:{','.join(map(str, ids))}|{state[0]}|{seq[0] if seq else 0}"
+    except sqlite3.OperationalError:
+        return None
+    return None  # dimensions: small, measured every run
+
+def run(conn, tables=None, use_cache: bool = True) -> dict:
+    """{table: metrics}; also reports which tables were served from the cache under the '_cached' key."""
+    conn.execute(CACHE_DDL)
+    results, cached = {}, []
+    for t in tables or TABLES:
+        key = batch_key(conn, t) if use_cache else None
+        if key is not None:
+            hit = conn.execute("SELECT metrics FROM DQ_MetricCache WHERE table_name=? AND batch_key=?", (t, key)).fetchone()
+            if hit:
+                results[t] = json.loads(hit[0])
+                cached.append(t)
+                continue
+        with rm.stage(f"dq:{t}") as st:
+            results[t] = compute(conn, t)
+            st.rows_in = results[t]["rows"]
+        conn.execute("INSERT OR REPLACE INTO DQ_MetricCache (table_name, batch_key, metrics, computed_at) VALUES (?,?,?,?)",
+                     (t, key, json.dumps(results[t]), datetime.now().isoformat(timespec="seconds")))
+    conn.commit()
+    results["_cached"] = cached
+    return results
@@ -0,0 +1,151 @@
+# Export the CDM fact tables to Parquet datasets (hive layout, zstd, typed columns):
+#   export/parquet/<table>/year=YYYY/month=MM/portfolio=<portfolio_nk>/part-0.parquet
+# partitioned on the table's fact date (load_cdm_phase1.FACTS; PART_DATE overrides it) and portfolio. Incremental: a partition is
+# rewritten only when its (row count, rowid max/sum) moved since the last export -- load_cdm_phase1.py
+# rebuilds a partition by delete + insert, so rebuilt rows always carry new AUTOINCREMENT ids. Partitions
+# that disappeared from the CDM are removed. Export state lives next to the data (<table>/_export_state.json),
+# so a deleted dataset is simply exported again.
+#   python export_cdm_parquet.py [--db phase1.db] [--out export\parquet] [--tables CDM_Holdings ...] [--full]
+# Reading back (partition filters prune whole directories):
+#   read_dataset("CDM_Holdings", filters=[("year", "=", 2025), ("portfolio", "=", "P001")])
+
+import argparse, json, os, shutil, sqlite3
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+import pandas as pd
+import load_cdm_phase1 as cdm
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+OUT  = BASE / "export" / "parquet"
+
+NULL_PART = "__HIVE_DEFAULT_PARTITION__"  # pyarrow's hive default for a NULL partition value
+STATE_FILE = "_export_state.json"
+# table -> partition date (SQL expression) where it is not the fact date. Transactions: most movements have no
+# trade (purchase) date, only a value date -- as position_engine / fx_engine date them
+PART_DATE = {"CDM_Transactions": "COALESCE(trade_date, settle_date)"}
+
+def _pa():
+    try:
+        import pyarrow as pa, pyarrow.parquet as pq
+    except Exception:
+        raise RuntimeError("Parquet export requires 'pip install pyarrow'.")
+    return pa, pq
+
+def arrow_schema(conn, table: str):
+    # declared SQLite types -> Arrow types (SQLite itself keeps dates as text and decimals as REAL)
+    pa, _ = _pa()
+    fields = []
+    for _, name, decl, *_ in conn.execute(f"PRAGMA table_info({table})"):
+        d = (decl or "").upper()
+        if d.startswith(("INT", "BIGINT")):
+            t = pa.int64()
+        elif d.startswith(("DECIMAL", "REAL", "FLOAT", "DOUBLE", "NUMERIC")):
+            t = pa.float64()
+        elif d == "DATE":
+            t = pa.date32()
+        elif d.startswith(("TIMESTAMP", "DATETIME")):
+            t = pa.timestamp("us")
+        elif d.startswith("BOOL"):
+            t = pa.bool_()
+        else:
+            t = pa.string()
+        fields.append(pa.field(name, t))
+    return pa.schema(fields)
+
+def to_arrow(df: pd.DataFrame, schema):
+    pa, _ = _pa()
+    for f in schema:
+        if pa.types.is_date32(f.type):
+            df[f.name] = pd.to_datetime(df[f.name], errors="coerce").dt.date
+        elif pa.types.is_timestamp(f.type):
+            df[f.name] = pd.to_datetime(df[f.name], errors="coerce")
+        elif pa.types.is_string(f.type):
+            df[f.name] = df[f.name].astype(object).where(df[f.name].isna(), df[f.name].astype(str))
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+def partition_stats(conn, fact: dict) -> dict:
+    # one pass over the (portfolio_sk, date) index of the fact (rowid rides along in every index)
+    t, d = fact["table"], PART_DATE.get(fact["table"], fact["date"])
+    rows = conn.execute(
+        f"SELECT p.portfolio_nk, s.portfolio_sk, s.yr, s.mo, s.n, s.max_id, s.sum_id FROM ("
+        f"  SELECT portfolio_sk, NULLIF(substr({d},1,4),'') AS yr, NULLIF(substr({d},6,2),'') AS mo, COUNT(*) AS n, "
+        f"         MAX(rowid) AS max_id, SUM(rowid) AS sum_id FROM {t} GROUP BY 1, 2, 3) s "
+        f"LEFT JOIN CDM_Portfolio p ON p.portfolio_sk = s.portfolio_sk").fetchall()
+    out = {}
+    for nk, sk, yr, mo, n, max_id, sum_id in rows:
+        rel = "/".join([f"year={yr or NULL_PART}", f"month={mo or NULL_PART}",
+                        f"portfolio={quote(str(nk), safe='') if nk is not None else NULL_PART}"])
+        out[rel] = {"portfolio_sk": sk, "year": yr, "month": mo, "sig": [n, max_id, sum_id]}
+    return out
+
+def partition_frame(conn, fact: dict, part: dict) -> pd.DataFrame:
+    t, d = fact["table"], PART_DATE.get(fact["table"], fact["date"])
+    where, params = ["portfolio_sk IS ?"], [part["portfolio_sk"]]
+    if part["year"] is None:
+        where.append(f"NULLIF({d},'') IS NULL")
+    else:
+        # a 'YYYY-MM' prefix range keeps the lookup on the (portfolio_sk, date) index
+        where.append(f"{d} >= ? AND {d} < ?")
+        prefix = f"{part['year']}-{part['month'] or ''}"
+        params += [prefix, prefix + "\uffff"]
+    return pd.read_sql(f"SELECT * FROM {t} WHERE {' AND '.join(where)} ORDER BY {d}", conn, params=params)
+
+def export_table(conn, fact: dict, out: Path, full: bool = False) -> tuple:
+    _, pq = _pa()
+    root = out / fact["table"]
+    state_path = root / STATE_FILE
+    old = {} if full or not state_path.exists() else json.loads(state_path.read_text(encoding="utf-8"))
+    if full and root.exists():
+        shutil.rmtree(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    schema = arrow_schema(conn, fact["table"])
+    parts = partition_stats(conn, fact)
+    written = 0
+    for rel, part in parts.items():
+        if old.get(rel) == part["sig"]:
+            continue
+        target = root / rel / "part-0.parquet"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(".tmp")
+        pq.write_table(to_arrow(partition_frame(conn, fact, part), schema), tmp, compression="zstd")
+        os.replace(tmp, target)
+        written += 1
+    removed = 0
+    for rel in set(old) - set(parts):
+        shutil.rmtree(root / rel, ignore_errors=True)
+        for d in [(root / rel).parent, (root / rel).parent.parent]:
+            if d.exists() and not any(d.iterdir()):
+                d.rmdir()
+        removed += 1
+    state = {rel: p["sig"] for rel, p in parts.items()}
+    state_path.write_text(json.dumps(state, sort_keys=True), encoding="utf-8")
+    return len(parts), written, removed
+
+def read_dataset(table: str, columns=None, filters=None, out: Path = OUT) -> pd.DataFrame:
+    """Read an exported table back; `filters` on year/month/portfolio only open the matching partitions."""
+    pa, pq = _pa()
+    import pyarrow.dataset as ds
+    part = ds.partitioning(pa.schema([("year", pa.int32()), ("month", pa.int32()), ("portfolio", pa.string())]),
+                           flavor="hive")
+    return pq.read_table(out / table, columns=columns, filters=filters, partitioning=part).to_pandas()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Export CDM facts to partitioned Parquet (incremental)")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    ap.add_argument("--out", default=str(OUT), help="dataset root")
+    ap.add_argument("--tables", nargs="*", default=None, help="subset of fact tables (default: all)")
+    ap.add_argument("--full", action="store_true", help="rewrite every partition")
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    t0 = datetime.now()
+    for fact in cdm.FACTS:
+        if args.tables and fact["table"] not in args.tables:
+            continue
+        n, w, r = export_table(conn, fact, Path(args.out), args.full)
+        print(f"{fact['table']:28s} partitions={n:6d} written={w:6d} removed={r:4d}")
+    conn.close()
+    print(f"Parquet export complete in {(datetime.now() - t0).total_seconds():.1f}s:", args.out)
@@ -0,0 +1,301 @@
+# FX: rate files -> REF_FxRate, base-currency columns of the CDM facts (mv_base, pl_base, gross_amt_base,
+# fees_tax_base, amt_base). Runs as the last stage of the CDM refresh (load_cdm_phase1.py), same transaction.
+#
+# Rates are held in memory as one sorted (day, rate) array pair per currency, in units of the evaluation
+# currency (Parameters.csv). A fact amount is converted with an as-of lookup (last rate on or before the
+# fact date, np.searchsorted over whole columns); native -> target goes through the evaluation currency,
+# so only pairs quoted against it are needed. Target = CDM_Portfolio.base_ccy, else the evaluation currency.
+#
+# Incremental: rows inserted since the last FX run (rowid above CDM_FxState.max_rowid) are converted in place
+# -- no reader has seen their ids yet. When rates change (REF_FxRate vs the CDM_FxApplied copy of the rates
+# last applied) or the evaluation currency does, older rows from the earliest changed date on are recomputed
+# and the ones whose base value moved are re-inserted under new ids, so the (count, rowid) partition
+# signatures of export_cdm_parquet.py and returns_engine.py see the change.
+#   python fx_engine.py [--db phase1.db] [--rates data\source\fx]      (load rate files + convert)
+# Rate files: CSV with rate_date, base_ccy, quote_ccy, rate  (1 base_ccy = rate quote_ccy)
+
+import argparse, sqlite3, time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import bulk_load as bl
+
+BASE   = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB     = BASE / "phase1.db"
+RATES  = BASE / r"data\source\fx"
+PARAMS = BASE / r"data\source\ref_specs\Parameters.csv"
+
+FX_DDL = """
+CREATE TABLE IF NOT EXISTS REF_FxRate (
+  base_ccy CHAR(3) NOT NULL,
+  quote_ccy CHAR(3) NOT NULL,
+  rate_date DATE NOT NULL,
+  rate DECIMAL(38,10) NOT NULL,
+  PRIMARY KEY (base_ccy, quote_ccy, rate_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS CDM_FxApplied (
+  base_ccy CHAR(3) NOT NULL,
+  quote_ccy CHAR(3) NOT NULL,
+  rate_date DATE NOT NULL,
+  rate DECIMAL(38,10) NOT NULL,
+  PRIMARY KEY (base_ccy, quote_ccy, rate_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS CDM_FxState (
+  fact_table VARCHAR(64) PRIMARY KEY,
+  eval_ccy CHAR(3),
+  max_rowid INTEGER,
+  converted INTEGER,
+  rewritten INTEGER,
+  converted_at TIMESTAMP
+);
+"""
+
+# fact -> date the rate is taken on (SQL expression, read as fx_date), currency of the amounts, native -> base
+# columns. Transactions: most movements have no trade (purchase) date, only a value date
+FX_FACTS = {
+    "CDM_Holdings": {"date": "value_date", "ccy": "native_ccy", "amounts": {"mv_native": "mv_base"}},
+    "CDM_PortfolioDailyValues": {"date": "value_date", "ccy": "eval_ccy", "amounts": {"pl_native": "pl_base"}},
+    "CDM_Transactions": {"date": "COALESCE(trade_date, settle_date)", "ccy": "native_ccy",
+                         "amounts": {"gross_amt_native": "gross_amt_base", "fees_tax_native": "fees_tax_base"}},
+    "CDM_CashAgenda": {"date": "event_date", "ccy": "native_ccy", "amounts": {"amt_native": "amt_base"}},
+}
+# currency columns the facts did not carry before the FX stage (added on existing dbs)
+CCY_COLUMNS = {"CDM_Holdings": "native_ccy", "CDM_Transactions": "native_ccy"}
+RATE_ALIASES = {"date": "rate_date", "from": "base_ccy", "base": "base_ccy", "ccy1": "base_ccy",
+                "to": "quote_ccy", "quote": "quote_ccy", "ccy2": "quote_ccy", "fx_rate": "rate"}
+CHUNK_ROWS = 500000  # fact rows converted per fetch
+NO_DAY = np.iinfo(np.int64).min  # NULL/unparseable date: sorts before every rate, so it never finds one
+
+def ensure_schema(conn):
+    conn.executescript(FX_DDL)
+    for table, col in CCY_COLUMNS.items():
+        have = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if have and col not in have:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} CHAR(3)")
+    for table in FX_FACTS:
+        # rows already in a fact when the FX stage first sees it count as old (they may have been exported):
+        # the first apply() re-inserts the ones it converts, rows loaded afterwards are converted in place
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+            conn.execute(f"INSERT OR IGNORE INTO CDM_FxState (fact_table, max_rowid) "
+                         f"SELECT ?, COALESCE(MAX(rowid), 0) FROM {table}", (table,))
+    conn.commit()
+
+def eval_ccy(path: Path = None) -> str:
+    # Parameters.csv: a header row 'Evaluation currency' over the value (no sniffing: the header has a space)
+    path = path or PARAMS
+    df = pd.read_csv(path, sep="[,;]", engine="python", dtype=str)
+    cols = {c.strip().lower(): c for c in df.columns}
+    if "evaluation currency" not in cols or df.empty:
+        raise RuntimeError(f"No 'Evaluation currency' in {path}")
+    return df[cols["evaluation currency"]].iloc[0].strip().upper()
+
+# --- rates ---
+def read_rates(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, sep=None, engine="python", dtype=str)
+    df.columns = [RATE_ALIASES.get(c.strip().lower(), c.strip().lower()) for c in df.columns]
+    missing = {"rate_date", "base_ccy", "quote_ccy", "rate"} - set(df.columns)
+    if missing:
+        raise RuntimeError(f"{path}: missing rate column(s) {sorted(missing)}")
+    out = pd.DataFrame({
+        "base_ccy": df["base_ccy"].str.strip().str.upper(),
+        "quote_ccy": df["quote_ccy"].str.strip().str.upper(),
+        "rate_date": pd.to_datetime(df["rate_date"], errors="coerce", dayfirst=True).dt.date,
+        "rate": pd.to_numeric(df["rate"].str.replace(",", ""), errors="coerce"),
+    })
+    return out[out["rate_date"].notna() & (out["rate"] > 0)]
+
+def load_rates(conn, folder: Path = RATES) -> int:
+    # reload in place like the REF maps: the table is the union of the files, a duplicate (pair, date) fails
+    files = sorted(folder.glob("*.csv")) if folder.exists() else []
+    if not files:
+        return 0
+    df = pd.concat([read_rates(p) for p in files], ignore_index=True)
+    conn.execute("DELETE FROM REF_FxRate")
+    n = bl.append(conn, "REF_FxRate", df)
+    conn.commit()
+    return n
+
+def day_numbers(values) -> np.ndarray:
+    # ISO date strings -> days since epoch (int64), NO_DAY for NULL/unparseable; each distinct date parsed once
+    codes, uniq = pd.factorize(np.asarray(values, dtype=object))
+    days = pd.to_datetime(pd.Series(uniq, dtype=object).str[:10], errors="coerce", format="%Y-%m-%d")
+    d = np.append(days.to_numpy().astype("datetime64[D]").astype(np.int64), NO_DAY)
+    d[:-1][days.isna().to_numpy()] = NO_DAY
+    return d[codes]
+
+def build_curves(rates: pd.DataFrame, ccy: str) -> dict:
+    """{currency: (sorted day numbers, units of `ccy` per unit)} from the pairs quoted against `ccy`."""
+    direct = rates[(rates["quote_ccy"] == ccy) & (rates["base_ccy"] != ccy)]
+    inverse = rates[(rates["base_ccy"] == ccy) & (rates["quote_ccy"] != ccy)]
+    legs = pd.concat([
+        pd.DataFrame({"ccy": direct["base_ccy"], "rate_date": direct["rate_date"],
+                      "rate": direct["rate"].astype(float), "pref": 0}),
+        pd.DataFrame({"ccy": inverse["quote_ccy"], "rate_date": inverse["rate_date"],
+                      "rate": 1.0 / inverse["rate"].astype(float), "pref": 1}),
+    ], ignore_index=True)
+    if legs.empty:
+        return {}
+    legs["day"] = day_numbers(legs["rate_date"].astype(str))
+    # a direct quote wins over the inverse of the opposite pair on the same day
+    legs = legs[legs["day"] != NO_DAY].sort_values(["ccy", "day", "pref"]).drop_duplicates(["ccy", "day"])
+    return {c: (g["day"].to_numpy(), g["rate"].to_numpy()) for c, g in legs.groupby("ccy", sort=False)}
+
+def to_eval(curves: dict, ccy: np.ndarray, days: np.ndarray, eval_ccy: str) -> np.ndarray:
+    # as-of factor per row: NaN without a currency, a valid date or a rate on/before that date
+    out = np.full(len(ccy), np.nan)
+    codes, uniq = pd.factorize(ccy)
+    for i, c in enumerate(uniq):
+        m = codes == i
+        if c == eval_ccy:
+            out[m] = 1.0
+            continue
+        if c not in curves:
+            continue
+        cdays, crate = curves[c]
+        d = days[m]
+        j = np.searchsorted(cdays, d, side="right") - 1
+        ok = j >= 0
+        f = np.full(len(d), np.nan)
+        f[ok] = crate[j[ok]]
+        out[m] = f
+    return out
+
+def convert(df: pd.DataFrame, spec: dict, curves: dict, eval_ccy: str, target: dict) -> pd.DataFrame:
+    """Base-currency columns for the fact rows in `df` (needs portfolio_sk, fx_date, currency and amounts)."""
+    days = day_numbers(df["fx_date"])
+    codes, uniq = pd.factorize(df[spec["ccy"]])  # normalize each distinct code once (NULL -> code -1)
+    src = np.array([c.strip().upper() if isinstance(c, str) else None for c in uniq] + [None], dtype=object)[codes]
+    tgt = df["portfolio_sk"].map(target).fillna(eval_ccy).to_numpy(dtype=object)
+    factor = to_eval(curves, src, days, eval_ccy) / to_eval(curves, tgt, days, eval_ccy)
+    factor[src == tgt] = 1.0  # no rate needed, also without a valid date
+    out = pd.DataFrame(index=df.index)
+    for native, base in spec["amounts"].items():
+        out[base] = pd.to_numeric(df[native], errors="coerce").to_numpy(dtype=float) * factor
+    return out
+
+def unconverted(df: pd.DataFrame, spec: dict, out: pd.DataFrame) -> np.ndarray:
+    # rows with a native amount left without its base value (no rate on/before the date, no date, no currency)
+    miss = np.zeros(len(df), dtype=bool)
+    for native, base in spec["amounts"].items():
+        miss |= pd.to_numeric(df[native], errors="coerce").notna().to_numpy() & out[base].isna().to_numpy()
+    return miss
+
+# --- stage ---
+def portfolio_targets(conn) -> dict:
+    return {sk: c.strip().upper() for sk, c in conn.execute(
+        "SELECT portfolio_sk, base_ccy FROM CDM_Portfolio WHERE NULLIF(TRIM(base_ccy),'') IS NOT NULL")}
+
+def rate_changes(conn):
+    """(changed: bool, earliest changed rate_date or None) between REF_FxRate and CDM_FxApplied."""
+    q = "SELECT base_ccy, quote_ccy, rate_date, rate FROM {}"
+    new, old = pd.read_sql(q.format("REF_FxRate"), conn), pd.read_sql(q.format("CDM_FxApplied"), conn)
+    m = new.merge(old, on=["base_ccy", "quote_ccy", "rate_date"], how="outer", suffixes=("", "_old"))
+    diff = m[~np.isclose(m["rate"].astype(float), m["rate_old"].astype(float), rtol=1e-12, atol=0)]
+    return (not diff.empty), (diff["rate_date"].min() if not diff.empty else None)
+
+def new_rows_sql(table: str) -> str:
+    spec = FX_FACTS[table]
+    cols = ", ".join(["portfolio_sk", f"{spec['date']} AS fx_date", spec["ccy"], *spec["amounts"]])
+    return f"SELECT rowid, {cols} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT {CHUNK_ROWS}"
+
+def restated_sql(table: str, since) -> str:
+    date = FX_FACTS[table]["date"]
+    where = "rowid <= ?" + (f" AND {date} >= ?" if since is not None else "")
+    return f"SELECT *, {date} AS fx_date FROM {table} WHERE {where}"
+
+def convert_new(conn, table: str, after: int, curves, ccy, target) -> tuple:
+    # rows inserted since the last FX run: UPDATE in place, one executemany per rowid-range chunk
+    # (the read cursor is drained before its rows are updated). Returns (rows converted, rows left unconverted)
+    spec = FX_FACTS[table]
+    bases = list(spec["amounts"].values())
+    upd = f"UPDATE {table} SET {', '.join(b + '=?' for b in bases)} WHERE rowid=?"
+    cols = ["rid", "portfolio_sk", "fx_date", spec["ccy"], *spec["amounts"]]
+    n = miss = 0
+    while True:
+        rows = conn.execute(new_rows_sql(table), (after,)).fetchall()
+        if not rows:
+            return n, miss
+        df = pd.DataFrame.from_records(rows, columns=cols)
+        after = rows[-1][0]
+        out = convert(df, spec, curves, ccy, target)
+        miss += int(unconverted(df, spec, out).sum())
+        keep = out.notna().any(axis=1).to_numpy()  # all-NULL results: the row already holds NULL
+        if keep.any():
+            params = np.empty((int(keep.sum()), len(bases) + 1), dtype=object)
+            for j, b in enumerate(bases):
+                params[:, j] = bl.native_column(out.loc[keep, b])
+            params[:, -1] = df["rid"].to_numpy()[keep].astype(object)
+            conn.executemany(upd, params.tolist())
+            n += int(keep.sum())
+
+def rewrite_restated(conn, table: str, upto: int, since, curves, ccy, target) -> tuple:
+    # older rows whose base value moved: delete + re-insert under new AUTOINCREMENT ids.
+    # Returns (rows re-inserted, re-inserted rows left unconverted)
+    spec = FX_FACTS[table]
+    pk = next(r[1] for r in conn.execute(f"PRAGMA table_info({table})") if r[5])
+    df = pd.read_sql(restated_sql(table, since), conn, params=[upto] + ([since] if since is not None else []))
+    if df.empty:
+        return 0, 0
+    out = convert(df, spec, curves, ccy, target)
+    moved = np.zeros(len(df), dtype=bool)
+    for b in out.columns:
+        old, new = pd.to_numeric(df[b], errors="coerce").to_numpy(dtype=float), out[b].to_numpy()
+        same = (np.isnan(old) & np.isnan(new)) | np.isclose(old, new, rtol=1e-12, atol=0)
+        moved |= ~same
+    if not moved.any():
+        return 0, 0
+    miss = int(unconverted(df, spec, out)[moved].sum())
+    df = df[moved].assign(**{b: out.loc[moved, b] for b in out.columns})
+    conn.executemany(f"DELETE FROM {table} WHERE rowid=?", [(int(r),) for r in df[pk]])
+    bl.append(conn, table, df.drop(columns=[pk]))
+    return len(df), miss
+
+def apply(conn, ccy: str = None, tables=None) -> dict:
+    """Fill the base columns of the facts; no commit (runs inside the caller's transaction).
+    Returns {table: (rows converted in place, rows re-inserted, of those rows left without a base value)}."""
+    ccy = ccy or eval_ccy()
+    rates = pd.read_sql("SELECT base_ccy, quote_ccy, rate_date, rate FROM REF_FxRate", conn)
+    curves, target = build_curves(rates, ccy), portfolio_targets(conn)
+    changed, since = rate_changes(conn)
+    out = {}
+    for table in tables or FX_FACTS:
+        st = conn.execute("SELECT eval_ccy, max_rowid FROM CDM_FxState WHERE fact_table=?", (table,)).fetchone()
+        old_ccy, old_max = st or (None, 0)
+        n, miss = convert_new(conn, table, old_max, curves, ccy, target)
+        r = r_miss = 0
+        if old_ccy != ccy:
+            r, r_miss = rewrite_restated(conn, table, old_max, None, curves, ccy, target)
+        elif changed:
+            r, r_miss = rewrite_restated(conn, table, old_max, since, curves, ccy, target)
+        top = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+        conn.execute("INSERT OR REPLACE INTO CDM_FxState (fact_table, eval_ccy, max_rowid, converted, rewritten, "
+                     "converted_at) VALUES (?,?,?,?,?,?)",
+                     (table, ccy, top, n, r, datetime.now().isoformat(timespec="seconds")))
+        out[table] = (n, r, miss + r_miss)
+    if changed:
+        conn.execute("DELETE FROM CDM_FxApplied")
+        conn.execute("INSERT INTO CDM_FxApplied SELECT base_ccy, quote_ccy, rate_date, rate FROM REF_FxRate")
+    return out
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Load FX rate files and fill the CDM base-currency columns")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    ap.add_argument("--rates", default=str(RATES), help="folder of rate CSV files")
+    ap.add_argument("--params", default=str(PARAMS), help="Parameters.csv (evaluation currency)")
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    ensure_schema(conn)
+    t0 = time.perf_counter()
+    print("Rates loaded:", load_rates(conn, Path(args.rates)))
+    with bl.session(conn):
+        try:
+            result = apply(conn, eval_ccy(Path(args.params)))
+        except Exception:
+            conn.rollback()
+            raise
+    for t, (n, r, miss) in result.items():
+        print(f"  {t:28s} converted={n:9d} re-inserted={r:7d} unconverted={miss:7d}")
+    conn.close()
+    print(f"FX complete in {time.perf_counter() - t0:.1f}s")
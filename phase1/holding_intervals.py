@@ -0,0 +1,273 @@
+# Run-length storage of CDM_Holdings: a position (portfolio, security, slot) keeps its quantity for many evaluation
+# dates while only its price moves, so the daily rows are folded into
+#   - CDM_HoldingInterval: one row per run of an unchanged (qty, native_ccy) -- valid_from = first evaluation date
+#     of the run, valid_to = the portfolio's next evaluation date without it (OPEN while it is still held)
+#   - CDM_HoldingPrice: the same runs for the price alone (a new row only when the price changes)
+#   - CDM_HoldingDate: the evaluation dates of each portfolio, with the (count, rowid max/sum) signature of that
+#     date's CDM_Holdings rows
+# slot numbers the rows of one (portfolio, security, date) -- lots, or rows without a security -- ordered by
+# (qty, native_ccy, price). V_HoldingsDaily expands the runs back to one row per evaluation date (qty, price,
+# native_ccy, mv_native as in CDM_Holdings; mv_base stays with CDM_Holdings, fx_engine). asof() answers
+# "positions of portfolio P on date D" with one range probe on (portfolio_sk, valid_to): the row valid on D,
+# i.e. the last evaluation on or before D.
+# Incremental, like returns_engine: a portfolio whose only changes are evaluation dates after its last built one
+# is extended (open runs continued or closed, new runs appended); any other change (a restated date, FX
+# re-inserts) rebuilds that portfolio. Runs as the last stage of the CDM refresh (load_cdm_phase1.py).
+#   python holding_intervals.py [--db phase1.db] [--full]
+#   python holding_intervals.py --asof 2025-08-31 --portfolio 10000.05
+
+import argparse, sqlite3, time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import bulk_load as bl
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+
+OPEN = "9999-12-31"  # valid_to of a run still held on the portfolio's last evaluation date
+
+INTERVAL_DDL = """
+CREATE TABLE IF NOT EXISTS CDM_HoldingDate (
+  portfolio_sk INTEGER NOT NULL,
+  value_date DATE NOT NULL,
+  row_count INTEGER,
+  max_rowid INTEGER,
+  sum_rowid INTEGER,
+  PRIMARY KEY (portfolio_sk, value_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS CDM_HoldingInterval (
+  portfolio_sk INTEGER NOT NULL,
+  security_sk INTEGER,
+  slot INTEGER NOT NULL,
+  valid_from DATE NOT NULL,
+  valid_to DATE NOT NULL,
+  qty DECIMAL(38,10),
+  native_ccy CHAR(3)
+);
+CREATE INDEX IF NOT EXISTS ix_cdm_holdinginterval_asof ON CDM_HoldingInterval(portfolio_sk, valid_to, valid_from);
+CREATE TABLE IF NOT EXISTS CDM_HoldingPrice (
+  portfolio_sk INTEGER NOT NULL,
+  security_sk INTEGER,
+  slot INTEGER NOT NULL,
+  valid_from DATE NOT NULL,
+  valid_to DATE NOT NULL,
+  price DECIMAL(38,10)
+);
+CREATE INDEX IF NOT EXISTS ix_cdm_holdingprice_run ON CDM_HoldingPrice(portfolio_sk, security_sk, slot, valid_to);
+CREATE VIEW IF NOT EXISTS V_HoldingsDaily AS
+SELECT d.value_date, i.portfolio_sk, i.security_sk, i.slot, i.qty, p.price, i.native_ccy,
+       CASE WHEN i.qty IS NOT NULL AND p.price IS NOT NULL THEN i.qty * p.price END AS mv_native
+FROM CDM_HoldingInterval i
+JOIN CDM_HoldingDate d ON d.portfolio_sk = i.portfolio_sk AND d.value_date >= i.valid_from AND d.value_date < i.valid_to
+LEFT JOIN CDM_HoldingPrice p ON p.portfolio_sk = i.portfolio_sk AND p.security_sk IS i.security_sk AND p.slot = i.slot
+     AND p.valid_to > d.value_date AND p.valid_from <= d.value_date;
+"""
+
+ASOF_SQL = f"""
+SELECT i.portfolio_sk, i.security_sk, i.slot, i.qty, p.price, i.native_ccy,
+       CASE WHEN i.qty IS NOT NULL AND p.price IS NOT NULL THEN i.qty * p.price END AS mv_native,
+       i.valid_from, NULLIF(i.valid_to, '{OPEN}') AS valid_to
+FROM CDM_HoldingInterval i
+LEFT JOIN CDM_HoldingPrice p ON p.portfolio_sk = i.portfolio_sk AND p.security_sk IS i.security_sk AND p.slot = i.slot
+     AND p.valid_to > :d AND p.valid_from <= :d
+WHERE i.portfolio_sk = :p AND i.valid_to > :d AND i.valid_from <= :d
+ORDER BY i.security_sk, i.slot
+"""
+
+KEY = ["portfolio_sk", "sec", "slot"]  # sec = security_sk, -1 for none (NULL never equals itself)
+RUNS = {"CDM_HoldingInterval": ["qty", "native_ccy"], "CDM_HoldingPrice": ["price"]}
+NULL_TEXT = "\x00NULL"  # not a bare NUL: pandas/NumPy drop trailing NULs, fillna("\x00") gives ''
+
+def ensure_schema(conn):
+    conn.executescript(INTERVAL_DDL)
+    conn.commit()
+
+# --- change detection ---
+def signatures(conn) -> pd.DataFrame:
+    # per evaluation date, read off the (portfolio_sk, value_date) index; partition rebuilds and FX re-inserts
+    # give the rows new rowids
+    return pd.read_sql("SELECT portfolio_sk, value_date, COUNT(*) AS row_count, MAX(rowid) AS max_rowid, "
+                       "SUM(rowid) AS sum_rowid FROM CDM_Holdings WHERE portfolio_sk IS NOT NULL "
+                       "AND value_date IS NOT NULL GROUP BY portfolio_sk, value_date", conn)
+
+def plan(conn, sig: pd.DataFrame, full: bool) -> tuple:
+    """({portfolio_sk: last built date} to extend, [portfolios to rebuild], [portfolios without holdings])."""
+    old = pd.read_sql("SELECT portfolio_sk, value_date, row_count, max_rowid, sum_rowid FROM CDM_HoldingDate", conn)
+    gone = sorted(set(old["portfolio_sk"]) - set(sig["portfolio_sk"]))
+    if full:
+        return {}, sorted(sig["portfolio_sk"].unique().tolist()), gone
+    m = sig.merge(old, on=["portfolio_sk", "value_date"], how="outer", suffixes=("", "_old"), indicator=True)
+    same = m["_merge"].eq("both").to_numpy()
+    for c in ("row_count", "max_rowid", "sum_rowid"):
+        same &= (m[c] == m[f"{c}_old"]).to_numpy()
+    changed = m[~same]
+    last = old.groupby("portfolio_sk")["value_date"].max()
+    extend, rebuild = {}, []
+    for p, g in changed.groupby("portfolio_sk"):
+        if p in gone:
+            continue
+        if p in last.index and g["_merge"].eq("left_only").all() and g["value_date"].min() > last[p]:
+            extend[int(p)] = last[p]
+        else:
+            rebuild.append(int(p))
+    return extend, rebuild, gone
+
+# --- runs ---
+def load_rows(conn, after: dict) -> pd.DataFrame:
+    # CDM_Holdings rows of the given portfolios dated after {portfolio: date} ('' = all of them)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _hi_ports (portfolio_sk INTEGER PRIMARY KEY, after DATE)")
+    conn.execute("DELETE FROM _hi_ports")
+    conn.executemany("INSERT INTO _hi_ports VALUES (?, ?)", [(int(p), d) for p, d in after.items()])
+    return pd.read_sql("SELECT h.rowid AS holding_rowid, h.portfolio_sk, h.value_date, h.security_sk, h.qty, h.price, "
+                       "h.native_ccy FROM _hi_ports t CROSS JOIN CDM_Holdings h ON h.portfolio_sk = t.portfolio_sk "
+                       "AND h.value_date > t.after", conn)
+
+def assign_slots(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.assign(sec=df["security_sk"].fillna(-1).astype("int64"))
+    df = df.sort_values(["portfolio_sk", "sec", "value_date", "qty", "native_ccy", "price", "holding_rowid"],
+                        na_position="first", kind="stable")
+    return df.assign(slot=df.groupby(["portfolio_sk", "sec", "value_date"], sort=False).cumcount())
+
+def open_state(conn, after: dict) -> pd.DataFrame:
+    # the open runs of the portfolios being extended, as rows of their last built date
+    if not after:
+        return pd.DataFrame()
+    conn.execute("DELETE FROM _hi_ports")
+    conn.executemany("INSERT INTO _hi_ports VALUES (?, ?)", [(int(p), d) for p, d in after.items()])
+    df = pd.read_sql(f"SELECT i.portfolio_sk, t.after AS value_date, i.security_sk, i.slot, i.qty, i.native_ccy, "
+                     f"p.price FROM _hi_ports t CROSS JOIN CDM_HoldingInterval i ON i.portfolio_sk = t.portfolio_sk "
+                     f"AND i.valid_to = '{OPEN}' LEFT JOIN CDM_HoldingPrice p ON p.portfolio_sk = i.portfolio_sk "
+                     f"AND p.security_sk IS i.security_sk AND p.slot = i.slot AND p.valid_to = '{OPEN}'", conn)
+    return df.assign(sec=df["security_sk"].fillna(-1).astype("int64"), carried=True)
+
+def _equal_next(v: np.ndarray) -> np.ndarray:
+    # v[i] == v[i-1] for i >= 1, NULL equal to NULL
+    if v.dtype.kind == "f":
+        return (v[1:] == v[:-1]) | (np.isnan(v[1:]) & np.isnan(v[:-1]))
+    s = pd.Series(v, dtype=object).fillna(NULL_TEXT).to_numpy()
+    return s[1:] == s[:-1]
+
+def runs(df: pd.DataFrame, cols: list) -> pd.DataFrame:
+    """One row per run of unchanged `cols` over consecutive evaluation dates of a position: its first row,
+    with valid_from / valid_to. df needs KEY, value_date, cols and `carried` (row stands for an open run)."""
+    days = df[["portfolio_sk", "value_date"]].drop_duplicates().sort_values(["portfolio_sk", "value_date"])
+    dport, ddate = days["portfolio_sk"].to_numpy(), days["value_date"].to_numpy(dtype=object)
+    pos = pd.Series(np.arange(len(days)), index=pd.MultiIndex.from_frame(days))
+    df = df.sort_values(KEY + ["value_date"], kind="stable")
+    g = pos.reindex(pd.MultiIndex.from_frame(df[["portfolio_sk", "value_date"]])).to_numpy()
+    start = np.ones(len(df), dtype=bool)
+    if len(df) > 1:
+        same = g[1:] == g[:-1] + 1  # next evaluation date of the same portfolio (a gap ends the run)
+        for c in KEY:
+            same &= _equal_next(df[c].to_numpy())
+        for c in cols:
+            v = df[c].to_numpy(dtype=float) if c in ("qty", "price") else df[c].to_numpy(dtype=object)
+            same &= _equal_next(v)
+        start[1:] = ~same
+    end = np.append(start[1:], True)
+    nxt = g[end] + 1
+    has_next = nxt < len(days)
+    has_next[has_next] = dport[nxt[has_next]] == df["portfolio_sk"].to_numpy()[end][has_next]
+    out = df[start].copy()
+    out["valid_from"] = out["value_date"]
+    out["valid_to"] = np.where(has_next, ddate[np.minimum(nxt, len(days) - 1)], OPEN)
+    return out
+
+def write_runs(conn, table: str, r: pd.DataFrame) -> tuple:
+    # runs continuing an open run only move its valid_to; the others are new rows. Returns (inserted, closed).
+    cont = r["carried"].fillna(False).astype(bool).to_numpy()
+    closed = r[cont & (r["valid_to"] != OPEN).to_numpy()]
+    conn.executemany(f"UPDATE {table} SET valid_to = ? WHERE portfolio_sk = ? AND security_sk IS ? AND slot = ? "
+                     f"AND valid_to = '{OPEN}'",
+                     [(v, int(p), None if s < 0 else int(s), int(k)) for v, p, s, k in
+                      closed[["valid_to", "portfolio_sk", "sec", "slot"]].itertuples(index=False)])
+    new = r[~cont].assign(security_sk=lambda x: x["sec"].where(x["sec"] >= 0, None).astype(object))
+    return bl.append(conn, table, new.drop(columns=["value_date"])), len(closed)
+
+def _delete(conn, portfolios):
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _hi_drop (portfolio_sk INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM _hi_drop")
+    conn.executemany("INSERT OR IGNORE INTO _hi_drop VALUES (?)", [(int(p),) for p in portfolios])
+    for t in ("CDM_HoldingInterval", "CDM_HoldingPrice", "CDM_HoldingDate"):
+        conn.execute(f"DELETE FROM {t} WHERE portfolio_sk IN (SELECT portfolio_sk FROM _hi_drop)")
+
+def build(conn, full: bool = False) -> dict:
+    """Bring the intervals up to date with CDM_Holdings; no commit (runs inside the caller's transaction)."""
+    sig = signatures(conn)
+    extend, rebuild, gone = plan(conn, sig, full)
+    if full:
+        for t in ("CDM_HoldingInterval", "CDM_HoldingPrice", "CDM_HoldingDate"):
+            conn.execute(f"DELETE FROM {t}")
+    else:
+        _delete(conn, rebuild + gone)
+    after = {**{p: "" for p in rebuild}, **extend}
+    out = {"extended": len(extend), "rebuilt": len(rebuild), "removed": len(gone), "rows": 0,
+           "intervals": 0, "prices": 0, "closed": 0}
+    if after:
+        rows = assign_slots(load_rows(conn, after)).assign(carried=False)
+        out["rows"] = len(rows)
+        carried = open_state(conn, extend)
+        df = pd.concat([carried, rows], ignore_index=True) if len(carried) else rows
+        for table, cols in RUNS.items():
+            n, c = write_runs(conn, table, runs(df, cols))
+            out["intervals" if table == "CDM_HoldingInterval" else "prices"] += n
+            out["closed"] += c
+        since = sig["portfolio_sk"].map(after)
+        bl.append(conn, "CDM_HoldingDate", sig[since.notna() & (sig["value_date"] > since.fillna(""))])
+    return out
+
+# --- reads ---
+def asof(conn, portfolio_sk: int, date) -> pd.DataFrame:
+    """Positions of one portfolio on `date` (ISO text or date): the last evaluation on or before it."""
+    d = date.isoformat()[:10] if hasattr(date, "isoformat") else str(date)
+    return pd.read_sql(ASOF_SQL, conn, params={"p": int(portfolio_sk), "d": d})
+
+def daily(conn, portfolios=None, start=None, end=None) -> pd.DataFrame:
+    """Daily rows (one per evaluation date and position) from the runs, optionally for some portfolios/dates."""
+    where, params = [], []
+    if portfolios is not None:
+        where.append(f"portfolio_sk IN ({','.join('?' * len(portfolios))})")
+        params += [int(p) for p in portfolios]
+    if start is not None:
+        where.append("value_date >= ?")
+        params.append(str(start))
+    if end is not None:
+        where.append("value_date <= ?")
+        params.append(str(end))
+    sql = "SELECT * FROM V_HoldingsDaily" + (" WHERE " + " AND ".join(where) if where else "")
+    return pd.read_sql(sql + " ORDER BY portfolio_sk, value_date, security_sk, slot", conn, params=params)
+
+def footprint(conn) -> dict:
+    return {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+            for t in ("CDM_Holdings", "CDM_HoldingInterval", "CDM_HoldingPrice", "CDM_HoldingDate")}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run-length holdings intervals (incremental) and as-of positions")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    ap.add_argument("--full", action="store_true", help="rebuild every portfolio")
+    ap.add_argument("--asof", help="print the positions on this date (with --portfolio) instead of building")
+    ap.add_argument("--portfolio", help="portfolio_nk for --asof")
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    ensure_schema(conn)
+    if args.asof:
+        sk = conn.execute("SELECT portfolio_sk FROM CDM_Portfolio WHERE portfolio_nk = ?", (args.portfolio,)).fetchone()
+        if sk is None:
+            raise RuntimeError(f"Unknown portfolio {args.portfolio!r}")
+        print(asof(conn, sk[0], args.asof).to_string(index=False))
+    else:
+        t0 = time.perf_counter()
+        with bl.session(conn):
+            try:
+                res = build(conn, args.full)
+            except Exception:
+                conn.rollback()
+                raise
+            conn.commit()
+        print(f"Intervals: {res['extended']} portfolio(s) extended, {res['rebuilt']} rebuilt, {res['removed']} removed; "
+              f"{res['rows']} holding rows -> {res['intervals']} interval(s), {res['prices']} price run(s), "
+              f"{res['closed']} run(s) closed ({time.perf_counter() - t0:.1f}s)")
+        print("  ".join(f"{t}={n}" for t, n in footprint(conn).items()))
+    conn.close()
@@ -0,0 +1,137 @@
+# Ingestion manifest for the SRC_* landing tables (shared by load_src_phase1.py and the Source Compiler).
+# Every loaded file gets a batch in SRC_IngestManifest (path, size, mtime, sha256, target, rows) and each
+# SRC_* row carries that load_batch_id. A file is reloaded only when its content changed (or another loader
+# owns the current batch); the superseded batch's rows are then deleted, nothing else is touched.
+#
+# Batch life cycle: loading -> current -> superseded. New rows are written under a 'loading' batch first;
+# the swap (delete old rows, flip statuses) is one transaction, and 'loading' batches left by a crashed run
+# are rolled back by recover(). Row fingerprints (row_fingerprint.py) follow the batches they belong to; they are
+# forgotten before a batch's rows are deleted (rows another batch dropped as duplicates are copied from them).
+
+import hashlib
+from datetime import datetime
+from pathlib import Path
+import row_fingerprint as rf
+
+SRC_TABLES = ["SRC_Holdings", "SRC_Movements", "SRC_DailyValues", "SRC_CashAgenda", "SRC_GenericCalendar"]
+
+MANIFEST_DDL = """
+CREATE TABLE IF NOT EXISTS SRC_IngestManifest (
+  batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  source_name VARCHAR(128),
+  loader VARCHAR(32),
+  path VARCHAR(512) NOT NULL,
+  target_table VARCHAR(64) NOT NULL,
+  size_bytes INTEGER,
+  mtime REAL,
+  content_sha256 CHAR(64),
+  row_count INTEGER,
+  status VARCHAR(16) NOT NULL,
+  loaded_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_src_ingestmanifest_target_path ON SRC_IngestManifest(target_table, path, status);
+"""
+
+def sha256_of(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def rel_path(path: Path, base: Path) -> str:
+    # stable key whichever loader (and path spelling) delivered the file
+    try:
+        return Path(path).relative_to(base).as_posix()
+    except ValueError:
+        return Path(path).as_posix()
+
+def ensure_schema(conn, tables=SRC_TABLES):
+    conn.executescript(MANIFEST_DDL)
+    for t in tables:
+        cols = {r[1].lower() for r in conn.execute(f"PRAGMA table_info({t})")}
+        if cols and "load_batch_id" not in cols:
+            conn.execute(f"ALTER TABLE {t} ADD COLUMN load_batch_id INTEGER")
+        if cols:
+            # batch swaps delete by batch; the CDM refresh reads newly landed batches
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{t.lower()}_batch ON {t}(load_batch_id)")
+    conn.commit()
+
+def recover(conn):
+    # Roll back batches a previous run left half-written
+    for bid, target in conn.execute("SELECT batch_id, target_table FROM SRC_IngestManifest WHERE status='loading'").fetchall():
+        rf.forget(conn, target, [bid])
+        conn.execute(f"DELETE FROM {target} WHERE load_batch_id = ?", (bid,))
+        conn.execute("UPDATE SRC_IngestManifest SET status='failed' WHERE batch_id = ?", (bid,))
+    conn.commit()
+
+def current_batch(conn, target: str, path_key: str):
+    return conn.execute(
+        "SELECT batch_id, loader, size_bytes, mtime, content_sha256 FROM SRC_IngestManifest "
+        "WHERE target_table=? AND path=? AND status='current' ORDER BY batch_id DESC LIMIT 1",
+        (target, path_key)).fetchone()
+
+def check(conn, target: str, path: Path, base: Path, loader: str) -> dict:
+    """Decide whether `path` must be (re)loaded into `target`. Hashes only when size/mtime moved."""
+    st = path.stat()
+    key = rel_path(path, base)
+    info = {"path": key, "size": st.st_size, "mtime": st.st_mtime, "sha": None, "prev": None, "changed": True}
+    cur = current_batch(conn, target, key)
+    if cur:
+        bid, prev_loader, size, mtime, sha = cur
+        info["prev"] = bid
+        if prev_loader == loader and size == st.st_size and mtime == st.st_mtime:
+            info["changed"] = False
+            return info
+        info["sha"] = sha256_of(path)
+        if prev_loader == loader and sha == info["sha"]:
+            # touched but identical: remember the new mtime so the next run skips hashing
+            conn.execute("UPDATE SRC_IngestManifest SET mtime=? WHERE batch_id=?", (st.st_mtime, bid))
+            conn.commit()
+            info["changed"] = False
+            return info
+    if info["sha"] is None:
+        info["sha"] = sha256_of(path)
+    return info
+
+def begin_batch(conn, info: dict, target: str, loader: str, source_name: str = None) -> int:
+    cur = conn.execute(
+        "INSERT INTO SRC_IngestManifest (source_name, loader, path, target_table, size_bytes, mtime, content_sha256, "
+        "row_count, status, loaded_at) VALUES (?,?,?,?,?,?,?,NULL,'loading',?)",
+        (source_name, loader, info["path"], target, info["size"], info["mtime"], info["sha"],
+         datetime.now().isoformat(timespec="seconds")))
+    conn.commit()
+    return cur.lastrowid
+
+def finish_batch(conn, batch_id: int, target: str, row_count: int):
+    # One transaction: drop superseded rows of this file (and unattributed pre-manifest rows), flip statuses
+    path = conn.execute("SELECT path FROM SRC_IngestManifest WHERE batch_id=?", (batch_id,)).fetchone()[0]
+    old = [r[0] for r in conn.execute(
+        "SELECT batch_id FROM SRC_IngestManifest WHERE target_table=? AND path=? AND status='current'",
+        (target, path))]
+    rf.forget(conn, target, old)
+    for bid in old:
+        conn.execute(f"DELETE FROM {target} WHERE load_batch_id = ?", (bid,))
+    conn.execute(f"DELETE FROM {target} WHERE load_batch_id IS NULL")
+    conn.execute("UPDATE SRC_IngestManifest SET status='superseded' WHERE target_table=? AND path=? AND status='current'",
+                 (target, path))
+    conn.execute("UPDATE SRC_IngestManifest SET status='current', row_count=? WHERE batch_id=?", (row_count, batch_id))
+    conn.commit()
+
+def fail_batch(conn, batch_id: int, target: str):
+    conn.rollback()
+    rf.forget(conn, target, [batch_id])
+    conn.execute(f"DELETE FROM {target} WHERE load_batch_id = ?", (batch_id,))
+    conn.execute("UPDATE SRC_IngestManifest SET status='failed' WHERE batch_id=?", (batch_id,))
+    conn.commit()
+
+def reset(conn, tables):
+    # Full reload: empty the tables and retire their current batches
+    for t in tables:
+        try:
+            conn.execute(f"DELETE FROM {t}")
+        except Exception:
+            pass
+        rf.clear(conn, t)
+        conn.execute("UPDATE SRC_IngestManifest SET status='superseded' WHERE target_table=? AND status='current'", (t,))
+    conn.commit()
@@ -1,74 +1,119 @@
-import sqlite3
+# Move 3: SRC_* -> CDM (dimensions + facts).
+# Default is an incremental refresh: the SRC batches that landed (or were superseded) since the last run are
+# reduced to (portfolio_nk, date) partitions, each with a row count and an order-independent content hash.
+# Only partitions whose content actually changed are deleted and re-inserted, all facts in one transaction,
+# so a restated file touches just the portfolio-days that differ and a late correction for an old date lands.
+# Dimensions only gain new natural keys (surrogate keys stay stable). --full rebuilds everything as before.
+# CDM_Calendar is rebuilt from the source calendars each run (business_calendar.py).
+# Then fx_engine fills the base-currency columns of the rows this run inserted (and of older rows
+# whose rates were restated), and holding_intervals folds new evaluation dates into the run-length holdings.
+#   python load_cdm_phase1.py            (incremental)
+#   python load_cdm_phase1.py --full     (truncate & reload dims + facts)
+
+import argparse, hashlib, sqlite3
 from pathlib import Path
 from datetime import datetime
+import numpy as np
+import pandas as pd
+import ingest_manifest as im
+import bulk_load as bl
+import physical_design as phys
+import fx_engine as fx
+import business_calendar as bcal
+import holding_intervals as hi
+import position_engine as pe
+import run_metrics as rm
 
 BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
 DB   = BASE / "phase1.db"
 
-def run(cur, sql):
-    cur.executescript(sql)
-
-def count(cur, table):
-    return cur.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
-
-conn = sqlite3.connect(DB)
-cur  = conn.cursor()
-
-# --- DIMENSIONS: rebuild minimal current snapshots (idempotent) ---
-# means delete & reload today’s state for Portfolio/Security dims so re-running yields the same result (no duplicates)
-run(cur, """
-DELETE FROM CDM_Portfolio;
-DELETE FROM CDM_SecurityMaster;
+# Refresh bookkeeping: per fact and SRC batch, the partitions it contributed (row count + hash halves summed).
+REFRESH_DDL = """
+CREATE TABLE IF NOT EXISTS CDM_FactPartition (
+  fact_table VARCHAR(64) NOT NULL,
+  src_batch_id INTEGER NOT NULL,
+  portfolio_nk VARCHAR(64),
+  part_date DATE,
+  row_count INTEGER,
+  hash_hi INTEGER,
+  hash_lo INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_cdm_factpartition_batch ON CDM_FactPartition(fact_table, src_batch_id);
+CREATE TABLE IF NOT EXISTS CDM_RefreshState (
+  fact_table VARCHAR(64) PRIMARY KEY,
+  mode VARCHAR(16),
+  deps_sha256 CHAR(64),
+  partitions INTEGER,
+  refreshed_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_src_holdings_part ON SRC_Holdings(portfolio_nk, value_date);
+CREATE INDEX IF NOT EXISTS ix_src_dailyvalues_part ON SRC_DailyValues(portfolio_nk, value_date);
+CREATE INDEX IF NOT EXISTS ix_src_movements_part ON SRC_Movements(portfolio_nk, trade_date);
+CREATE INDEX IF NOT EXISTS ix_src_cashagenda_part ON SRC_CashAgenda(portfolio_nk, event_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_holdings_part ON CDM_Holdings(portfolio_sk, value_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_portfoliodailyvalues_part ON CDM_PortfolioDailyValues(portfolio_sk, value_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_part ON CDM_Transactions(portfolio_sk, trade_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_cashagenda_part ON CDM_CashAgenda(portfolio_sk, event_date);
+"""
 
+# --- DIMENSIONS ---
+# {holdings} etc. are batch filters on the SRC tables: "1" for a full rebuild, the new batches otherwise
+DIM_PORTFOLIO = """
 INSERT INTO CDM_Portfolio (portfolio_nk, name, base_ccy, strategy, legal_entity, pm_name, rm_name,
                            parent_portfolio_sk, row_eff_datetime, row_end_datetime, is_current)
 SELECT DISTINCT x.portfolio_nk, NULL, NULL, NULL, NULL, NULL, NULL, NULL,
        CURRENT_TIMESTAMP, NULL, 1
 FROM (
-  SELECT portfolio_nk FROM SRC_Holdings
+  SELECT portfolio_nk FROM SRC_Holdings WHERE {holdings}
   UNION
-  SELECT portfolio_nk FROM SRC_Movements
+  SELECT portfolio_nk FROM SRC_Movements WHERE {movements}
   UNION
-  SELECT portfolio_nk FROM SRC_DailyValues
+  SELECT portfolio_nk FROM SRC_DailyValues WHERE {daily_values}
   UNION
-  SELECT portfolio_nk FROM SRC_CashAgenda
+  SELECT portfolio_nk FROM SRC_CashAgenda WHERE {cash_agenda}
 ) x
-WHERE x.portfolio_nk IS NOT NULL AND TRIM(x.portfolio_nk) <> '';
+WHERE x.portfolio_nk IS NOT NULL AND TRIM(x.portfolio_nk) <> ''
+  AND NOT EXISTS (SELECT 1 FROM CDM_Portfolio p WHERE p.portfolio_nk = x.portfolio_nk)
+"""
 
+DIM_SECURITY = """
 INSERT INTO CDM_SecurityMaster (security_nk, isin, sedol, ticker, mic, name, type, subtype, ccy,
                                 issuer_sk, class_sk, row_eff_datetime, row_end_datetime, is_current)
 SELECT DISTINCT s.security_nk, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL,
        NULL, NULL, CURRENT_TIMESTAMP, NULL, 1
 FROM (
-  SELECT security_nk FROM SRC_Holdings
+  SELECT security_nk FROM SRC_Holdings WHERE {holdings}
   UNION
-  SELECT security_nk FROM SRC_CashAgenda
+  SELECT security_nk FROM SRC_CashAgenda WHERE {cash_agenda}
 ) s
-WHERE s.security_nk IS NOT NULL AND TRIM(s.security_nk) <> '';
-""")
-
-# --- FACTS: truncate & (re)load from SRC_* ---
-run(cur, """
-DELETE FROM CDM_Holdings;
-DELETE FROM CDM_PortfolioDailyValues;
-DELETE FROM CDM_Transactions;
-DELETE FROM CDM_CashAgenda;
-
--- HOLDINGS
-INSERT INTO CDM_Holdings (value_date, portfolio_sk, security_sk, qty, price, mv_native, mv_base)
+WHERE s.security_nk IS NOT NULL AND TRIM(s.security_nk) <> ''
+  AND NOT EXISTS (SELECT 1 FROM CDM_SecurityMaster m WHERE m.security_nk = s.security_nk)
+"""
+
+# CDM_SecurityMaster as created by migrate_sqlite_schema_all.py has no key column: new rows are numbered by rowid
+DIM_SECURITY_KEYS = "UPDATE CDM_SecurityMaster SET security_sk = rowid WHERE security_sk IS NULL"
+
+# --- FACTS ---
+# {scope} restricts the SRC rows to the partitions in _cdm_parts (empty for a full load)
+FACTS = [
+    {"table": "CDM_Holdings", "src": "SRC_Holdings", "alias": "sh", "src_date": "value_date",
+     "date": "value_date", "deps": [], "sql": """
+INSERT INTO CDM_Holdings (value_date, portfolio_sk, security_sk, qty, price, native_ccy, mv_native, mv_base)
 SELECT sh.value_date,
        p.portfolio_sk,
        s.security_sk,
        sh.qty_raw,
        sh.price_raw,
+       sh.native_ccy,
        CASE WHEN sh.qty_raw IS NOT NULL AND sh.price_raw IS NOT NULL
             THEN sh.qty_raw * sh.price_raw END AS mv_native,
-       NULL AS mv_base
-FROM SRC_Holdings sh
+       NULL AS mv_base                             -- fx_engine stage
+FROM SRC_Holdings sh {scope}
 JOIN CDM_Portfolio p ON p.portfolio_nk = sh.portfolio_nk
-LEFT JOIN CDM_SecurityMaster s ON s.security_nk = sh.security_nk;
-
--- PORTFOLIO DAILY VALUES
+LEFT JOIN CDM_SecurityMaster s ON s.security_nk = sh.security_nk
+"""},
+    {"table": "CDM_PortfolioDailyValues", "src": "SRC_DailyValues", "alias": "sd", "src_date": "value_date",
+     "date": "value_date", "deps": [], "sql": """
 INSERT INTO CDM_PortfolioDailyValues (value_date, portfolio_sk, eval_ccy,
                                       value_start, value_end, inflow, outflow,
                                       adj_inflow, pl_native, pl_base, avg_capital,
@@ -86,34 +131,43 @@ SELECT sd.value_date,
        sd.avg_capital,
        sd.index_val,
        sd.prev_index
-FROM SRC_DailyValues sd
-JOIN CDM_Portfolio p ON p.portfolio_nk = sd.portfolio_nk;
-
-
--- TRANSACTIONS (normalize txn_type via REF_TransactionMap; security optional)
+FROM SRC_DailyValues sd {scope}
+JOIN CDM_Portfolio p ON p.portfolio_nk = sd.portfolio_nk
+"""},
+    # TRANSACTIONS (normalize txn_type via REF_TransactionMap; security optional)
+    # security: the holding with the movement's position id (Identification number) in the same portfolio.
+    # qty: |amount| signed by REF_TransactionMap.qty_sign (0 = no position effect, NULL = signed by the source),
+    # NULL for an unmapped transaction type
+    {"table": "CDM_Transactions", "src": "SRC_Movements", "alias": "sm", "src_date": "trade_date",
+     "date": "trade_date", "deps": ["REF_TransactionMap"], "sql": """
 INSERT INTO CDM_Transactions (trade_id, trade_date, settle_date, portfolio_sk, security_sk,
-                              txn_type, qty, price, gross_amt_native, gross_amt_base,
+                              txn_type, qty, price, native_ccy, gross_amt_native, gross_amt_base,
                               fees_tax_native, fees_tax_base)
 SELECT sm.trade_id,
        sm.trade_date,
        sm.settle_date,
        p.portfolio_sk,
-       NULL AS security_sk,                        -- not present in SRC_Movements extract
+       (SELECT m.security_sk FROM SRC_Holdings h
+          JOIN CDM_SecurityMaster m ON m.security_nk = h.security_nk
+         WHERE h.position_id = sm.position_id AND h.portfolio_nk = sm.portfolio_nk
+         LIMIT 1) AS security_sk,
        COALESCE(r.txn_type, 'OTHER') AS txn_type,
-       NULL AS qty,                                -- not provided (cash vs security dependent)
+       CASE WHEN r.transaction_key IS NULL THEN NULL
+            WHEN r.qty_sign IS NULL THEN sm.amount_raw
+            ELSE r.qty_sign * ABS(sm.amount_raw) END AS qty,
        sm.price_raw,
+       sm.native_ccy,
        sm.amount_raw AS gross_amt_native,          -- use existing column
-       NULL AS gross_amt_base,
+       NULL AS gross_amt_base,                     -- fx_engine stage
        NULL AS fees_tax_native,
        NULL AS fees_tax_base
-FROM SRC_Movements sm
+FROM SRC_Movements sm {scope}
 JOIN CDM_Portfolio p ON p.portfolio_nk = sm.portfolio_nk
 LEFT JOIN REF_TransactionMap r
-  ON LOWER(TRIM(r.transaction_src)) = LOWER(TRIM(sm.transaction_src));
-
-
-
--- CASH AGENDA
+  ON r.transaction_key = sm.transaction_key      -- key(transaction_src), normalized at load
+"""},
+    {"table": "CDM_CashAgenda", "src": "SRC_CashAgenda", "alias": "sc", "src_date": "event_date",
+     "date": "event_date", "deps": [], "sql": """
 INSERT INTO CDM_CashAgenda (event_date, evaluation_date, portfolio_sk, security_sk,
                             cash_type, native_ccy, amt_native, amt_base,
                             pre_tax_native, pre_tax_eval, after_tax_native)
@@ -128,51 +182,311 @@ SELECT sc.event_date,
        sc.pre_tax_native,
        sc.pre_tax_eval,
        sc.after_tax_native
-FROM SRC_CashAgenda sc
+FROM SRC_CashAgenda sc {scope}
 JOIN CDM_Portfolio p ON p.portfolio_nk = sc.portfolio_nk
-LEFT JOIN CDM_SecurityMaster s ON s.security_nk = sc.security_nk;
-""")
+LEFT JOIN CDM_SecurityMaster s ON s.security_nk = sc.security_nk
+"""},
+]
+DIM_FILTERS = {"holdings": "SRC_Holdings", "movements": "SRC_Movements",
+               "daily_values": "SRC_DailyValues", "cash_agenda": "SRC_CashAgenda"}
 
-conn.commit()
+PART_KEY = ["portfolio_nk", "part_date"]
+DIGEST_COLS = ["row_count", "hash_hi", "hash_lo"]
+# stands in for NULL keys while partitions are compared in pandas (not a bare NUL: NumPy drops trailing NULs,
+# Series.where would turn it into '')
+NULL_KEY = "\x00NULL"
 
-# --- SIMPLE DQ & COUNTS ---
-tables = [
-    "CDM_Portfolio", "CDM_SecurityMaster",
-    "CDM_Holdings", "CDM_PortfolioDailyValues",
-    "CDM_Transactions", "CDM_CashAgenda"
-]
-print("Row counts:")
-for t in tables:
-    print(f"  {t:28s}", count(cur, t))
-
-# Leftover SRC rows without Portfolio match (should be zero)
-def leftover(src, port_col):
-    q = f"""
-    SELECT COUNT(*) FROM {src} s
-    LEFT JOIN CDM_Portfolio p ON p.portfolio_nk = s.{port_col}
-    WHERE s.{port_col} IS NOT NULL AND TRIM(s.{port_col}) <> '' AND p.portfolio_sk IS NULL;
-    """
-    return cur.execute(q).fetchone()[0]
-
-print("\nUnmatched portfolios (should be 0):")
-for src, col in [("SRC_Holdings","portfolio_nk"),
-                 ("SRC_Movements","portfolio_nk"),
-                 ("SRC_DailyValues","portfolio_nk"),
-                 ("SRC_CashAgenda","portfolio_nk")]:
-    print(f"  {src:16s}", leftover(src, col))
-
-# Date ranges (sanity)
-def minmax(table, col):
-    q = f"SELECT MIN({col}), MAX({col}) FROM {table}"
-    return cur.execute(q).fetchone()
-
-print("\nDate ranges:")
-print("  Holdings        ", minmax("CDM_Holdings","value_date"))
-print("  DailyValues     ", minmax("CDM_PortfolioDailyValues","value_date"))
-print("  Transactions TD ", minmax("CDM_Transactions","trade_date"))
-print("  Transactions SD ", minmax("CDM_Transactions","settle_date"))
-print("  CashAgenda      ", minmax("CDM_CashAgenda","event_date"))
-
-cur.close()
-conn.close()
-print("\nMove 3 complete.")
+# CDM_Transactions.security_sk is looked up in SRC_Holdings: Holdings batches landed or retired since the last
+# refresh also rebuild the transaction partitions of the positions they touch (Movements may land first).
+# New batches: the movements with a position id of theirs. Retired batches (rows already deleted from SRC):
+# the transactions on a security of their CDM_Holdings partitions -- run before CDM_Holdings is refreshed.
+RESOLVE_NEW = """
+SELECT DISTINCT sm.portfolio_nk, sm.trade_date AS part_date
+FROM (SELECT DISTINCT portfolio_nk, position_id FROM SRC_Holdings
+      WHERE {batches} AND position_id IS NOT NULL) h
+CROSS JOIN SRC_Movements sm ON sm.position_id = h.position_id AND sm.portfolio_nk = h.portfolio_nk
+"""
+RESOLVE_GONE = """
+SELECT DISTINCT p.portfolio_nk, c.trade_date AS part_date
+FROM (SELECT DISTINCT h.portfolio_sk, h.security_sk
+      FROM CDM_FactPartition g
+      CROSS JOIN CDM_Portfolio p ON p.portfolio_nk = g.portfolio_nk
+      CROSS JOIN CDM_Holdings h ON h.portfolio_sk = p.portfolio_sk AND h.value_date IS g.part_date
+      WHERE g.fact_table = 'CDM_Holdings' AND g.src_batch_id IN ({batches}) AND h.security_sk IS NOT NULL) s
+CROSS JOIN CDM_Transactions c ON c.portfolio_sk = s.portfolio_sk AND c.security_sk = s.security_sk
+JOIN CDM_Portfolio p ON p.portfolio_sk = s.portfolio_sk
+"""
+
+def count(cur, table):
+    with rm.stage("row_counts"):
+        return cur.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def ensure_schema(conn):
+    im.ensure_schema(conn)  # manifest + load_batch_id (also indexes the batch column)
+    conn.executescript(REFRESH_DDL)
+    fx.ensure_schema(conn)  # REF_FxRate + fx state, native_ccy on the facts that lacked it
+    hi.ensure_schema(conn)  # run-length holdings (CDM_HoldingInterval / CDM_HoldingPrice)
+    pe.ensure_columns(conn) # SRC_Movements.position_id, REF_TransactionMap.qty_sign (CDM_Transactions)
+    phys.ensure(conn)       # natural-key/date indexes, normalized join keys
+    conn.commit()
+
+def current_batches(conn, src: str) -> set:
+    b = {r[0] for r in conn.execute(
+        "SELECT batch_id FROM SRC_IngestManifest WHERE target_table=? AND status='current'", (src,))}
+    if conn.execute(f"SELECT 1 FROM {src} WHERE load_batch_id IS NULL LIMIT 1").fetchone():
+        b.add(0)  # rows landed before the manifest existed
+    return b
+
+def applied_batches(conn, fact: str) -> set:
+    return {r[0] for r in conn.execute(
+        "SELECT DISTINCT src_batch_id FROM CDM_FactPartition WHERE fact_table=?", (fact,))}
+
+def batch_filter(batches) -> str:
+    ids = sorted(b for b in batches if b)
+    parts = [f"load_batch_id IN ({','.join(map(str, ids))})"] if ids else []
+    if 0 in batches:
+        parts.append("load_batch_id IS NULL")
+    return "(" + " OR ".join(parts) + ")" if parts else "0"
+
+def deps_sha(conn, tables) -> str:
+    h = hashlib.sha256()
+    for t in tables:
+        try:
+            for r in conn.execute(f"SELECT * FROM {t} ORDER BY 1, 2"):
+                h.update(repr(r).encode("utf-8"))
+        except sqlite3.OperationalError:
+            h.update(f"{t}:missing".encode())
+    return h.hexdigest()
+
+def partition_digest(conn, fact: dict, batches) -> pd.DataFrame:
+    # One row per (partition, batch): row count + the two 32-bit halves of the row hashes, summed.
+    # Sums are order independent, so a reload of identical content digests to the same values.
+    df = pd.read_sql(f"SELECT * FROM {fact['src']} WHERE {batch_filter(batches)}", conn)
+    if df.empty:
+        return pd.DataFrame(columns=PART_KEY + ["src_batch_id"] + DIGEST_COLS)
+    h = pd.util.hash_pandas_object(df.drop(columns=["load_batch_id"]), index=False).to_numpy()
+    rows = pd.DataFrame({
+        "portfolio_nk": df["portfolio_nk"].astype(object).where(df["portfolio_nk"].notna(), NULL_KEY),
+        "part_date": df[fact["src_date"]].astype(object).where(df[fact["src_date"]].notna(), NULL_KEY),
+        "src_batch_id": df["load_batch_id"].fillna(0).astype("int64"),
+        "row_count": 1,
+        "hash_hi": (h >> np.uint64(32)).astype("int64"),
+        "hash_lo": (h & np.uint64(0xFFFFFFFF)).astype("int64"),
+    })
+    return rows.groupby(PART_KEY + ["src_batch_id"], as_index=False)[DIGEST_COLS].sum()
+
+def stored_digest(conn, fact: dict, batches) -> pd.DataFrame:
+    df = pd.read_sql(
+        f"SELECT portfolio_nk, part_date, src_batch_id, {', '.join(DIGEST_COLS)} FROM CDM_FactPartition "
+        f"WHERE fact_table=? AND src_batch_id IN ({','.join(map(str, sorted(batches))) or 'NULL'})",
+        conn, params=(fact["table"],))
+    for c in PART_KEY:
+        df[c] = df[c].astype(object).where(df[c].notna(), NULL_KEY)
+    return df
+
+def changed_partitions(new: pd.DataFrame, old: pd.DataFrame) -> pd.DataFrame:
+    a = new.groupby(PART_KEY)[DIGEST_COLS].sum()
+    b = old.groupby(PART_KEY)[DIGEST_COLS].sum()
+    m = a.join(b, how="outer", lsuffix="_new", rsuffix="_old").fillna(0)
+    diff = np.zeros(len(m), dtype=bool)
+    for c in DIGEST_COLS:
+        diff |= (m[c + "_new"] != m[c + "_old"]).to_numpy()
+    return m.index[diff].to_frame(index=False)
+
+def save_digest(conn, fact: dict, digest: pd.DataFrame, drop_batches=None):
+    if drop_batches is None:
+        conn.execute("DELETE FROM CDM_FactPartition WHERE fact_table=?", (fact["table"],))
+    elif drop_batches:
+        conn.execute(f"DELETE FROM CDM_FactPartition WHERE fact_table=? AND src_batch_id IN "
+                     f"({','.join(map(str, sorted(drop_batches)))})", (fact["table"],))
+    d = digest.copy()
+    for c in PART_KEY:
+        d[c] = d[c].where(d[c] != NULL_KEY, None)
+    bl.append(conn, "CDM_FactPartition", d.assign(fact_table=fact["table"]))
+
+def load_fact_full(conn, fact: dict, batches) -> int:
+    conn.execute(f"DELETE FROM {fact['table']}")
+    conn.execute(fact["sql"].format(scope=""))
+    digest = partition_digest(conn, fact, batches)
+    save_digest(conn, fact, digest)
+    return digest[PART_KEY].drop_duplicates().shape[0]
+
+PARTS_DDL = "CREATE TEMP TABLE IF NOT EXISTS _cdm_parts (portfolio_nk, part_date)"
+
+def partition_sql(fact: dict) -> tuple:
+    # (delete, insert) statements of a partition refresh; also explained by check_query_plans.py
+    a, d = fact["alias"], fact["src_date"]
+    delete = f"""
+        DELETE FROM {fact['table']} WHERE rowid IN (
+          SELECT c.rowid FROM _cdm_parts t  -- CROSS JOIN: drive from the (few) partitions into the fact index
+          CROSS JOIN CDM_Portfolio p ON p.portfolio_nk = t.portfolio_nk
+          CROSS JOIN {fact['table']} c ON c.portfolio_sk = p.portfolio_sk AND c.{fact['date']} IS t.part_date)"""
+    scope = f"JOIN _cdm_parts t ON t.portfolio_nk = {a}.portfolio_nk AND t.part_date IS {a}.{d}"
+    return delete, fact["sql"].format(scope=scope)
+
+def refresh_partitions(conn, fact: dict, parts: pd.DataFrame):
+    # delete + re-insert the CDM rows of the given (portfolio_nk, date) partitions from all current SRC rows
+    conn.execute(PARTS_DDL)
+    conn.execute("DELETE FROM _cdm_parts")
+    conn.executemany("INSERT INTO _cdm_parts VALUES (?, ?)",
+                     [tuple(None if v == NULL_KEY else v for v in r) for r in parts[PART_KEY].itertuples(index=False)])
+    for sql in partition_sql(fact):
+        conn.execute(sql)
+
+def resolved_partitions(conn, current: set) -> pd.DataFrame:
+    # CDM_Transactions partitions to rebuild for the SRC_Holdings batches (current) not applied to CDM_Holdings yet
+    parts = [pd.DataFrame(columns=PART_KEY)]
+    if conn.execute("SELECT 1 FROM CDM_RefreshState WHERE fact_table='CDM_Holdings'").fetchone():
+        applied = applied_batches(conn, "CDM_Holdings")
+        new, gone = current - applied, applied - current
+        if new:
+            parts.append(pd.read_sql(RESOLVE_NEW.format(batches=batch_filter(new)), conn))
+        if gone:
+            parts.append(pd.read_sql(RESOLVE_GONE.format(batches=",".join(map(str, sorted(gone)))), conn))
+    df = pd.concat(parts, ignore_index=True)
+    df["part_date"] = df["part_date"].astype(object).where(df["part_date"].notna(), NULL_KEY)
+    return df.drop_duplicates()
+
+def refresh_fact(conn, fact: dict, current: set, full: bool, extra: pd.DataFrame = None) -> tuple:
+    """Returns (mode, partitions rebuilt). extra: partitions to rebuild whatever their SRC batches did."""
+    state = conn.execute("SELECT deps_sha256 FROM CDM_RefreshState WHERE fact_table=?", (fact["table"],)).fetchone()
+    sha = deps_sha(conn, fact["deps"])
+    if full or state is None or state[0] != sha:
+        # first refresh, --full, or a REF map the fact depends on changed
+        with rm.stage(f"{fact['table']}:full", conn=conn):
+            mode, n = "full", load_fact_full(conn, fact, current)
+    else:
+        applied = applied_batches(conn, fact["table"])
+        new, gone = current - applied, applied - current
+        mode, n = "incremental", 0
+        if new or gone or (extra is not None and len(extra)):
+            with rm.stage(f"{fact['table']}:digest") as st:
+                digest = partition_digest(conn, fact, new)
+                parts = changed_partitions(digest, stored_digest(conn, fact, gone))
+                if extra is not None and len(extra):
+                    parts = pd.concat([parts, extra[PART_KEY]], ignore_index=True).drop_duplicates()
+                st.rows_out = len(parts)
+            if not parts.empty:
+                with rm.stage(f"{fact['table']}:partitions", conn=conn):
+                    refresh_partitions(conn, fact, parts)
+            with rm.stage(f"{fact['table']}:save_digest", conn=conn):
+                save_digest(conn, fact, digest, drop_batches=gone)
+            n = len(parts)
+    conn.execute("INSERT OR REPLACE INTO CDM_RefreshState (fact_table, mode, deps_sha256, partitions, refreshed_at) "
+                 "VALUES (?,?,?,?,?)", (fact["table"], mode, sha, n, datetime.now().isoformat(timespec="seconds")))
+    return mode, n
+
+def refresh(conn, full: bool = False) -> dict:
+    # Everything below runs in one transaction: readers see the old CDM or the new one, never a mix
+    current = {f["table"]: current_batches(conn, f["src"]) for f in FACTS}
+    out = {}
+    try:
+        if full:
+            conn.execute("DELETE FROM CDM_Portfolio")
+            conn.execute("DELETE FROM CDM_SecurityMaster")
+            filters = {k: "1" for k in DIM_FILTERS}
+        else:
+            # SRC rows not applied to CDM yet (for a fact refreshed in full next: all of its rows)
+            pending = {}
+            for f in FACTS:
+                st = conn.execute("SELECT 1 FROM CDM_RefreshState WHERE fact_table=?", (f["table"],)).fetchone()
+                pending[f["src"]] = current[f["table"]] - (applied_batches(conn, f["table"]) if st else set())
+            filters = {k: batch_filter(pending[src]) for k, src in DIM_FILTERS.items()}
+        with rm.stage("CDM_Portfolio", conn=conn):
+            conn.execute(DIM_PORTFOLIO.format(**filters))
+        with rm.stage("CDM_SecurityMaster", conn=conn):
+            conn.execute(DIM_SECURITY.format(**filters))
+            conn.execute(DIM_SECURITY_KEYS)
+        with rm.stage("CDM_Calendar") as st:
+            out["calendar"] = st.rows_out = bcal.build(conn)  # from the merged SRC calendars (rebuilt, a few k rows)
+
+        extra = {}
+        if not full:
+            with rm.stage("CDM_Transactions:holdings") as st:
+                extra["CDM_Transactions"] = resolved_partitions(conn, current["CDM_Holdings"])
+                st.rows_out = len(extra["CDM_Transactions"])
+        for f in FACTS:
+            with rm.stage(f["table"], conn=conn):
+                out[f["table"]] = refresh_fact(conn, f, current[f["table"]], full, extra.get(f["table"]))
+        with rm.stage("fx", conn=conn):
+            out["fx"] = fx.apply(conn)
+        with rm.stage("CDM_HoldingInterval", conn=conn):
+            out["intervals"] = hi.build(conn, full)  # after fx: its re-inserts move the holdings signatures
+    except Exception:
+        conn.rollback()
+        raise
+    with rm.stage("commit"):
+        conn.commit()
+    with rm.stage("analyze"):
+        phys.analyze(conn)
+    return out
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Move-3: SRC_* -> CDM (incremental by changed portfolio-day partitions)")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    ap.add_argument("--full", action="store_true", help="truncate & rebuild CDM dimensions and facts")
+    rm.add_arguments(ap)
+    args = ap.parse_args()
+
+    rm.start_from_args("load_cdm", args)
+    conn = sqlite3.connect(args.db)
+    cur  = conn.cursor()
+    with rm.stage("ensure_schema"):
+        ensure_schema(conn)
+    result = refresh(conn, full=args.full)
+
+    fx_result, cal_days, iv = result.pop("fx"), result.pop("calendar"), result.pop("intervals")
+    print("Refresh:")
+    for t, (mode, n) in result.items():
+        print(f"  {t:28s} {mode:12s} {n} partition(s)")
+    print(f"  {'CDM_Calendar':28s} rebuilt      {cal_days} day(s)")
+    print("FX (base-currency columns):")
+    for t, (n, r, miss) in fx_result.items():
+        print(f"  {t:28s} converted={n} re-inserted={r} unconverted={miss}")
+    print(f"Holding intervals: {iv['extended']} portfolio(s) extended, {iv['rebuilt']} rebuilt, "
+          f"{iv['intervals']} interval(s), {iv['prices']} price run(s) written")
+
+    # --- SIMPLE DQ & COUNTS ---
+    tables = [
+        "CDM_Portfolio", "CDM_SecurityMaster",
+        "CDM_Holdings", "CDM_PortfolioDailyValues",
+        "CDM_Transactions", "CDM_CashAgenda"
+    ]
+    print("\nRow counts:")
+    for t in tables:
+        print(f"  {t:28s}", count(cur, t))
+
+    # Leftover SRC rows without Portfolio match (should be zero)
+    def leftover(src, port_col):
+        q = f"""
+        SELECT COUNT(*) FROM {src} s
+        LEFT JOIN CDM_Portfolio p ON p.portfolio_nk = s.{port_col}
+        WHERE s.{port_col} IS NOT NULL AND TRIM(s.{port_col}) <> '' AND p.portfolio_sk IS NULL;
+        """
+        with rm.stage("unmatched_portfolios"):
+            return cur.execute(q).fetchone()[0]
+
+    print("\nUnmatched portfolios (should be 0):")
+    for src, col in [("SRC_Holdings","portfolio_nk"),
+                     ("SRC_Movements","portfolio_nk"),
+                     ("SRC_DailyValues","portfolio_nk"),
+                     ("SRC_CashAgenda","portfolio_nk")]:
+        print(f"  {src:16s}", leftover(src, col))
+
+    # Date ranges (sanity)
+    def minmax(table, col):
+        q = f"SELECT MIN({col}), MAX({col}) FROM {table}"
+        with rm.stage("date_ranges"):
+            return cur.execute(q).fetchone()
+
+    print("\nDate ranges:")
+    print("  Holdings        ", minmax("CDM_Holdings","value_date"))
+    print("  DailyValues     ", minmax("CDM_PortfolioDailyValues","value_date"))
+    print("  Transactions TD ", minmax("CDM_Transactions","trade_date"))
+    print("  Transactions SD ", minmax("CDM_Transactions","settle_date"))
+    print("  CashAgenda      ", minmax("CDM_CashAgenda","event_date"))
+
+    cur.close()
+    rm.finish(conn)
+    conn.close()
+    print("\nMove 3 complete.")
@@ -3,6 +3,12 @@ import argparse
 import sqlite3
 import pandas as pd
 from pathlib import Path
+import bulk_load as bl
+import physical_design as phys
+import fx_engine as fx
+import position_engine as pe
+
+REF_TABLES = ["REF_TransactionMap", "REF_AccountingMap", "REF_AssetClassMap"]
 
 def run_sql(conn, sql_text: str):
     cur = conn.cursor()
@@ -10,16 +16,38 @@ def run_sql(conn, sql_text: str):
         cur.execute(stmt)
     conn.commit()
 
-def main(db_path: str, ddl_file: str, transaction_map: str, accounting_map: str, assetclass_map: str):
+def drop_keyless_ref(conn):
+    # REF tables created by an earlier to_sql(if_exists="replace") lost their PRIMARY KEY: let the DDL recreate them
+    for t in REF_TABLES:
+        info = conn.execute(f"PRAGMA table_info({t})").fetchall()
+        if info and not any(r[5] for r in info):
+            conn.execute(f"DROP TABLE {t}")
+    conn.commit()
+
+def load_ref(conn, table: str, csv_path: str) -> int:
+    # reload in place: the DDL table (and its primary key) stays, a duplicate source key fails the load
+    conn.execute(f"DELETE FROM {table}")
+    return bl.append(conn, table, phys.add_keys(table, pd.read_csv(csv_path)))
+
+def main(db_path: str, ddl_file: str, transaction_map: str, accounting_map: str, assetclass_map: str,
+         fx_dir: str = None):
     db = Path(db_path)
     ddl = Path(ddl_file).read_text()
     conn = sqlite3.connect(db)
     try:
+        drop_keyless_ref(conn)
         run_sql(conn, ddl)
+        phys.ensure(conn)
+        pe.ensure_columns(conn)  # qty_sign / position_id on databases created before them
         # Load reference CSVs
-        pd.read_csv(transaction_map).to_sql("REF_TransactionMap", conn, if_exists="replace", index=False)
-        pd.read_csv(accounting_map).to_sql("REF_AccountingMap", conn, if_exists="replace", index=False)
-        pd.read_csv(assetclass_map).to_sql("REF_AssetClassMap", conn, if_exists="replace", index=False)
+        load_ref(conn, "REF_TransactionMap", transaction_map)
+        load_ref(conn, "REF_AccountingMap", accounting_map)
+        load_ref(conn, "REF_AssetClassMap", assetclass_map)
+        conn.commit()
+        fx.ensure_schema(conn)
+        if fx_dir:
+            print("FX rates loaded:", fx.load_rates(conn, Path(fx_dir)))
+        phys.analyze(conn)
         print("DDL applied and reference tables loaded.")
     finally:
         conn.close()
@@ -31,5 +59,6 @@ if __name__ == "__main__":
     p.add_argument("--ref_tx", default="ref_transaction_map.csv", help="REF_TransactionMap CSV path")
     p.add_argument("--ref_acc", default="ref_accounting_map.csv", help="REF_AccountingMap CSV path")
     p.add_argument("--ref_ac", default="ref_assetclass_map.csv", help="REF_AssetClassMap CSV path")
+    p.add_argument("--fx", default=r"data\source\fx", help="folder of FX rate CSVs -> REF_FxRate (skipped if absent)")
     args = p.parse_args()
-    main(args.db, args.ddl, args.ref_tx, args.ref_acc, args.ref_ac)
+    main(args.db, args.ddl, args.ref_tx, args.ref_acc, args.ref_ac, args.fx)
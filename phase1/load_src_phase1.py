@@ -1,15 +1,22 @@
 # This script loads your 11 files into the SRC_* tables in phase1.db, mapping the key columns
 # we defined. It auto-detects delimiter and tries encodings in this order: UTF-8 → cp1252 → latin1
 
-import csv, hashlib, sys
+import argparse, csv, hashlib, sys
 from pathlib import Path
 import pandas as pd
 import sqlite3
 from datetime import datetime
+import ingest_manifest as im
+import bulk_load as bl
+import physical_design as phys
+import run_metrics as rm
+import row_fingerprint as rf
 
 BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
 DB   = BASE / "phase1.db"
 SRC  = BASE / r"data\source"
+LOADER = "load_src"  # SRC_IngestManifest.loader
+DEDUPE = "drop"      # rows another delivery already loaded: drop | flag | off (row_fingerprint.py)
 
 # --- helpers ---
 def read_csv_any(path: Path) -> pd.DataFrame:
@@ -31,8 +38,12 @@ def pick(df: pd.DataFrame, mapping: dict) -> pd.DataFrame:
     return pd.DataFrame(out)
 
 def to_date(series: pd.Series) -> pd.Series:
-    # handle common Swiss/EU/ISO formats
-    return pd.to_datetime(series, errors="coerce", dayfirst=True).dt.date
+    # handle common Swiss/EU/ISO formats, and Excel serial day numbers (same range as the Source Compiler)
+    serial = pd.to_numeric(series, errors="coerce")
+    mask = serial.ge(25569) & serial.lt(80000)
+    out = pd.to_datetime(series.where(~mask), errors="coerce", dayfirst=True)
+    out[mask] = pd.to_datetime("1899-12-30") + pd.to_timedelta(serial[mask], unit="D")
+    return out.dt.date
 
 def to_num(series: pd.Series) -> pd.Series:
     # safe to numeric (handles commas as thousands if present)
@@ -40,13 +51,9 @@ def to_num(series: pd.Series) -> pd.Series:
     return pd.to_numeric(s.str.replace(",", ""), errors="coerce")
 
 def append_sql(conn, table: str, df: pd.DataFrame):
-    # only keep columns that exist in the table schema
-    cols = set(r[1] for r in conn.execute(f"PRAGMA table_info({table})"))
-    df = df[[c for c in df.columns if c in cols]]
-    if df.empty:
-        return 0
-    df.to_sql(table, conn, if_exists="append", index=False)
-    return len(df)
+    # only keep columns that exist in the table schema (bulk_load: executemany, no commit);
+    # normalized join keys (transaction_key) are derived here
+    return bl.append(conn, table, phys.add_keys(table, df))
 
 # --- file locations ---
 files = {
@@ -62,14 +69,9 @@ files = {
     "CashAgendaCalendar": SRC / r"calendars\CashAgendaCalendar.csv",
 }
 
-# --- load sequence ---
-conn = sqlite3.connect(DB)
-
-counts = {}
-
-# 1) Holdings -> SRC_Holdings
-if files["Holdings"].exists():
-    df = read_csv_any(files["Holdings"])
+# --- builders: source file -> SRC frame ---
+def build_holdings(path: Path) -> pd.DataFrame:
+    df = read_csv_any(path)
     m = {
         "Portfolio number": "portfolio_nk",
         "Evaluation date": "value_date",
@@ -84,11 +86,10 @@ if files["Holdings"].exists():
     if "value_date" in d: d["value_date"] = to_date(d["value_date"])
     for x in ("qty_raw","price_raw"):
         if x in d: d[x] = to_num(d[x])
-    counts["SRC_Holdings"] = append_sql(conn, "SRC_Holdings", d)
+    return d
 
-# 2) Movements -> SRC_Movements
-if files["Movements"].exists():
-    df = read_csv_any(files["Movements"])
+def build_movements(path: Path) -> pd.DataFrame:
+    df = read_csv_any(path)
     m = {
         "Transaction number": "trade_id",
         "Portfolio number": "portfolio_nk",
@@ -99,17 +100,17 @@ if files["Movements"].exists():
         "Price": "price_raw",
         "Amount": "amount_raw",
         "Currency": "native_ccy",
+        "Identification number": "position_id",
     }
     d = pick(df, m)
     for c in ("settle_date","trade_date"):
         if c in d: d[c] = to_date(d[c])
     for x in ("price_raw","amount_raw"):
         if x in d: d[x] = to_num(d[x])
-    counts["SRC_Movements"] = append_sql(conn, "SRC_Movements", d)
+    return d
 
-# 3) DailyValues -> SRC_DailyValues
-if files["DailyValues"].exists():
-    df = read_csv_any(files["DailyValues"])
+def build_daily_values(path: Path) -> pd.DataFrame:
+    df = read_csv_any(path)
     m = {
         "Portfolio number": "portfolio_nk",
         "Evaluation date": "value_date",
@@ -122,11 +123,10 @@ if files["DailyValues"].exists():
     if "value_date" in d: d["value_date"] = to_date(d["value_date"])
     for x in ("value_end","inflow","outflow"):
         if x in d: d[x] = to_num(d[x])
-    counts["SRC_DailyValues"] = append_sql(conn, "SRC_DailyValues", d)
+    return d
 
-# 4) CashAgenda -> SRC_CashAgenda
-if files["CashAgenda"].exists():
-    df = read_csv_any(files["CashAgenda"])
+def build_cash_agenda(path: Path) -> pd.DataFrame:
+    df = read_csv_any(path)
     m = {
         "Date": "event_date",
         "Evaluation date": "evaluation_date",
@@ -141,11 +141,9 @@ if files["CashAgenda"].exists():
     for c in ("event_date","evaluation_date"):
         if c in d: d[c] = to_date(d[c])
     if "amount_raw" in d: d["amount_raw"] = to_num(d["amount_raw"])
-    counts["SRC_CashAgenda"] = append_sql(conn, "SRC_CashAgenda", d)
+    return d
 
-# 5) Calendars -> SRC_GenericCalendar (append all)
-def load_calendar(p: Path):
-    if not p.exists(): return 0
+def build_calendar(p: Path) -> pd.DataFrame:
     df = read_csv_any(p)
     # tolerant date column naming
     candidates = [c for c in df.columns if c.strip().lower() in ("date","cal_date")]
@@ -168,13 +166,84 @@ def load_calendar(p: Path):
                 df[new] = df[col].astype(str).str.strip().str.lower().isin(("1","true","yes","y"))
                 df = df.drop(columns=[col])
     keep = [c for c in ("cal_date","day","month","week","quarter","year","is_month_end","is_year_end") if c in df.columns]
-    d = df[keep]
-    return append_sql(conn, "SRC_GenericCalendar", d)
+    return df[keep]
 
-cal_count = 0
-for name in ("DailyValuesCalendar","MovementsCalendar","CashAgendaCalendar"):
-    cal_count += load_calendar(files[name])
-counts["SRC_GenericCalendar"] = cal_count
+def load_tracked(conn, table: str, path: Path, build, skipped: list) -> int:
+    # Reload only when the file content changed since its current batch (SRC_IngestManifest);
+    # the superseded batch's rows are swapped out in one transaction
+    if not path.exists():
+        return 0
+    with rm.stage("manifest_check"):  # stat + content hash
+        info = im.check(conn, table, path, BASE, LOADER)
+    if not info["changed"]:
+        skipped.append(path.name)
+        return 0
+    bid = im.begin_batch(conn, info, table, LOADER, path.stem)
+    try:
+        with rm.stage(f"build:{path.stem}") as st:  # read + parse
+            d = build(path)
+            st.rows_out = len(d)
+        if table in rf.DEFAULT_TABLES and DEDUPE != "off":
+            with rm.stage("dedupe", rows_in=len(d)) as st:
+                d, _ = rf.dedupe(conn, table, d, bid, DEDUPE)
+                st.rows_out = len(d)
+        d["load_batch_id"] = bid
+        with rm.stage("append_sql", rows_in=len(d)) as st:
+            n = st.rows_out = append_sql(conn, table, d)
+    except Exception:
+        im.fail_batch(conn, bid, table)
+        raise
+    with rm.stage("finish_batch"):  # supersede + commit
+        im.finish_batch(conn, bid, table, n)
+    dup = rf.SEEN.pop(bid, 0)
+    if dup:
+        print(f"  [{path.name}] {dup} row(s) already loaded by another delivery "
+              f"({'dropped' if DEDUPE == 'drop' else 'loaded, flagged'})")
+    return n
 
-conn.close()
-print("Rows loaded:", counts)
+# --- load sequence ---
+def load_all(conn, full: bool = False) -> tuple:
+    """Move-2 over `files`; returns ({SRC table: rows loaded}, [unchanged files skipped])."""
+    im.ensure_schema(conn)
+    phys.ensure(conn)
+    rf.ensure_schema(conn)
+    im.recover(conn)
+    if full:
+        im.reset(conn, im.SRC_TABLES)
+
+    with bl.session(conn):  # load PRAGMAs + cached schemas, restored on exit
+        counts, skipped = {}, []
+        counts["SRC_Holdings"] = load_tracked(conn, "SRC_Holdings", files["Holdings"], build_holdings, skipped)
+        counts["SRC_Movements"] = load_tracked(conn, "SRC_Movements", files["Movements"], build_movements, skipped)
+        counts["SRC_DailyValues"] = load_tracked(conn, "SRC_DailyValues", files["DailyValues"], build_daily_values, skipped)
+        counts["SRC_CashAgenda"] = load_tracked(conn, "SRC_CashAgenda", files["CashAgenda"], build_cash_agenda, skipped)
+
+        # Calendars -> SRC_GenericCalendar (one batch per calendar file)
+        cal_count = 0
+        for name in ("DailyValuesCalendar","MovementsCalendar","CashAgendaCalendar"):
+            cal_count += load_tracked(conn, "SRC_GenericCalendar", files[name], build_calendar, skipped)
+        counts["SRC_GenericCalendar"] = cal_count
+
+    if any(counts.values()):
+        with rm.stage("analyze"):
+            phys.analyze(conn)  # planner statistics for Move-3
+    return counts, skipped
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Move-2: load source files into SRC_* (incremental by file content)")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    ap.add_argument("--full", action="store_true", help="empty the SRC_* tables and reload every file")
+    ap.add_argument("--dedupe", choices=rf.MODES, default=DEDUPE,
+                    help="rows already loaded by another delivery: drop, load and count (flag), or off")
+    rm.add_arguments(ap)
+    args = ap.parse_args()
+    rm.start_from_args("load_src", args)
+    DEDUPE = args.dedupe
+
+    conn = sqlite3.connect(args.db)
+    counts, skipped = load_all(conn, full=args.full)
+    rm.finish(conn)
+    conn.close()
+    print("Rows loaded:", counts)
+    if skipped:
+        print("Unchanged since last load (skipped):", skipped)
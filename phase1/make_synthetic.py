@@ -0,0 +1,368 @@
+# Synthetic source files for load and performance tests: Holdings, Movements, DailyValues, CashAgenda, the three
+# calendars, Parameters.csv and an FX rate file, laid out like data\source so every Move runs on them unchanged.
+# Same headers and shapes as the bank deliveries: semicolon-delimited, cp1252 (accented names), dd.mm.yyyy
+# dates, decimal identifiers ("26.032172.000.0"), sparse columns; optionally Excel serial dates in a share of
+# the date cells and European decimals ("1.234.567,89").
+#
+# Scale: --rows is the Holdings row count (10k .. 50M); the other files follow the sample's ratios because
+# everything is generated per portfolio (about ROWS_PER_PORTFOLIO holdings rows each), so 10x the rows is 10x
+# the portfolios over the same dates. Files are written in chunks of portfolios (bounded memory), and each
+# chunk draws from its own generator seeded (seed, file, chunk): same seed + rows = byte-identical files.
+#   python make_synthetic.py --rows 1000000 --out C:\bench\synth
+#   python make_synthetic.py --rows 100000 --serial-rate 0.01 --euro all
+
+import argparse, time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+
+MONTH_ENDS = 48              # holdings evaluation dates (month ends back from END)
+POSITIONS = 62               # positions per portfolio and evaluation date
+ROWS_PER_PORTFOLIO = MONTH_ENDS * POSITIONS
+MOVEMENTS_PER_PORTFOLIO = 3000
+DV_DAYS = 2550               # daily values (calendar days) per portfolio
+CASH_PER_PORTFOLIO = 560
+CHUNK_ROWS = 100000          # rows per generated/written chunk (bounds memory)
+END = np.datetime64("2025-06-30")
+EXCEL_EPOCH = np.datetime64("1899-12-30")
+FILES = {"Holdings": 1, "Movements": 2, "DailyValues": 3, "CashAgenda": 4}  # seed stream per file
+
+EVAL_CCY = "USD"
+CCYS = np.array(["USD", "EUR", "CHF", "GBP", "JPY"])
+CCY_P = [0.55, 0.2, 0.15, 0.07, 0.03]
+FX_LEVEL = {"EUR": 1.1, "CHF": 1.05, "GBP": 1.27, "JPY": 0.0075}
+ASSET_CLASSES = np.array(["Bonds", "Equities", "Funds"])
+COUNTRIES = np.array(["USA", "Switzerland", "Germany", "France", "United Kingdom", "Japan", "Österreich", "Curaçao"])
+ISSUERS = np.array(["Nestlé", "Zürich Insurance", "Société Générale", "Münchener Rück", "L'Oréal", "Crédit Agricole",
+                    "Banco Santander", "Alphabet", "Walgreen Boots", "Roche", "Novartis", "Lonza", "Siemens",
+                    "Hermès", "Bâloise", "Électricité de France", "Swiss Re", "Nordea", "Toyota", "Deere"])
+STRATEGIES = np.array(["Very Low Risk", "Low Risk", "Balanced", "Growth"])
+MANAGERS = np.array(["Bruno Iksil", "Amélie Dürr", "José Núñez", "Søren Kierkegård"])
+RMS = np.array(["Emmanuel Fragniere", "Chloé Grünig", "François Lévêque"])
+BANKS = np.array(["LGT, Geneva", "UBS, Zürich", "Pictet, Genève"])
+# (Transaction, Accounting) pairs as delivered; most map through REF_TransactionMap / REF_AccountingMap
+TX_TYPES = np.array([("Coupon payment", "Coupon"), ("Transaction fees", "Transaction fees"),
+                     ("Duties and taxes", "Duties and taxes"), ("Redemption", "Holding"), ("Purchase", "Holding"),
+                     ("Sale", "Holding"), ("Dividend (Gross)", "Dividend"), ("Coupon payment", "Counterparty holding"),
+                     ("Custody fee", "Fees"), ("Accrued interest", "Accrued Interest")])
+TX_P = [0.3, 0.17, 0.17, 0.05, 0.05, 0.04, 0.06, 0.1, 0.04, 0.02]
+CASH_TYPES = np.array([("Coupon", "Bonds"), ("Dividend", "Other positions"), ("Redemption", "Bonds"),
+                       ("Coupon", "Floating Rate Notes")])
+CASH_P = [0.6, 0.3, 0.07, 0.03]
+
+HEADERS = {
+    "Holdings": ["Description", "ISIN", "Identification number", "Quantity / amount", "Price", "Market to cost",
+                 "Weight", "Investment strategy", "Portfolio manager", "Relationship manager", "Evaluation date",
+                 "Portfolio number", "Total value in evaluation currency", "Trade currency", "Risk currency",
+                 "Duration", "YTM", "Duration x Total value in evaluation currency",
+                 "YTM x Total value in evaluation currency", "Position rank", "Country", "Asset class", "Price date",
+                 "Bank"],
+    "Movements": ["Ticket date", "Transaction", "Transaction number", "Amount", "Position", "Identification number",
+                  "Accounting", "Price", "Value in evaluation currency", "Portfolio number", "Booking date",
+                  "Value date", "Purchase date", "Portfolio instrument number", "Position instrument number",
+                  "Evaluation date", "Transaction value in evaluation currency",
+                  "Transaction interest in evaluation currency", "Transaction fees in evaluation currency",
+                  "Transaction duties and taxes in evaluation currency", "Fee basis in evaluation currency",
+                  "Transaction holding position", "Transaction holding amount", "Transaction counterparty position",
+                  "Transaction counterparty currency", "Transaction counterparty amount",
+                  "Transaction holding identification number", "Transaction counterparty identification number",
+                  "Value", "Currency", "Transaction holding currency"],
+    "DailyValues": ["Portfolio number", "Currency", "Value end", "Inflow", "Outflow", "Evaluation date",
+                    "PreviousIndex", "Index", "ValueStart", "AdjInFlow", "P&L", "AvgCapital"],
+    "CashAgenda": ["Date", "Type of cash flow", "Currency", "Quantity / Amount", "ISIN", "Position", "Cash flow type",
+                   "Month", "Identification number", "Portfolio instrument number", "Evaluation date",
+                   "Portfolio number", "Value pre-tax in trade currency", "Value pre-tax in evaluation currency",
+                   "Value after tax in trade currency"],
+}
+LAYOUT = {"Holdings": "portfolio/Holdings.csv", "Movements": "portfolio/Movements.csv",
+          "DailyValues": "performance/DailyValues.csv", "CashAgenda": "performance/CashAgenda.csv"}
+ENCODING = {"Holdings": "cp1252", "Movements": "cp1252", "DailyValues": "utf-8", "CashAgenda": "cp1252"}
+
+class Dates:
+    """Day numbers -> 'dd.mm.yyyy' through one lookup table; business days = Mon-Fri minus 1 Jan / 25 Dec.
+    days / bdays / month_ends run up to the evaluation date END, future_bdays over the year after it."""
+    def __init__(self, first: np.datetime64, last: np.datetime64):
+        self.first = first
+        every = np.arange(first, last + 1)
+        self.text = np.array(pd.DatetimeIndex(every).strftime("%d.%m.%Y"), dtype=object)
+        md = pd.DatetimeIndex(every)
+        hol = ((md.month == 1) & (md.day == 1)) | ((md.month == 12) & (md.day == 25))
+        past = every <= END
+        self.days = every[past]
+        self.bdays = every[past & (md.weekday < 5) & ~hol]
+        self.month_ends = every[past & md.is_month_end]
+        self.future_bdays = every[~past & (md.weekday < 5) & ~hol]
+
+    def fmt(self, d: np.ndarray, rng=None, serial_rate: float = 0.0) -> np.ndarray:
+        out = self.text[(d - self.first).astype(np.int64)]
+        if serial_rate and rng is not None:
+            # Excel exports: a share of the cells arrive as serial day numbers
+            m = rng.random(len(d)) < serial_rate
+            out = out.copy()
+            out[m] = (d[m] - EXCEL_EPOCH).astype(np.int64).astype(str)
+        return out
+
+def num(values: np.ndarray, decimals: int, euro: bool):
+    # European files: '.' groups thousands and ',' is the decimal mark (the Source Compiler detects it per column)
+    if not euro:
+        return np.round(values, decimals)
+    s = pd.Series(values).map(("{:,.%df}" % decimals).format)
+    return s.str.translate(str.maketrans(",.", ".,")).to_numpy(dtype=object)
+
+def cat(*parts):
+    # element-wise string concatenation on object arrays (much faster than np.char.add on long columns)
+    out = np.asarray(parts[0]).astype(object) if not isinstance(parts[0], str) else parts[0]
+    for p in parts[1:]:
+        out = out + (p if isinstance(p, str) else np.asarray(p).astype(object))
+    return out
+
+def blank(values, rng, rate: float):
+    # sparse columns: a share of the cells empty
+    out = np.asarray(values, dtype=object).copy()
+    out[rng.random(len(out)) < rate] = None
+    return out
+
+def portfolio_numbers(idx: np.ndarray) -> np.ndarray:
+    # the bank's portfolio numbers look like decimals: 10000.05 (formatted once per portfolio)
+    ports, inv = np.unique(idx, return_inverse=True)
+    return cat((10000 + ports // 100).astype(str), ".", np.char.zfill((ports % 100).astype(str), 2))[inv]
+
+class Universe:
+    """Securities shared by all files: ISIN, position identification number, name, currency, class, country."""
+    def __init__(self, n_portfolios: int, seed: int):
+        rng = np.random.default_rng([seed, 0])
+        n = int(min(200000, 400 + 5 * n_portfolios))
+        n += n % 7919 == 0  # positions of a portfolio step through the universe by 7919: keep them distinct
+        self.n = n
+        self.ccy = rng.choice(CCYS, n, p=CCY_P)
+        self.asset = rng.choice(ASSET_CLASSES, n, p=[0.6, 0.3, 0.1])
+        self.country = rng.choice(COUNTRIES, n)
+        cpn = rng.integers(50, 700, n) / 100
+        mat = rng.integers(2022, 2036, n)
+        issuer = rng.choice(ISSUERS, n)
+        bond = self.asset == "Bonds"
+        self.name = np.where(bond, cat(np.char.mod("%.2f%% ", cpn), issuer, " 19-15.06.", mat.astype(str)),
+                             cat(issuer, np.where(self.asset == "Funds", " Fund I", " N")))
+        prefix = np.where(self.country == "USA", "US", np.where(self.country == "Switzerland", "CH", "DE"))
+        self.isin = cat(prefix, np.char.zfill(np.arange(n).astype(str), 10))
+        self.ident = cat((10 + np.arange(n) % 40).astype(str), ".",
+                         np.char.zfill((np.arange(n) * 7 % 1000000).astype(str), 6), ".000.0")
+        self.price0 = np.where(bond, rng.uniform(85, 115, n), rng.uniform(10, 900, n))
+        self.duration = np.where(bond, rng.uniform(0.2, 9, n), 0.0)
+        self.ytm = np.where(bond, rng.uniform(0.001, 0.06, n), 0.0)
+
+def fx_of(ccy: np.ndarray) -> np.ndarray:
+    # evaluation-currency units per unit of ccy (the level the rate file starts from)
+    order = np.argsort(CCYS)
+    levels = np.array([FX_LEVEL.get(c, 1.0) for c in CCYS])[order]
+    return levels[np.searchsorted(CCYS[order], ccy)]
+
+# --- per-file chunk builders: (rng, portfolio indexes, context) -> DataFrame of the file's columns ---
+def holdings(rng, ports: np.ndarray, ctx) -> pd.DataFrame:
+    u, cal, euro = ctx["universe"], ctx["dates"], ctx["euro"].get("Holdings", False)
+    dates = cal.month_ends[-MONTH_ENDS:]
+    P, D, K = len(ports), len(dates), POSITIONS
+    start = rng.integers(0, u.n, P)
+    sec = (start[:, None] + np.arange(K)[None, :] * 7919) % u.n               # P x K, distinct per portfolio
+    sec = np.broadcast_to(sec[:, None, :], (P, D, K)).reshape(-1)
+    port = np.repeat(ports, D * K)
+    d = np.tile(np.repeat(dates, K), P)
+    qty = np.repeat((rng.integers(1, 400, P * K) * 5000).reshape(P, 1, K), D, axis=1).reshape(-1)
+    drift = np.cumsum(rng.normal(0, 0.01, (P, D, K)), axis=1).reshape(-1)
+    price = u.price0[sec] * np.exp(drift)
+    bond = u.asset[sec] == "Bonds"
+    value = qty * price * np.where(bond, 0.01, 1.0) * fx_of(u.ccy[sec])
+    pn = portfolio_numbers(port)
+    dtext = cal.fmt(d, rng, ctx["serial_rate"])
+    n = len(port)
+    return pd.DataFrame({
+        "Description": u.name[sec], "ISIN": blank(u.isin[sec], rng, 0.03), "Identification number": u.ident[sec],
+        "Quantity / amount": qty, "Price": num(price, 4, euro),
+        "Market to cost": blank(num(rng.normal(0, 0.05, n), 6, euro), rng, 0.98),
+        "Weight": blank(num(rng.uniform(0, 0.05, n), 6, euro), rng, 0.98),
+        "Investment strategy": STRATEGIES[port % len(STRATEGIES)], "Portfolio manager": MANAGERS[port % len(MANAGERS)],
+        "Relationship manager": RMS[port % len(RMS)], "Evaluation date": dtext, "Portfolio number": pn,
+        "Total value in evaluation currency": num(value, 3, euro), "Trade currency": u.ccy[sec],
+        "Risk currency": u.ccy[sec], "Duration": num(u.duration[sec], 6, euro), "YTM": num(u.ytm[sec], 6, euro),
+        "Duration x Total value in evaluation currency": num(u.duration[sec] * value, 3, euro),
+        "YTM x Total value in evaluation currency": num(u.ytm[sec] * value, 3, euro), "Position rank": None,
+        "Country": u.country[sec], "Asset class": u.asset[sec], "Price date": dtext, "Bank": BANKS[port % len(BANKS)],
+    })
+
+def movements(rng, ports: np.ndarray, ctx) -> pd.DataFrame:
+    u, cal, euro = ctx["universe"], ctx["dates"], ctx["euro"].get("Movements", False)
+    bdays = cal.bdays[-520:]                                                    # two years of bookings
+    n_per, P = MOVEMENTS_PER_PORTFOLIO, len(ports)
+    n = P * n_per
+    port = np.repeat(ports, n_per)
+    seq = np.tile(np.arange(n_per), P)
+    k = np.sort(rng.integers(0, len(bdays), (P, n_per)), axis=1).reshape(-1)
+    trade = bdays[k]
+    settle = bdays[np.minimum(k + 2, len(bdays) - 1)]
+    booking = bdays[np.minimum(k + rng.integers(0, 4, n), len(bdays) - 1)]
+    tx = TX_TYPES[rng.choice(len(TX_TYPES), n, p=TX_P)]
+    sec = (rng.integers(0, u.n, P)[:, None] + rng.integers(0, POSITIONS, (P, n_per)) * 7919).reshape(-1) % u.n
+    ccy = u.ccy[sec]
+    amount = np.round(rng.lognormal(9, 1.5, n), 2) * np.where(rng.random(n) < 0.5, -1, 1)
+    value = amount * fx_of(ccy)
+    pn = portfolio_numbers(port)
+    ident = u.ident[sec]
+    zero = np.zeros(n)
+    is_fee = np.isin(tx[:, 0], ["Transaction fees", "Custody fee"])
+    is_tax = tx[:, 0] == "Duties and taxes"
+    return pd.DataFrame({
+        "Ticket date": cal.fmt(trade, rng, ctx["serial_rate"]), "Transaction": tx[:, 0],
+        "Transaction number": cat(pn, "-", seq.astype(str)), "Amount": num(amount, 2, euro),
+        "Position": u.name[sec], "Identification number": blank(ident, rng, 0.58), "Accounting": tx[:, 1],
+        "Price": blank(num(u.price0[sec], 4, euro), rng, 0.35), "Value in evaluation currency": num(value, 2, euro),
+        "Portfolio number": pn, "Booking date": cal.fmt(booking), "Value date": cal.fmt(settle, rng, ctx["serial_rate"]),
+        "Purchase date": blank(cal.fmt(trade), rng, 0.69),
+        "Portfolio instrument number": cat(pn, "-", ident),
+        "Position instrument number": cat(u.name[sec], " (", ident, ")"),
+        "Evaluation date": cal.fmt(np.full(n, END)),
+        "Transaction value in evaluation currency": num(np.where(is_fee | is_tax, zero, value), 2, euro),
+        "Transaction interest in evaluation currency": num(np.where(tx[:, 1] == "Coupon", np.abs(value), zero), 2, euro),
+        "Transaction fees in evaluation currency": num(np.where(is_fee, np.abs(value), zero), 2, euro),
+        "Transaction duties and taxes in evaluation currency": num(np.where(is_tax, np.abs(value), zero), 2, euro),
+        "Fee basis in evaluation currency": num(np.abs(value), 2, euro),
+        "Transaction holding position": u.name[sec], "Transaction holding amount": num(amount, 2, euro),
+        "Transaction counterparty position": cat("Current Account ", ccy),
+        "Transaction counterparty currency": ccy, "Transaction counterparty amount": num(-amount, 2, euro),
+        "Transaction holding identification number": ident,
+        "Transaction counterparty identification number": blank(
+            cat("  .KK-", ccy, ".000.0.", pn), rng, 0.69),
+        "Value": num(value, 2, euro), "Currency": ccy, "Transaction holding currency": ccy,
+    })
+
+def daily_values(rng, ports: np.ndarray, ctx) -> pd.DataFrame:
+    cal, euro = ctx["dates"], ctx["euro"].get("DailyValues", False)
+    days = cal.days[-DV_DAYS:]
+    P, D = len(ports), len(days)
+    flows = np.where(rng.random((P, D)) < 0.02, np.round(rng.lognormal(12, 1, (P, D)), 2), 0.0)
+    inflow = np.where(rng.random((P, D)) < 0.5, flows, 0.0)
+    outflow = flows - inflow
+    ret = rng.normal(0.0002, 0.006, (P, D))
+    v0 = rng.lognormal(17, 1, P)
+    growth = np.exp(np.cumsum(ret, axis=1))
+    end = v0[:, None] * growth + np.cumsum(inflow - outflow, axis=1)
+    start = np.concatenate([v0[:, None], end[:, :-1]], axis=1)
+    pnl = end - start - inflow + outflow
+    port = np.repeat(ports, D)
+    idx = np.tile(np.arange(1, 2 * D, 2), P)
+    flat = lambda a: a.reshape(-1)
+    return pd.DataFrame({
+        "Portfolio number": portfolio_numbers(port), "Currency": EVAL_CCY, "Value end": num(flat(end), 1, euro),
+        "Inflow": num(flat(inflow), 2, euro), "Outflow": num(flat(outflow), 2, euro),
+        "Evaluation date": cal.fmt(np.tile(days, P)), "PreviousIndex": np.maximum(idx - 2, 1), "Index": idx,
+        "ValueStart": num(flat(start), 1, euro), "AdjInFlow": num(flat(inflow), 2, euro),
+        "P&L": num(flat(pnl), 1, euro), "AvgCapital": num(flat((start + end) / 2), 1, euro),
+    })
+
+def cash_agenda(rng, ports: np.ndarray, ctx) -> pd.DataFrame:
+    u, cal, euro = ctx["universe"], ctx["dates"], ctx["euro"].get("CashAgenda", False)
+    future = cal.future_bdays
+    n_per, P = CASH_PER_PORTFOLIO, len(ports)
+    n = P * n_per
+    port = np.repeat(ports, n_per)
+    sec = (rng.integers(0, u.n, P)[:, None] + rng.integers(0, POSITIONS, (P, n_per)) * 7919).reshape(-1) % u.n
+    d = np.sort(future[rng.integers(0, len(future), (P, n_per))], axis=1).reshape(-1)
+    kind = CASH_TYPES[rng.choice(len(CASH_TYPES), n, p=CASH_P)]
+    qty = rng.integers(1, 400, n) * 5000
+    pre = np.round(qty * u.ytm[sec] / 2 + (kind[:, 0] == "Dividend") * rng.uniform(100, 20000, n), 5)
+    ccy = u.ccy[sec]
+    pn = portfolio_numbers(port)
+    return pd.DataFrame({
+        "Date": cal.fmt(d), "Type of cash flow": kind[:, 0], "Currency": ccy, "Quantity / Amount": qty,
+        "ISIN": u.isin[sec], "Position": u.name[sec], "Cash flow type": kind[:, 1],
+        "Month": pd.DatetimeIndex(d).month, "Identification number": u.ident[sec],
+        "Portfolio instrument number": cat(pn, "-", u.ident[sec]),
+        "Evaluation date": cal.fmt(np.full(n, END)), "Portfolio number": pn,
+        "Value pre-tax in trade currency": num(pre, 5, euro), "Value pre-tax in evaluation currency":
+            num(pre * fx_of(ccy), 5, euro), "Value after tax in trade currency": num(pre * 0.65, 5, euro),
+    })
+
+BUILDERS = {"Holdings": (holdings, ROWS_PER_PORTFOLIO), "Movements": (movements, MOVEMENTS_PER_PORTFOLIO),
+            "DailyValues": (daily_values, DV_DAYS), "CashAgenda": (cash_agenda, CASH_PER_PORTFOLIO)}
+
+def write_file(path: Path, name: str, n_portfolios: int, seed: int, ctx: dict, sep: str) -> int:
+    build, per = BUILDERS[name]
+    step = max(1, CHUNK_ROWS // per)
+    rows = 0
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding=ENCODING[name], newline="") as f:
+        for c, lo in enumerate(range(0, n_portfolios, step)):
+            rng = np.random.default_rng([seed, FILES[name], c])
+            df = build(rng, np.arange(lo, min(lo + step, n_portfolios)), ctx)
+            df[HEADERS[name]].to_csv(f, sep=sep, index=False, header=c == 0, lineterminator="\n")
+            rows += len(df)
+    return rows
+
+def write_calendars(out: Path, cal: Dates) -> dict:
+    folder = out / "calendars"
+    folder.mkdir(parents=True, exist_ok=True)
+    dv = cal.days[-DV_DAYS:]
+    mv = cal.bdays[-520:]
+    pd.DataFrame({"Date": cal.fmt(dv)}).to_csv(folder / "DailyValuesCalendar.csv", index=False, lineterminator="\n")
+    pd.DataFrame({"Date": cal.fmt(mv)}).to_csv(folder / "MovementsCalendar.csv", index=False, lineterminator="\n")
+    ca = np.arange(END + 1, cal.future_bdays[-1] + 1)
+    idx = pd.DatetimeIndex(ca)
+    month_end = (idx + pd.offsets.MonthEnd(0)).strftime("%d.%m.%Y")
+    year_end = (idx + pd.offsets.YearEnd(0)).strftime("%d.%m.%Y")
+    pd.DataFrame({"Date": idx.strftime("%d.%m.%Y"), "Day": idx.day, "Month": idx.month,
+                  "Week of Year": idx.isocalendar().week.to_numpy(), "Quarter": idx.quarter,
+                  "End of Month": month_end, "Year": idx.year, "End of Year": year_end}
+                 ).to_csv(folder / "CashAgendaCalendar.csv", sep=";", index=False, lineterminator="\n")
+    return {"DailyValuesCalendar": len(dv), "MovementsCalendar": len(mv), "CashAgendaCalendar": len(ca)}
+
+def write_fx(out: Path, cal: Dates, seed: int) -> int:
+    # daily rates of every trade currency against the evaluation currency (direct quotes, one file)
+    rng = np.random.default_rng([seed, 9])
+    days = cal.bdays
+    frames = []
+    for c in CCYS:
+        if c == EVAL_CCY:
+            continue
+        walk = FX_LEVEL[c] * np.exp(np.cumsum(rng.normal(0, 0.004, len(days))))
+        frames.append(pd.DataFrame({"date": cal.fmt(days), "base": c, "quote": EVAL_CCY, "rate": np.round(walk, 6)}))
+    (out / "fx").mkdir(parents=True, exist_ok=True)
+    df = pd.concat(frames, ignore_index=True)
+    df.to_csv(out / "fx" / "rates.csv", sep=";", index=False, lineterminator="\n")
+    return len(df)
+
+def generate(out: Path, rows: int, seed: int = 42, serial_rate: float = 0.002, euro=("CashAgenda",),
+             sep: str = ";") -> dict:
+    """Write the synthetic data\\source tree under `out`; returns {file: rows}."""
+    n_portfolios = max(1, round(rows / ROWS_PER_PORTFOLIO))
+    cal = Dates(END - np.timedelta64(DV_DAYS + 400, "D"), END + np.timedelta64(365, "D"))
+    ctx = {"universe": Universe(n_portfolios, seed), "dates": cal,
+           "serial_rate": serial_rate, "euro": {name: True for name in euro}}
+    counts = {}
+    for name in BUILDERS:
+        counts[name] = write_file(out / LAYOUT[name], name, n_portfolios, seed, ctx, sep)
+    counts.update(write_calendars(out, cal))
+    (out / "ref_specs").mkdir(parents=True, exist_ok=True)
+    (out / "ref_specs" / "Parameters.csv").write_text(f"Evaluation currency\n{EVAL_CCY}\n", encoding="utf-8")
+    counts["fx"] = write_fx(out, cal, seed)
+    return counts
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Synthetic source files (data\\source layout) at a given scale")
+    ap.add_argument("--rows", type=int, default=100000, help="Holdings rows (other files scale with it)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default=str(BASE.parent / r"phase1_synthetic\data\source"),
+                    help="folder to write the data\\source tree into")
+    ap.add_argument("--serial-rate", type=float, default=0.002,
+                    help="share of Holdings/Movements date cells written as Excel serial numbers")
+    ap.add_argument("--euro", nargs="*", default=["CashAgenda"],
+                    help=f"files written with European decimals ('all' or some of {list(BUILDERS)})")
+    ap.add_argument("--sep", default=";", help="delimiter of the four fact files")
+    args = ap.parse_args()
+
+    euro = list(BUILDERS) if args.euro == ["all"] else args.euro
+    t0 = time.perf_counter()
+    counts = generate(Path(args.out), args.rows, args.seed, args.serial_rate, euro, args.sep)
+    print(f"Synthetic sources in {args.out} ({time.perf_counter() - t0:.1f}s):")
+    for k, v in counts.items():
+        print(f"  {k:22s} {v:>12,d} rows")
@@ -2,7 +2,9 @@
 -- Phase 1 Schema DDL (SRC, CDM, REF) — subset to start
 CREATE TABLE IF NOT EXISTS REF_TransactionMap (
   transaction_src VARCHAR(128) PRIMARY KEY,
-  txn_type VARCHAR(32) NOT NULL
+  txn_type VARCHAR(32) NOT NULL,
+  transaction_key VARCHAR(128),
+  qty_sign INTEGER
 );
 CREATE TABLE IF NOT EXISTS REF_AccountingMap (
   accounting_src VARCHAR(128) PRIMARY KEY,
@@ -20,7 +22,8 @@ CREATE TABLE IF NOT EXISTS SRC_GenericCalendar (
   quarter INT,
   year INT,
   is_month_end BOOLEAN,
-  is_year_end BOOLEAN
+  is_year_end BOOLEAN,
+  load_batch_id INTEGER
 );
 CREATE TABLE IF NOT EXISTS SRC_Holdings (
   portfolio_nk VARCHAR(64),
@@ -30,7 +33,8 @@ CREATE TABLE IF NOT EXISTS SRC_Holdings (
   security_name VARCHAR(512),
   qty_raw DECIMAL(38,10),
   price_raw DECIMAL(38,10),
-  native_ccy CHAR(3)
+  native_ccy CHAR(3),
+  load_batch_id INTEGER
 );
 CREATE TABLE IF NOT EXISTS SRC_Movements (
   trade_id VARCHAR(64),
@@ -38,10 +42,13 @@ CREATE TABLE IF NOT EXISTS SRC_Movements (
   settle_date DATE,
   trade_date DATE,
   transaction_src VARCHAR(128),
+  transaction_key VARCHAR(128),
   accounting_src VARCHAR(128),
   price_raw DECIMAL(38,10),
   amount_raw DECIMAL(38,10),
-  native_ccy CHAR(3)
+  native_ccy CHAR(3),
+  position_id VARCHAR(64),
+  load_batch_id INTEGER
 );
 CREATE TABLE IF NOT EXISTS SRC_DailyValues (
   portfolio_nk VARCHAR(64),
@@ -49,7 +56,8 @@ CREATE TABLE IF NOT EXISTS SRC_DailyValues (
   eval_ccy CHAR(3),
   value_end DECIMAL(38,10),
   inflow DECIMAL(38,10),
-  outflow DECIMAL(38,10)
+  outflow DECIMAL(38,10),
+  load_batch_id INTEGER
 );
 CREATE TABLE IF NOT EXISTS SRC_CashAgenda (
   event_date DATE,
@@ -59,8 +67,28 @@ CREATE TABLE IF NOT EXISTS SRC_CashAgenda (
   cash_flow_type_src VARCHAR(64),
   asset_bucket_src VARCHAR(64),
   native_ccy CHAR(3),
-  amount_raw DECIMAL(38,10)
+  amount_raw DECIMAL(38,10),
+  load_batch_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS SRC_IngestManifest (
+  batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  source_name VARCHAR(128),
+  loader VARCHAR(32),
+  path VARCHAR(512) NOT NULL,
+  target_table VARCHAR(64) NOT NULL,
+  size_bytes INTEGER,
+  mtime REAL,
+  content_sha256 CHAR(64),
+  row_count INTEGER,
+  status VARCHAR(16) NOT NULL,
+  loaded_at TIMESTAMP
 );
+CREATE INDEX IF NOT EXISTS ix_src_ingestmanifest_target_path ON SRC_IngestManifest(target_table, path, status);
+CREATE INDEX IF NOT EXISTS ix_src_holdings_batch ON SRC_Holdings(load_batch_id);
+CREATE INDEX IF NOT EXISTS ix_src_movements_batch ON SRC_Movements(load_batch_id);
+CREATE INDEX IF NOT EXISTS ix_src_dailyvalues_batch ON SRC_DailyValues(load_batch_id);
+CREATE INDEX IF NOT EXISTS ix_src_cashagenda_batch ON SRC_CashAgenda(load_batch_id);
+CREATE INDEX IF NOT EXISTS ix_src_genericcalendar_batch ON SRC_GenericCalendar(load_batch_id);
 CREATE TABLE IF NOT EXISTS CDM_Portfolio (
   portfolio_sk INTEGER PRIMARY KEY AUTOINCREMENT,
   portfolio_nk VARCHAR(64) NOT NULL,
@@ -93,6 +121,7 @@ CREATE TABLE IF NOT EXISTS CDM_Holdings (
   security_sk INTEGER,
   qty DECIMAL(38,10),
   price DECIMAL(38,10),
+  native_ccy CHAR(3),
   mv_native DECIMAL(38,10),
   mv_base DECIMAL(38,10)
 );
@@ -106,6 +135,7 @@ CREATE TABLE IF NOT EXISTS CDM_Transactions (
   txn_type VARCHAR(32) NOT NULL,
   qty DECIMAL(38,10),
   price DECIMAL(38,10),
+  native_ccy CHAR(3),
   gross_amt_native DECIMAL(38,10),
   gross_amt_base DECIMAL(38,10)
 );
@@ -120,3 +150,139 @@ CREATE TABLE IF NOT EXISTS CDM_CashAgenda (
   amt_native DECIMAL(38,10),
   amt_base DECIMAL(38,10)
 );
+-- Incremental CDM refresh (load_cdm_phase1.py)
+CREATE TABLE IF NOT EXISTS CDM_FactPartition (
+  fact_table VARCHAR(64) NOT NULL,
+  src_batch_id INTEGER NOT NULL,
+  portfolio_nk VARCHAR(64),
+  part_date DATE,
+  row_count INTEGER,
+  hash_hi INTEGER,
+  hash_lo INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_cdm_factpartition_batch ON CDM_FactPartition(fact_table, src_batch_id);
+CREATE TABLE IF NOT EXISTS CDM_RefreshState (
+  fact_table VARCHAR(64) PRIMARY KEY,
+  mode VARCHAR(16),
+  deps_sha256 CHAR(64),
+  partitions INTEGER,
+  refreshed_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_src_holdings_part ON SRC_Holdings(portfolio_nk, value_date);
+CREATE INDEX IF NOT EXISTS ix_src_dailyvalues_part ON SRC_DailyValues(portfolio_nk, value_date);
+CREATE INDEX IF NOT EXISTS ix_src_movements_part ON SRC_Movements(portfolio_nk, trade_date);
+CREATE INDEX IF NOT EXISTS ix_src_cashagenda_part ON SRC_CashAgenda(portfolio_nk, event_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_holdings_part ON CDM_Holdings(portfolio_sk, value_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_portfoliodailyvalues_part ON CDM_PortfolioDailyValues(portfolio_sk, value_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_part ON CDM_Transactions(portfolio_sk, trade_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_cashagenda_part ON CDM_CashAgenda(portfolio_sk, event_date);
+-- Natural-key / fact-date indexes (physical_design.py also covers CDM_SecurityMaster and migrated columns)
+CREATE INDEX IF NOT EXISTS ix_ref_transactionmap_key ON REF_TransactionMap(transaction_key);
+CREATE INDEX IF NOT EXISTS ix_src_holdings_date ON SRC_Holdings(value_date);
+CREATE INDEX IF NOT EXISTS ix_src_holdings_security ON SRC_Holdings(security_nk);
+CREATE INDEX IF NOT EXISTS ix_src_movements_trade_date ON SRC_Movements(trade_date);
+CREATE INDEX IF NOT EXISTS ix_src_movements_settle_date ON SRC_Movements(settle_date);
+CREATE INDEX IF NOT EXISTS ix_src_movements_key ON SRC_Movements(transaction_key);
+CREATE INDEX IF NOT EXISTS ix_src_dailyvalues_date ON SRC_DailyValues(value_date);
+CREATE INDEX IF NOT EXISTS ix_src_cashagenda_date ON SRC_CashAgenda(event_date);
+CREATE INDEX IF NOT EXISTS ix_src_cashagenda_security ON SRC_CashAgenda(security_nk);
+CREATE INDEX IF NOT EXISTS ix_src_genericcalendar_date ON SRC_GenericCalendar(cal_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_portfolio_nk ON CDM_Portfolio(portfolio_nk);
+CREATE INDEX IF NOT EXISTS ix_cdm_holdings_date ON CDM_Holdings(value_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_holdings_security ON CDM_Holdings(security_sk);
+CREATE INDEX IF NOT EXISTS ix_cdm_portfoliodailyvalues_date ON CDM_PortfolioDailyValues(value_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_trade_date ON CDM_Transactions(trade_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_settle_date ON CDM_Transactions(settle_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_security ON CDM_Transactions(security_sk);
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_dupkey ON CDM_Transactions(portfolio_sk, trade_id, security_sk, trade_date, settle_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_cashagenda_date ON CDM_CashAgenda(event_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_cashagenda_security ON CDM_CashAgenda(security_sk);
+CREATE INDEX IF NOT EXISTS ix_cdm_cashagenda_dupkey ON CDM_CashAgenda(portfolio_sk, security_sk, event_date, cash_type);
+-- Materialized returns (returns_engine.py)
+CREATE TABLE IF NOT EXISTS CDM_PortfolioReturns (
+  portfolio_sk INTEGER NOT NULL,
+  value_date DATE NOT NULL,
+  r_daily DECIMAL(38,10),
+  twr_index DECIMAL(38,10),
+  r_mtd DECIMAL(38,10),
+  r_qtd DECIMAL(38,10),
+  r_ytd DECIMAL(38,10),
+  r_itd DECIMAL(38,10),
+  PRIMARY KEY (portfolio_sk, value_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS CDM_PortfolioMWR (
+  portfolio_sk INTEGER NOT NULL,
+  period VARCHAR(8) NOT NULL,
+  start_date DATE,
+  end_date DATE,
+  mwr_period DECIMAL(38,10),
+  mwr_annual DECIMAL(38,10),
+  PRIMARY KEY (portfolio_sk, period)
+);
+CREATE TABLE IF NOT EXISTS CDM_ReturnsState (
+  portfolio_sk INTEGER PRIMARY KEY,
+  row_count INTEGER,
+  max_rowid INTEGER,
+  sum_rowid INTEGER,
+  computed_at TIMESTAMP
+);
+-- FX rates and base-currency conversion state (fx_engine.py)
+CREATE TABLE IF NOT EXISTS REF_FxRate (
+  base_ccy CHAR(3) NOT NULL,
+  quote_ccy CHAR(3) NOT NULL,
+  rate_date DATE NOT NULL,
+  rate DECIMAL(38,10) NOT NULL,
+  PRIMARY KEY (base_ccy, quote_ccy, rate_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS CDM_FxApplied (
+  base_ccy CHAR(3) NOT NULL,
+  quote_ccy CHAR(3) NOT NULL,
+  rate_date DATE NOT NULL,
+  rate DECIMAL(38,10) NOT NULL,
+  PRIMARY KEY (base_ccy, quote_ccy, rate_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS CDM_FxState (
+  fact_table VARCHAR(64) PRIMARY KEY,
+  eval_ccy CHAR(3),
+  max_rowid INTEGER,
+  converted INTEGER,
+  rewritten INTEGER,
+  converted_at TIMESTAMP
+);
+
+-- Source Compiler quarantine, one row per rejected source record (source-compiler/src/quarantine.py)
+CREATE TABLE IF NOT EXISTS SRC_Quarantine (
+  q_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  run_id VARCHAR(32),
+  batch_id INTEGER,
+  source_name VARCHAR(128),
+  path VARCHAR(512),
+  line_no INTEGER,
+  reason VARCHAR(64) NOT NULL,
+  raw_json TEXT,
+  status VARCHAR(16) NOT NULL DEFAULT 'open',
+  redrive_batch_id INTEGER,
+  quarantined_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_src_quarantine_reason ON SRC_Quarantine(reason, source_name);
+CREATE INDEX IF NOT EXISTS ix_src_quarantine_source ON SRC_Quarantine(source_name, batch_id);
+CREATE INDEX IF NOT EXISTS ix_src_quarantine_run ON SRC_Quarantine(run_id);
+CREATE INDEX IF NOT EXISTS ix_src_quarantine_batch ON SRC_Quarantine(batch_id);
+
+-- Per-stage run metrics, one row per program stage per run (run_metrics.py)
+CREATE TABLE IF NOT EXISTS RUN_Metrics (
+  run_id VARCHAR(32) NOT NULL,
+  program VARCHAR(64) NOT NULL,
+  stage VARCHAR(128) NOT NULL,
+  parent VARCHAR(128),
+  calls INTEGER,
+  wall_s REAL,
+  cpu_s REAL,
+  rows_in INTEGER,
+  rows_out INTEGER,
+  rows_per_s REAL,
+  peak_mb REAL,
+  started_at TIMESTAMP,
+  PRIMARY KEY (run_id, program, stage)
+);
+CREATE INDEX IF NOT EXISTS ix_run_metrics_stage ON RUN_Metrics(program, stage, run_id);
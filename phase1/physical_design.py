@@ -0,0 +1,93 @@
+# Physical design of phase1.db: secondary indexes, normalized join keys and planner statistics.
+# Shared by the loaders (Move 1/2/3/5) and check_query_plans.py.
+#
+# - every natural key and fact date column is indexed (the CDM build and the DQ report look rows up by them)
+# - join keys that used to be compared as LOWER(TRIM(x)) are stored pre-normalized in *_key columns at load
+#   time (key_value() below, applied in pandas by add_keys() and in SQL through the registered key() function),
+#   so REF_TransactionMap joins SRC_Movements on an indexed equality
+# - analyze() refreshes sqlite_stat1 after a load so the planner picks those indexes
+
+import sqlite3
+import pandas as pd
+
+# table -> {normalized column: source column}
+KEY_COLUMNS = {
+    "REF_TransactionMap": {"transaction_key": "transaction_src"},
+    "SRC_Movements": {"transaction_key": "transaction_src"},
+}
+
+# Tables large enough that a full scan in the CDM build / DQ report is a finding (check_query_plans.py)
+LARGE_TABLES = ["SRC_Holdings", "SRC_Movements", "SRC_DailyValues", "SRC_CashAgenda",
+                "CDM_Holdings", "CDM_PortfolioDailyValues", "CDM_Transactions", "CDM_CashAgenda"]
+
+# Statements may reference tables/columns that only exist after migrate_sqlite_schema_all.py: ensure() skips those
+INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS ix_ref_transactionmap_key ON REF_TransactionMap(transaction_key);
+CREATE INDEX IF NOT EXISTS ix_src_holdings_date ON SRC_Holdings(value_date);
+CREATE INDEX IF NOT EXISTS ix_src_holdings_security ON SRC_Holdings(security_nk);
+CREATE INDEX IF NOT EXISTS ix_src_holdings_position ON SRC_Holdings(position_id, portfolio_nk);
+CREATE INDEX IF NOT EXISTS ix_src_movements_position ON SRC_Movements(position_id, portfolio_nk);
+CREATE INDEX IF NOT EXISTS ix_src_movements_trade_date ON SRC_Movements(trade_date);
+CREATE INDEX IF NOT EXISTS ix_src_movements_settle_date ON SRC_Movements(settle_date);
+CREATE INDEX IF NOT EXISTS ix_src_movements_key ON SRC_Movements(transaction_key);
+CREATE INDEX IF NOT EXISTS ix_src_dailyvalues_date ON SRC_DailyValues(value_date);
+CREATE INDEX IF NOT EXISTS ix_src_cashagenda_date ON SRC_CashAgenda(event_date);
+CREATE INDEX IF NOT EXISTS ix_src_cashagenda_security ON SRC_CashAgenda(security_nk);
+CREATE INDEX IF NOT EXISTS ix_src_genericcalendar_date ON SRC_GenericCalendar(cal_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_portfolio_nk ON CDM_Portfolio(portfolio_nk);
+CREATE INDEX IF NOT EXISTS ix_cdm_securitymaster_nk ON CDM_SecurityMaster(security_nk);
+CREATE INDEX IF NOT EXISTS ix_cdm_holdings_date ON CDM_Holdings(value_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_holdings_security ON CDM_Holdings(security_sk);
+CREATE INDEX IF NOT EXISTS ix_cdm_holdings_dupkey ON CDM_Holdings(portfolio_sk, security_sk, value_date, asof_datetime);
+CREATE INDEX IF NOT EXISTS ix_cdm_portfoliodailyvalues_date ON CDM_PortfolioDailyValues(value_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_trade_date ON CDM_Transactions(trade_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_settle_date ON CDM_Transactions(settle_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_txn_date ON CDM_Transactions(portfolio_sk, COALESCE(trade_date, settle_date));
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_security ON CDM_Transactions(security_sk);
+DROP INDEX IF EXISTS ix_cdm_transactions_trade_id;
+CREATE INDEX IF NOT EXISTS ix_cdm_transactions_dupkey ON CDM_Transactions(portfolio_sk, trade_id, security_sk, trade_date, settle_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_cashagenda_date ON CDM_CashAgenda(event_date);
+CREATE INDEX IF NOT EXISTS ix_cdm_cashagenda_security ON CDM_CashAgenda(security_sk);
+CREATE INDEX IF NOT EXISTS ix_cdm_cashagenda_dupkey ON CDM_CashAgenda(portfolio_sk, security_sk, event_date, cash_type);
+"""
+
+def key_value(v):
+    # the one definition of a normalized key: trimmed, case-folded text (None stays None)
+    if v is None:
+        return None
+    return str(v).strip().lower()
+
+def key_series(s: pd.Series) -> pd.Series:
+    return s.astype(object).where(s.isna(), s.astype(str).str.strip().str.lower())
+
+def add_keys(table: str, df: pd.DataFrame) -> pd.DataFrame:
+    cols = KEY_COLUMNS.get(table, {})
+    todo = {k: key_series(df[src]) for k, src in cols.items() if src in df.columns}
+    return df.assign(**todo) if todo else df
+
+def register(conn):
+    conn.create_function("key", 1, key_value, deterministic=True)
+
+def ensure(conn):
+    """Normalized key columns (added + backfilled where missing) and the secondary indexes."""
+    register(conn)
+    for table, cols in KEY_COLUMNS.items():
+        have = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if not have:
+            continue
+        for k, src in cols.items():
+            if k not in have:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {k} VARCHAR(128)")
+            conn.execute(f"UPDATE {table} SET {k} = key({src}) WHERE {k} IS NULL AND {src} IS NOT NULL")
+    for stmt in [s.strip() for s in INDEX_DDL.split(";") if s.strip()]:
+        try:
+            conn.execute(stmt)
+        except sqlite3.OperationalError:
+            pass  # table/column created later (migrate_sqlite_schema_all.py); picked up on the next ensure()
+    conn.commit()
+
+def analyze(conn, limit: int = 1000):
+    # approximate statistics (analysis_limit rows per index) keep ANALYZE cheap on large tables
+    conn.execute(f"PRAGMA analysis_limit={int(limit)}")
+    conn.execute("ANALYZE")
+    conn.commit()
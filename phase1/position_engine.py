@@ -0,0 +1,390 @@
+# Position keeping from CDM_Transactions, reconciled against the custodian's CDM_Holdings.
+# Signed quantities come from the CDM build (REF_TransactionMap.qty_sign, see load_cdm_phase1.py); a transaction
+# moves the position of (portfolio_sk, security_sk) on its trade_date, else its settle_date (most Movements rows
+# have no purchase date, only a value date). Per batch of portfolios the transactions are
+# read once into NumPy arrays (chunked), summed per (position, day), sorted by (portfolio, security, day), and
+#   - the running position of every (portfolio, security) is one grouped cumulative sum: quantities in fixed point
+#     (int64, QTY_DECIMALS), each group's first delta offset by the total of the group before it, so a single
+#     np.cumsum over all positions is exact and restarts at 0 for each
+#   - the position on every evaluation date of the portfolio (the dates CDM_Holdings has) is one np.searchsorted
+#     of (position, date) into (position, day) -- last trade on or before the date
+# A batch replayed from the start reads the tables in storage order, a replay from a checkpoint seeks the
+# (portfolio_sk, date) indexes; the fetch is most of the run time.
+# Results:
+#   - CDM_PositionCheckpoint: non-zero positions on the last evaluation date of each month (is_eval = 1) and on
+#     the portfolio's last trade date when that is later (is_eval = 0)
+#   - CDM_PositionBreak: (portfolio, security, evaluation date) where holdings qty and position differ
+#   - CDM_PositionRecon: per portfolio and evaluation date, positions/holdings compared and breaks
+# Incremental: per portfolio the first trade or evaluation date whose rows changed (count / rowid max+sum per
+# date, kept in CDM_PositionSource) is found, and the replay starts from the last checkpoint before it -- new
+# dates replay only themselves, a backdated correction the months after it. Transactions without a security
+# (position id not in any holdings file), with an unmapped type or without any date cannot be kept and are counted.
+#   python position_engine.py [--db phase1.db] [--full]
+#   python position_engine.py report [--out reports]      (position_breaks.csv, position_recon.csv)
+
+import argparse, sqlite3, time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import bulk_load as bl
+import returns_engine as ret
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+OUT  = BASE / "reports"
+
+POSITION_DDL = """
+CREATE TABLE IF NOT EXISTS CDM_PositionCheckpoint (
+  portfolio_sk INTEGER NOT NULL,
+  as_of_date DATE NOT NULL,
+  security_sk INTEGER NOT NULL,
+  qty DECIMAL(38,10),
+  is_eval BOOLEAN,
+  PRIMARY KEY (portfolio_sk, as_of_date, security_sk)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS CDM_PositionBreak (
+  portfolio_sk INTEGER NOT NULL,
+  value_date DATE NOT NULL,
+  security_sk INTEGER NOT NULL,
+  holding_qty DECIMAL(38,10),
+  position_qty DECIMAL(38,10),
+  diff DECIMAL(38,10),
+  PRIMARY KEY (portfolio_sk, value_date, security_sk)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS CDM_PositionRecon (
+  portfolio_sk INTEGER NOT NULL,
+  value_date DATE NOT NULL,
+  positions INTEGER,
+  holdings INTEGER,
+  breaks INTEGER,
+  PRIMARY KEY (portfolio_sk, value_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS CDM_PositionSource (
+  portfolio_sk INTEGER NOT NULL,
+  source CHAR(1) NOT NULL,
+  part_date DATE NOT NULL,
+  row_count INTEGER,
+  max_rowid INTEGER,
+  sum_rowid INTEGER,
+  PRIMARY KEY (portfolio_sk, source, part_date)
+) WITHOUT ROWID;
+"""
+
+# source -> (table, date expression on alias x); the transaction date is indexed as an expression (physical_design)
+SOURCES = {"T": ("CDM_Transactions", "COALESCE(x.trade_date, x.settle_date)"), "H": ("CDM_Holdings", "x.value_date")}
+# columns the transaction build needs on databases created before them
+COLUMNS = {"SRC_Movements": {"position_id": "VARCHAR(64)"}, "REF_TransactionMap": {"qty_sign": "INTEGER"}}
+RESULTS = ["CDM_PositionCheckpoint", "CDM_PositionBreak", "CDM_PositionRecon", "CDM_PositionSource"]
+QTY_DECIMALS = 6          # fixed point of the running sums
+QTY_TOL = 1e-6            # a break: |holding - position| above QTY_TOL * max(1, |holding|, |position|)
+CHUNK_ROWS = 1000000      # transaction rows per fetch
+BATCH_ROWS = 5000000      # transaction rows per portfolio batch (bounds memory)
+DAY = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+
+def ensure_columns(conn):
+    for table, cols in COLUMNS.items():
+        have = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        for c, decl in cols.items():
+            if have and c not in have:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {c} {decl}")
+    conn.commit()
+
+def ensure_schema(conn):
+    ensure_columns(conn)
+    conn.executescript(POSITION_DDL)
+    conn.commit()
+
+# --- change detection ---
+def signatures(conn):
+    # per (portfolio, date) of both sources into TEMP _pos_sig, off the (portfolio_sk, date) indexes; CDM partition
+    # rebuilds and FX re-inserts give the rows new rowids. Stored per portfolio once it is done; the evaluation
+    # dates are its 'H' rows
+    conn.execute("DROP TABLE IF EXISTS temp._pos_sig")
+    conn.execute("CREATE TEMP TABLE _pos_sig (portfolio_sk INTEGER NOT NULL, source CHAR(1) NOT NULL, "
+                 "part_date DATE NOT NULL, row_count INTEGER, max_rowid INTEGER, sum_rowid INTEGER, "
+                 "PRIMARY KEY (portfolio_sk, source, part_date)) WITHOUT ROWID")
+    for k, (table, col) in SOURCES.items():
+        conn.execute(f"INSERT INTO _pos_sig SELECT x.portfolio_sk, '{k}', {col}, COUNT(*), MAX(x.rowid), SUM(x.rowid) "
+                     f"FROM {table} x WHERE x.portfolio_sk IS NOT NULL AND {col} IS NOT NULL "
+                     f"GROUP BY x.portfolio_sk, {col}")
+
+def changed_from(conn, full: bool) -> tuple:
+    """({portfolio_sk: first changed date, '' = from the start}, [portfolios without transactions or holdings])."""
+    gone = [r[0] for r in conn.execute("SELECT DISTINCT portfolio_sk FROM CDM_PositionSource WHERE portfolio_sk "
+                                       "NOT IN (SELECT portfolio_sk FROM _pos_sig)")]
+    if full:
+        return {r[0]: "" for r in conn.execute("SELECT DISTINCT portfolio_sk FROM _pos_sig")}, gone
+    # dates new or changed since the last run, and dates gone (a deleted partition)
+    return dict(conn.execute("""
+        SELECT portfolio_sk, MIN(part_date) FROM (
+          SELECT s.portfolio_sk, s.part_date FROM _pos_sig s LEFT JOIN CDM_PositionSource o
+            ON o.portfolio_sk = s.portfolio_sk AND o.source = s.source AND o.part_date = s.part_date
+          WHERE o.row_count IS NOT s.row_count OR o.max_rowid IS NOT s.max_rowid OR o.sum_rowid IS NOT s.sum_rowid
+          UNION ALL
+          SELECT o.portfolio_sk, o.part_date FROM CDM_PositionSource o
+          WHERE NOT EXISTS (SELECT 1 FROM _pos_sig s WHERE s.portfolio_sk = o.portfolio_sk AND s.source = o.source
+                                                        AND s.part_date = o.part_date)
+            AND o.portfolio_sk IN (SELECT portfolio_sk FROM _pos_sig))
+        GROUP BY portfolio_sk""")), gone
+
+def _ports(conn, rows):
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _pos_ports (portfolio_sk INTEGER PRIMARY KEY, start DATE, ckpt DATE)")
+    conn.execute("DELETE FROM _pos_ports")
+    conn.executemany("INSERT INTO _pos_ports VALUES (?, ?, ?)", rows)
+
+def checkpoints(conn, start: dict) -> dict:
+    # last checkpoint strictly before the first changed date ('' = none: replay from the first transaction)
+    _ports(conn, [(p, d, "") for p, d in start.items()])
+    ck = dict(conn.execute("SELECT t.portfolio_sk, (SELECT MAX(c.as_of_date) FROM CDM_PositionCheckpoint c "
+                           "WHERE c.portfolio_sk = t.portfolio_sk AND c.as_of_date < t.start) FROM _pos_ports t"))
+    return {p: ck.get(p) or "" for p in start}
+
+# --- load ---
+def to_days(values) -> np.ndarray:
+    d = pd.to_datetime(pd.Series(values, dtype=object), format="%Y-%m-%d", errors="coerce")
+    return d.to_numpy().astype("datetime64[D]").astype("int64")
+
+def read_rows(conn, table: str, col: str, scan: bool):
+    """(portfolio_sk, security_sk, day, qty) rows of `table` dated (`col`, see SOURCES) after each portfolio's
+    checkpoint (_pos_ports), as float64 arrays of up to CHUNK_ROWS rows (NULL -> NaN). scan: read the table in
+    storage order (a batch replayed from the start needs most of it), else seek the (portfolio_sk, date) index
+    per portfolio."""
+    cols = f"x.portfolio_sk, x.security_sk, {DAY.format(col)}, x.qty"
+    # +t.ckpt: no affinity, so an expression date (no affinity either) can still range-seek its index
+    if scan:
+        sql = (f"SELECT {cols} FROM {table} x NOT INDEXED JOIN _pos_ports t ON t.portfolio_sk = x.portfolio_sk "
+               f"WHERE {col} > +t.ckpt")
+    else:
+        sql = f"SELECT {cols} FROM _pos_ports t CROSS JOIN {table} x ON x.portfolio_sk = t.portfolio_sk AND {col} > +t.ckpt"
+    cur = conn.execute(sql)
+    while True:
+        rows = cur.fetchmany(CHUNK_ROWS)
+        if not rows:
+            return
+        yield np.array(rows, dtype="float64").reshape(len(rows), 4)
+
+def _frame(parts, cols) -> pd.DataFrame:
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame({c: np.zeros(0, "int64") for c in cols})
+
+def load_deltas(conn, scan: bool) -> tuple:
+    """Quantity per (portfolio, security, day) of the transactions after each portfolio's checkpoint, plus the
+    counts of rows without a security / with an unmapped type / without a date (never read: all of the batch's)."""
+    parts, no_security, unmapped = [], 0, 0
+    for m in read_rows(conn, *SOURCES["T"], scan):
+        sec, day, qty = m[:, 1], m[:, 2], m[:, 3]
+        no_security += int((np.isnan(sec) & (qty != 0)).sum())   # NaN qty compares unequal: counted too
+        unmapped += int((~np.isnan(sec) & np.isnan(qty)).sum())
+        keep = ~np.isnan(sec) & ~np.isnan(day) & ~np.isnan(qty) & (qty != 0)
+        parts.append(pd.DataFrame({"portfolio_sk": m[keep, 0].astype("int64"), "security_sk": sec[keep].astype("int64"),
+                                   "day": day[keep].astype("int64"),
+                                   "q": np.rint(qty[keep] * 10 ** QTY_DECIMALS).astype("int64")})
+                     .groupby(["portfolio_sk", "security_sk", "day"], as_index=False)["q"].sum())
+    table, col = SOURCES["T"]
+    undated = conn.execute(f"SELECT COUNT(*) FROM _pos_ports t CROSS JOIN {table} x ON x.portfolio_sk = t.portfolio_sk "
+                           f"AND {col} IS NULL WHERE x.qty IS NULL OR x.qty <> 0").fetchone()[0]
+    return _frame(parts, ["portfolio_sk", "security_sk", "day", "q"]), no_security, unmapped, undated
+
+def load_base(conn) -> pd.DataFrame:
+    # positions at each portfolio's checkpoint, as deltas on the checkpoint day
+    df = pd.read_sql("SELECT c.portfolio_sk, c.security_sk, c.as_of_date, c.qty FROM _pos_ports t "
+                     "CROSS JOIN CDM_PositionCheckpoint c ON c.portfolio_sk = t.portfolio_sk AND c.as_of_date = t.ckpt", conn)
+    return pd.DataFrame({"portfolio_sk": df["portfolio_sk"].astype("int64"), "security_sk": df["security_sk"].astype("int64"),
+                         "day": to_days(df["as_of_date"]),
+                         "q": np.rint(df["qty"].astype(float) * 10 ** QTY_DECIMALS).astype("int64")})
+
+def load_holdings(conn, scan: bool) -> pd.DataFrame:
+    # holdings qty per (portfolio, security, evaluation day) after the checkpoint; cash lines have no security
+    parts = []
+    for m in read_rows(conn, *SOURCES["H"], scan):
+        keep = ~np.isnan(m[:, 1]) & ~np.isnan(m[:, 2])
+        parts.append(pd.DataFrame({"portfolio_sk": m[keep, 0].astype("int64"), "security_sk": m[keep, 1].astype("int64"),
+                                   "day": m[keep, 2].astype("int64"), "holding_qty": np.nan_to_num(m[keep, 3]),
+                                   "n": 1}))
+    df = _frame(parts, ["portfolio_sk", "security_sk", "day", "holding_qty", "n"])
+    return df.groupby(["portfolio_sk", "security_sk", "day"], as_index=False)[["holding_qty", "n"]].sum()
+
+# --- compute ---
+def running_positions(d: pd.DataFrame) -> tuple:
+    """d sorted by (portfolio, security, day), q in fixed point. Returns (key index per row, running position)."""
+    p, s, q = d["portfolio_sk"].to_numpy(), d["security_sk"].to_numpy(), d["q"].to_numpy()
+    new_key = np.ones(len(d), dtype=bool)
+    new_key[1:] = (p[1:] != p[:-1]) | (s[1:] != s[:-1])
+    starts = np.flatnonzero(new_key)
+    x = q.copy()
+    if len(starts) > 1:
+        # the sum runs through the previous group to its total: take that back at the group start (exact in int64)
+        x[starts[1:]] -= np.add.reduceat(q, starts)[:-1]
+    return np.cumsum(new_key) - 1, np.cumsum(x)
+
+def positions_on(d: pd.DataFrame, key: np.ndarray, run: np.ndarray, evals: pd.DataFrame) -> pd.DataFrame:
+    """Position of every key of d on every evaluation day of its portfolio (evals: portfolio_sk, day)."""
+    first = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else np.zeros(0, "int64")
+    kp, ks = d["portfolio_sk"].to_numpy()[first], d["security_sk"].to_numpy()[first]
+    evals = evals.sort_values(["portfolio_sk", "day"])
+    ep, eday = evals["portfolio_sk"].to_numpy(), evals["day"].to_numpy()
+    lo, hi = np.searchsorted(ep, kp, side="left"), np.searchsorted(ep, kp, side="right")
+    ne = hi - lo
+    qk = np.repeat(np.arange(len(kp)), ne)
+    qday = eday[np.repeat(lo, ne) + np.arange(len(qk)) - np.repeat(np.cumsum(ne) - ne, ne)]
+    days = d["day"].to_numpy()
+    dmin = min(days.min(initial=0), qday.min(initial=0))
+    span = max(days.max(initial=0), qday.max(initial=0)) - dmin + 2
+    comb = key * span + (days - dmin)  # sorted: rows are in (key, day) order
+    j = np.searchsorted(comb, qk * span + (qday - dmin), side="right") - 1
+    ok = j >= 0
+    ok[ok] = key[j[ok]] == qk[ok]
+    pos = np.where(ok, run[np.maximum(j, 0)], 0)
+    return pd.DataFrame({"portfolio_sk": kp[qk], "security_sk": ks[qk], "day": qday, "q": pos})
+
+def last_positions(d: pd.DataFrame, key: np.ndarray, run: np.ndarray, evals: pd.DataFrame) -> pd.DataFrame:
+    # is_eval = 0 checkpoint: all positions on the portfolio's last trade day, where that is after its last evaluation
+    if not len(d):
+        return d.iloc[:0]
+    last = np.r_[key[1:] != key[:-1], True]
+    out = d[last].assign(q=run[last])
+    last_trade = d.groupby("portfolio_sk")["day"].max()
+    last_eval = evals.groupby("portfolio_sk")["day"].max().reindex(last_trade.index)
+    later = last_trade[~(last_eval >= last_trade)]
+    out = out[out["portfolio_sk"].isin(later.index)]
+    return out.assign(day=out["portfolio_sk"].map(later).astype("int64"))
+
+def reconcile(pos: pd.DataFrame, hold: pd.DataFrame, evals: pd.DataFrame) -> tuple:
+    """(breaks, recon per portfolio and evaluation day) of positions vs holdings."""
+    scale = float(10 ** QTY_DECIMALS)
+    p = pos[pos["q"] != 0].assign(position_qty=lambda x: x["q"] / scale)[["portfolio_sk", "security_sk", "day",
+                                                                          "position_qty"]]
+    m = p.merge(hold[["portfolio_sk", "security_sk", "day", "holding_qty", "n"]], how="outer",
+                on=["portfolio_sk", "security_sk", "day"])
+    h, q = m["holding_qty"].fillna(0.0).to_numpy(dtype=float), m["position_qty"].fillna(0.0).to_numpy(dtype=float)
+    diff = h - q
+    brk = np.abs(diff) > QTY_TOL * np.maximum(1.0, np.maximum(np.abs(h), np.abs(q)))
+    m = m.assign(position_qty=q, diff=diff, is_break=brk, has_pos=m["position_qty"].notna(), has_hold=m["n"].notna())
+    recon = (m.groupby(["portfolio_sk", "day"], as_index=False)
+              .agg(positions=("has_pos", "sum"), holdings=("has_hold", "sum"), breaks=("is_break", "sum")))
+    recon = evals.merge(recon, on=["portfolio_sk", "day"], how="left").fillna(0)  # every evaluation date
+    return m[brk], recon
+
+def month_ends(evals: pd.DataFrame) -> pd.DataFrame:
+    # the last evaluation day of each month and portfolio (evals sorted by portfolio, day): the checkpoint days
+    if not len(evals):
+        return evals
+    p = evals["portfolio_sk"].to_numpy()
+    m = evals["day"].to_numpy().astype("datetime64[D]").astype("datetime64[M]")
+    return evals[np.r_[(p[1:] != p[:-1]) | (m[1:] != m[:-1]), True]]
+
+def _dates(days) -> np.ndarray:
+    return ret.date_strings(np.asarray(days, dtype="int64").astype("datetime64[D]"))
+
+def run_batch(conn, start: dict) -> dict:
+    ckpt = checkpoints(conn, start)
+    _ports(conn, [(p, start[p], ckpt[p]) for p in start])
+    scan = not any(ckpt.values())
+    base = load_base(conn)
+    d, no_security, unmapped, undated = load_deltas(conn, scan)
+    hold = load_holdings(conn, scan)
+    evals = pd.read_sql(f"SELECT s.portfolio_sk, {DAY.format('s.part_date')} AS day FROM _pos_ports t CROSS JOIN "
+                        f"_pos_sig s ON s.portfolio_sk = t.portfolio_sk AND s.source = 'H' AND s.part_date > t.ckpt "
+                        f"ORDER BY 1, 2", conn).astype("int64")
+    d = (pd.concat([base, d], ignore_index=True)
+           .groupby(["portfolio_sk", "security_sk", "day"], as_index=False, sort=True)["q"].sum())
+    key, run = running_positions(d)
+    pos = positions_on(d, key, run, evals)
+    tail = last_positions(d, key, run, evals)
+    breaks, recon = reconcile(pos, hold, evals)
+
+    # replace everything after the checkpoint (primary-key range per portfolio). The checkpoint itself goes too
+    # when it is a last-trade one (always a portfolio's latest) or a new evaluation date falls in its month (it
+    # is no longer that month's last)
+    after = list(ckpt.items())
+    first = evals.groupby("portfolio_sk")["day"].min()
+    conn.executemany("DELETE FROM CDM_PositionCheckpoint WHERE portfolio_sk = ? AND as_of_date > ?", after)
+    conn.executemany("DELETE FROM CDM_PositionCheckpoint WHERE portfolio_sk = ? AND as_of_date = ? AND is_eval = 0", after)
+    conn.executemany("DELETE FROM CDM_PositionCheckpoint WHERE portfolio_sk = ? AND as_of_date = ?",
+                     [(p, c) for p, c in after if c and p in first.index and _dates([first[p]])[0][:7] == c[:7]])
+    for t in ("CDM_PositionBreak", "CDM_PositionRecon"):
+        conn.executemany(f"DELETE FROM {t} WHERE portfolio_sk = ? AND value_date > ?", after)
+    scale = float(10 ** QTY_DECIMALS)
+    pos = pos[pos["q"] != 0].merge(month_ends(evals), on=["portfolio_sk", "day"])
+    ck = pd.concat([pos.assign(is_eval=1), tail[tail["q"] != 0].assign(is_eval=0)], ignore_index=True)
+    n_ck = bl.append(conn, "CDM_PositionCheckpoint", pd.DataFrame({
+        "portfolio_sk": ck["portfolio_sk"], "as_of_date": _dates(ck["day"]), "security_sk": ck["security_sk"],
+        "qty": ck["q"] / scale, "is_eval": ck["is_eval"]}))
+    bl.append(conn, "CDM_PositionBreak", breaks.assign(value_date=_dates(breaks["day"]))[
+        ["portfolio_sk", "value_date", "security_sk", "holding_qty", "position_qty", "diff"]])
+    bl.append(conn, "CDM_PositionRecon", recon.assign(value_date=_dates(recon["day"])).astype(
+        {"positions": "int64", "holdings": "int64", "breaks": "int64"}))
+    return {"from_checkpoint": sum(1 for p in start if ckpt[p]), "txn_rows": int(len(d) - len(base)),
+            "checkpoints": n_ck, "eval_dates": len(recon), "breaks": len(breaks),
+            "no_security": no_security, "unmapped": unmapped, "undated": undated}
+
+def refresh(conn, full: bool = False) -> dict:
+    """Bring checkpoints, breaks and the recon up to date; commits."""
+    ensure_schema(conn)
+    t0 = time.perf_counter()
+    signatures(conn)
+    start, gone = changed_from(conn, full)
+    out = {"portfolios": len(start), "removed": len(gone), "from_checkpoint": 0, "txn_rows": 0, "checkpoints": 0,
+           "eval_dates": 0, "breaks": 0, "no_security": 0, "unmapped": 0, "undated": 0}
+    try:
+        if full:
+            for t in RESULTS:
+                conn.execute(f"DELETE FROM {t}")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS _pos_drop (portfolio_sk INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM _pos_drop")
+        conn.executemany("INSERT INTO _pos_drop VALUES (?)", [(int(p),) for p in gone])
+        for t in RESULTS:
+            conn.execute(f"DELETE FROM {t} WHERE portfolio_sk IN (SELECT portfolio_sk FROM _pos_drop)")
+        # portfolio batches of about BATCH_ROWS transactions
+        rows = dict(conn.execute("SELECT portfolio_sk, SUM(row_count) FROM _pos_sig WHERE source = 'T' GROUP BY 1"))
+        todo = sorted(start)
+        weight = np.cumsum([rows.get(p, 0) for p in todo])
+        batch = (weight // BATCH_ROWS).astype("int64") if len(todo) else np.zeros(0, "int64")
+        for b in np.unique(batch):
+            ports = [todo[i] for i in np.flatnonzero(batch == b)]
+            res = run_batch(conn, {p: start[p] for p in ports})
+            for k, v in res.items():
+                out[k] += v
+            conn.execute("DELETE FROM CDM_PositionSource WHERE portfolio_sk IN (SELECT portfolio_sk FROM _pos_ports)")
+            conn.execute("INSERT INTO CDM_PositionSource SELECT s.* FROM _pos_sig s "
+                         "JOIN _pos_ports t ON t.portfolio_sk = s.portfolio_sk")
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    out["seconds"] = time.perf_counter() - t0
+    return out
+
+# --- report ---
+def report(conn, out: Path) -> tuple:
+    out.mkdir(parents=True, exist_ok=True)
+    brk = pd.read_sql("SELECT p.portfolio_nk, b.value_date, s.security_nk, b.holding_qty, b.position_qty, b.diff "
+                      "FROM CDM_PositionBreak b JOIN CDM_Portfolio p ON p.portfolio_sk = b.portfolio_sk "
+                      "LEFT JOIN CDM_SecurityMaster s ON s.security_sk = b.security_sk "
+                      "ORDER BY p.portfolio_nk, b.value_date, s.security_nk", conn)
+    rec = pd.read_sql("SELECT p.portfolio_nk, r.value_date, r.positions, r.holdings, r.breaks FROM CDM_PositionRecon r "
+                      "JOIN CDM_Portfolio p ON p.portfolio_sk = r.portfolio_sk ORDER BY p.portfolio_nk, r.value_date", conn)
+    brk.to_csv(out / "position_breaks.csv", index=False)
+    rec.to_csv(out / "position_recon.csv", index=False)
+    return len(brk), len(rec)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Positions from CDM_Transactions, breaks vs CDM_Holdings (incremental)")
+    ap.add_argument("cmd", nargs="?", choices=["refresh", "report"], default="refresh")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    ap.add_argument("--full", action="store_true", help="replay every portfolio from its first transaction")
+    ap.add_argument("--out", default=str(OUT), help="report folder")
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.cmd == "report":
+        n, d = report(conn, Path(args.out))
+        print(f"{n} break(s) over {d} portfolio evaluation date(s) -> {Path(args.out) / 'position_breaks.csv'}")
+    else:
+        with bl.session(conn):
+            res = refresh(conn, args.full)
+        print(f"Positions: {res['portfolios']} portfolio(s) ({res['from_checkpoint']} from a checkpoint), "
+              f"{res['removed']} removed, {res['txn_rows']} position-day(s) replayed, {res['checkpoints']} checkpoint rows "
+              f"({res['seconds']:.1f}s)")
+        print(f"  {res['eval_dates']} evaluation date(s) reconciled, {res['breaks']} break(s); transactions not kept: "
+              f"{res['no_security']} without security, {res['unmapped']} unmapped type, {res['undated']} without a date")
+    conn.close()
@@ -0,0 +1,235 @@
+# Read-only query service over the CDM for dashboards: named, parameterized queries answered from a small pool
+# of read-only SQLite connections, with an LRU result cache in front.
+#
+# - connections: opened with mode=ro (URI) + PRAGMA query_only, mmap_size and cache_size, so a reader can never
+#   write and hot pages are read through the OS page cache; a pool of POOL_SIZE, shared by threads
+# - cache: key = (query, parameters, data version). The version comes from PRAGMA data_version on a dedicated
+#   connection, which changes whenever any other connection (loader, CDM refresh, fx_engine) commits -- a load
+#   invalidates every cached result, with no hook in the loaders. Between loads a repeated query is one
+#   PRAGMA plus a dict lookup (microseconds); the SQL only runs on a miss
+# - results are (columns, rows) with rows a tuple of tuples: shared by all callers, so they are not copied
+# - counters: hits, misses, invalidations, hit rate and mean/max latency of hits and misses (stats())
+#   svc = QueryService(DB); cols, rows = svc.query("holdings", portfolio="10000.05", date="2025-08-31")
+#   python query_service.py holdings --param portfolio=10000.05 --param date=2025-08-31 [--repeat 1000]
+#   python query_service.py --list
+
+import argparse, sqlite3, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from queue import Empty, Queue
+from typing import Dict, Tuple
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+
+POOL_SIZE = 4
+POOL_WAIT = 30.0                  # seconds a caller waits for a free connection
+MMAP_SIZE = 256 * 1024 * 1024     # bytes of the database file memory-mapped per connection
+CACHE_KIB = 64 * 1024             # SQLite page cache per connection
+MAX_ENTRIES = 512                 # results kept (least recently used evicted first)
+MAX_ROWS = 200000                 # larger results are returned but not cached
+
+# name -> (SQL, parameters). Portfolios by portfolio_nk, dates as ISO text (as the CDM stores them).
+# positions_asof: last evaluation on or before the date, from the run-length holdings (holding_intervals.py).
+# transactions: dated by trade date, else value date (most movements have no purchase date), as position_engine.
+QUERIES = {
+    "holdings": ("""
+        SELECT h.value_date, p.portfolio_nk, s.security_nk, s.name AS security_name, h.qty, h.price,
+               h.native_ccy, h.mv_native, h.mv_base
+        FROM CDM_Portfolio p
+        JOIN CDM_Holdings h ON h.portfolio_sk = p.portfolio_sk
+        LEFT JOIN CDM_SecurityMaster s ON s.security_sk = h.security_sk
+        WHERE p.portfolio_nk = :portfolio AND h.value_date = :date
+        ORDER BY s.security_nk, h.holding_sk""", ("portfolio", "date")),
+    "positions_asof": ("""
+        SELECT :date AS asof_date, p.portfolio_nk, s.security_nk, s.name AS security_name, i.qty, pr.price,
+               i.native_ccy, i.valid_from
+        FROM CDM_Portfolio p
+        JOIN CDM_HoldingInterval i ON i.portfolio_sk = p.portfolio_sk AND i.valid_to > :date AND i.valid_from <= :date
+        LEFT JOIN CDM_HoldingPrice pr ON pr.portfolio_sk = i.portfolio_sk AND pr.security_sk IS i.security_sk
+             AND pr.slot = i.slot AND pr.valid_to > :date AND pr.valid_from <= :date
+        LEFT JOIN CDM_SecurityMaster s ON s.security_sk = i.security_sk
+        WHERE p.portfolio_nk = :portfolio
+        ORDER BY s.security_nk, i.slot""", ("portfolio", "date")),
+    "daily_values": ("""
+        SELECT v.value_date, p.portfolio_nk, v.eval_ccy, v.value_start, v.value_end, v.inflow, v.outflow
+        FROM CDM_Portfolio p
+        JOIN CDM_PortfolioDailyValues v ON v.portfolio_sk = p.portfolio_sk
+        WHERE p.portfolio_nk = :portfolio AND v.value_date BETWEEN :start AND :end
+        ORDER BY v.value_date""", ("portfolio", "start", "end")),
+    "transactions": ("""
+        SELECT t.trade_date, t.settle_date, p.portfolio_nk, t.trade_id, s.security_nk, t.txn_type, t.qty, t.price,
+               t.native_ccy, t.gross_amt_native, t.gross_amt_base
+        FROM CDM_Portfolio p
+        JOIN CDM_Transactions t ON t.portfolio_sk = p.portfolio_sk
+        LEFT JOIN CDM_SecurityMaster s ON s.security_sk = t.security_sk
+        WHERE p.portfolio_nk = :portfolio AND COALESCE(t.trade_date, t.settle_date) BETWEEN :start AND :end
+        ORDER BY COALESCE(t.trade_date, t.settle_date), t.txn_sk""", ("portfolio", "start", "end")),
+    "cash_agenda": ("""
+        SELECT c.event_date, c.evaluation_date, p.portfolio_nk, s.security_nk, c.cash_type, c.native_ccy,
+               c.amt_native, c.amt_base
+        FROM CDM_Portfolio p
+        JOIN CDM_CashAgenda c ON c.portfolio_sk = p.portfolio_sk
+        LEFT JOIN CDM_SecurityMaster s ON s.security_sk = c.security_sk
+        WHERE p.portfolio_nk = :portfolio
+          AND c.event_date BETWEEN :start AND date(:start, '+' || CAST(:days AS INTEGER) || ' days')
+        ORDER BY c.event_date, c.cag_sk""", ("portfolio", "start", "days")),
+}
+
+def _param(v):
+    # date / datetime / pd.Timestamp -> the CDM's ISO text
+    if isinstance(v, datetime):
+        return v.date().isoformat()
+    if isinstance(v, date):
+        return v.isoformat()
+    return v
+
+class QueryService:
+    """Pooled read-only connections + result cache keyed by (query, parameters, data version). Thread-safe."""
+
+    def __init__(self, db=DB, pool_size: int = POOL_SIZE, max_entries: int = MAX_ENTRIES):
+        self.db = Path(db)
+        if not self.db.exists():
+            raise RuntimeError(f"Database not found: {self.db}")
+        self.pool_size = pool_size
+        self.max_entries = max_entries
+        self._pool: Queue = Queue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[tuple, Tuple[tuple, tuple]]" = OrderedDict()
+        self._watch = self._connect()   # data_version sentinel (never runs a query)
+        self._version = None
+        self._generation = 0
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0, "uncached": 0,
+                         "hit_s": 0.0, "miss_s": 0.0, "hit_max_s": 0.0, "miss_max_s": 0.0}
+
+    def _connect(self):
+        conn = sqlite3.connect(f"{self.db.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = 1")
+        conn.execute(f"PRAGMA mmap_size = {int(MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size = {-int(CACHE_KIB)}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """A pooled read-only connection (opened on demand up to pool_size, then callers wait)."""
+        conn = None
+        try:
+            conn = self._pool.get_nowait()
+        except Empty:
+            with self._lock:
+                if self._opened < self.pool_size:
+                    self._opened += 1
+                    conn = "new"
+            conn = self._connect() if conn == "new" else self._pool.get(timeout=POOL_WAIT)
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def data_version(self) -> int:
+        """Generation of the database content: bumped (and the cache dropped) when another connection committed."""
+        with self._lock:
+            v = self._watch.execute("PRAGMA data_version").fetchone()[0]
+            if v != self._version:
+                if self._version is not None:
+                    self._generation += 1
+                    self.counters["invalidations"] += 1
+                    self._cache.clear()
+                self._version = v
+            return self._generation
+
+    def query(self, name: str, **params) -> Tuple[tuple, tuple]:
+        """(columns, rows) of the named query. Cached until the next commit to the database."""
+        t0 = time.perf_counter()
+        if name not in QUERIES:
+            raise RuntimeError(f"Unknown query {name!r}: use one of {sorted(QUERIES)}")
+        sql, names = QUERIES[name]
+        missing = [p for p in names if params.get(p) is None]
+        extra = sorted(set(params) - set(names))
+        if missing or extra:
+            raise RuntimeError(f"Query {name!r} takes {list(names)} (missing {missing}, unknown {extra})")
+        args = tuple(_param(params[p]) for p in names)
+        gen = self.data_version()
+        key = (name, args, gen)
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+                self._count("hit", t0)
+                return hit
+        with self.connection() as conn:
+            cur = conn.execute(sql, dict(zip(names, args)))
+            result = (tuple(d[0] for d in cur.description), tuple(cur.fetchall()))
+        with self._lock:
+            if len(result[1]) > MAX_ROWS:
+                self.counters["uncached"] += 1
+            elif gen == self._generation:  # a commit during the read: don't cache under the new version
+                self._cache[key] = result
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            self._count("miss", t0)
+        return result
+
+    def frame(self, name: str, **params):
+        """The named query as a pandas DataFrame (a copy; the cached rows stay shared)."""
+        import pandas as pd
+        cols, rows = self.query(name, **params)
+        return pd.DataFrame.from_records(list(rows), columns=list(cols))
+
+    def _count(self, kind: str, t0: float):
+        dt = time.perf_counter() - t0
+        c = self.counters
+        c[{"hit": "hits", "miss": "misses"}[kind]] += 1
+        c[kind + "_s"] += dt
+        c[kind + "_max_s"] = max(c[kind + "_max_s"], dt)
+
+    def stats(self) -> Dict[str, float]:
+        c = self.counters
+        with self._lock:
+            entries = len(self._cache)
+        n = c["hits"] + c["misses"]
+        return {"hits": c["hits"], "misses": c["misses"], "hit_rate": round(c["hits"] / n, 4) if n else 0.0,
+                "invalidations": c["invalidations"], "uncached": c["uncached"], "entries": entries,
+                "hit_mean_us": round(c["hit_s"] / c["hits"] * 1e6, 1) if c["hits"] else 0.0,
+                "hit_max_us": round(c["hit_max_s"] * 1e6, 1),
+                "miss_mean_ms": round(c["miss_s"] / c["misses"] * 1e3, 3) if c["misses"] else 0.0,
+                "miss_max_ms": round(c["miss_max_s"] * 1e3, 3)}
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except Empty:
+                break
+        self._watch.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Named read-only CDM queries (pooled connections, versioned cache)")
+    ap.add_argument("name", nargs="?", choices=sorted(QUERIES))
+    ap.add_argument("--param", action="append", default=[], help="name=value (repeatable)")
+    ap.add_argument("--repeat", type=int, default=1, help="run the query N times (cache latency check)")
+    ap.add_argument("--rows", type=int, default=20, help="rows printed")
+    ap.add_argument("--list", action="store_true", help="print the queries and their parameters")
+    ap.add_argument("--db", default=str(DB))
+    args = ap.parse_args()
+    if args.list or not args.name:
+        for n, (_, names) in sorted(QUERIES.items()):
+            print(f"{n}: {', '.join(names)}")
+    else:
+        svc = QueryService(args.db)
+        params = dict(p.split("=", 1) for p in args.param)
+        for _ in range(max(1, args.repeat)):
+            cols, rows = svc.query(args.name, **params)
+        print(" | ".join(cols))
+        for r in rows[:args.rows]:
+            print(" | ".join("" if v is None else str(v) for v in r))
+        print(f"{len(rows)} row(s)")
+        print(svc.stats())
+        svc.close()
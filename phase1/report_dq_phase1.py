@@ -1,14 +1,14 @@
-import sqlite3, csv
+import argparse, sqlite3, csv, time
 from pathlib import Path
-from datetime import datetime
+import dq_engine as dq
+import run_metrics as rm
 
 BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
 DB   = BASE / "phase1.db"
 OUT  = BASE / "reports"
-OUT.mkdir(exist_ok=True)
 
-def q(cur, sql):
-    return cur.execute(sql).fetchall()
+# All metrics come from dq_engine: one aggregate pass per table, cached per load batch (DQ_MetricCache).
+#   python report_dq_phase1.py [--db phase1.db] [--out reports] [--no-cache]
 
 def write_csv(path, rows, headers):
     with open(path, "w", newline="", encoding="utf-8") as f:
@@ -16,101 +16,77 @@ def write_csv(path, rows, headers):
         w.writerow(headers)
         w.writerows(rows)
 
-conn = sqlite3.connect(DB)
-cur  = conn.cursor()
+def write_reports(m, out: Path):
+    out.mkdir(exist_ok=True)
 
-# --- Table counts
-tables = ["SRC_Holdings","SRC_Movements","SRC_DailyValues","SRC_CashAgenda","SRC_GenericCalendar",
-          "CDM_Portfolio","CDM_SecurityMaster","CDM_Holdings","CDM_PortfolioDailyValues","CDM_Transactions","CDM_CashAgenda"]
-counts = [(t, q(cur, f"SELECT COUNT(*) FROM {t}")[0][0]) for t in tables]
-write_csv(OUT/"table_counts.csv", counts, ["table","row_count"])
+    # --- Table counts
+    tables = ["SRC_Holdings","SRC_Movements","SRC_DailyValues","SRC_CashAgenda","SRC_GenericCalendar",
+              "CDM_Portfolio","CDM_SecurityMaster","CDM_Holdings","CDM_PortfolioDailyValues","CDM_Transactions","CDM_CashAgenda"]
+    write_csv(out/"table_counts.csv", [(t, m[t]["rows"]) for t in tables], ["table","row_count"])
 
-# --- Null/required field checks in SRC
-null_checks = [
-    ("SRC_Holdings", "portfolio_nk", "value_date"),
-    ("SRC_Movements","portfolio_nk", "trade_date"),
-    ("SRC_DailyValues","portfolio_nk","value_date"),
-    ("SRC_CashAgenda","portfolio_nk","event_date"),
-]
-rows = []
-for t, c1, c2 in null_checks:
-    n1 = q(cur, f"SELECT COUNT(*) FROM {t} WHERE {c1} IS NULL OR TRIM(COALESCE({c1},''))=''")[0][0]
-    n2 = q(cur, f"SELECT COUNT(*) FROM {t} WHERE {c2} IS NULL")[0][0]
-    rows.append((t,c1,n1))
-    rows.append((t,c2,n2))
-write_csv(OUT/"src_null_checks.csv", rows, ["table","column","null_or_blank_rows"])
+    # --- Null/required field checks in SRC
+    null_checks = [
+        ("SRC_Holdings", "portfolio_nk", "value_date"),
+        ("SRC_Movements","portfolio_nk", "trade_date"),
+        ("SRC_DailyValues","portfolio_nk","value_date"),
+        ("SRC_CashAgenda","portfolio_nk","event_date"),
+    ]
+    rows = []
+    for t, c1, c2 in null_checks:
+        rows.append((t,c1,m[t][f"null_or_blank:{c1}"]))
+        rows.append((t,c2,m[t][f"null:{c2}"]))
+    write_csv(out/"src_null_checks.csv", rows, ["table","column","null_or_blank_rows"])
 
-# --- Orphan portfolio lookups (CDM facts)
-orph = []
-for t, col in [("CDM_Holdings","portfolio_sk"),
-               ("CDM_PortfolioDailyValues","portfolio_sk"),
-               ("CDM_Transactions","portfolio_sk"),
-               ("CDM_CashAgenda","portfolio_sk")]:
-    cnt = q(cur, f"SELECT COUNT(*) FROM {t} WHERE {col} IS NULL")[0][0]
-    orph.append((t,col,cnt))
-write_csv(OUT/"cdm_orphan_portfolios.csv", orph, ["table","column","null_rows"])
+    # --- Orphan portfolio lookups (CDM facts)
+    orph = [(t,"portfolio_sk",m[t]["null:portfolio_sk"])
+            for t in ["CDM_Holdings","CDM_PortfolioDailyValues","CDM_Transactions","CDM_CashAgenda"]]
+    write_csv(out/"cdm_orphan_portfolios.csv", orph, ["table","column","null_rows"])
 
-# --- Optional: security nulls where expected
-sec_nulls = []
-for t in ["CDM_Holdings","CDM_CashAgenda","CDM_Transactions"]:
-    cnt = q(cur, f"SELECT COUNT(*) FROM {t} WHERE security_sk IS NULL")[0][0]
-    sec_nulls.append((t,"security_sk",cnt))
-write_csv(OUT/"cdm_security_nulls.csv", sec_nulls, ["table","column","null_rows"])
+    # --- Optional: security nulls where expected
+    sec_nulls = [(t,"security_sk",m[t]["null:security_sk"]) for t in ["CDM_Holdings","CDM_CashAgenda","CDM_Transactions"]]
+    write_csv(out/"cdm_security_nulls.csv", sec_nulls, ["table","column","null_rows"])
 
-# --- Duplicate keys (light)
-dupes = []
-dupes.append(("CDM_PortfolioDailyValues (portfolio_sk,value_date)",
-              q(cur, """SELECT COUNT(*) FROM (
-                           SELECT portfolio_sk, value_date, COUNT(*) c
-                           FROM CDM_PortfolioDailyValues
-                           GROUP BY 1,2 HAVING c>1
-                        )""")[0][0]))
-dupes.append(("CDM_Holdings (portfolio_sk,security_sk,value_date,asof_datetime)",
-              q(cur, """SELECT COUNT(*) FROM (
-                           SELECT COALESCE(portfolio_sk,-1), COALESCE(security_sk,-1), value_date, COALESCE(asof_datetime,''),
-                                  COUNT(*) c
-                           FROM CDM_Holdings
-                           GROUP BY 1,2,3,4 HAVING c>1
-                        )""")[0][0]))
-dupes.append(("CDM_Transactions (portfolio_sk,trade_id)",
-              q(cur, """SELECT COUNT(*) FROM (
-                           SELECT portfolio_sk, trade_id, COUNT(*) c
-                           FROM CDM_Transactions
-                           GROUP BY 1,2 HAVING c>1
-                        )""")[0][0]))
-dupes.append(("CDM_CashAgenda (portfolio_sk,security_sk,event_date,cash_type)",
-              q(cur, """SELECT COUNT(*) FROM (
-                           SELECT COALESCE(portfolio_sk,-1), COALESCE(security_sk,-1), event_date, COALESCE(cash_type,''),
-                                  COUNT(*) c
-                           FROM CDM_CashAgenda
-                           GROUP BY 1,2,3,4 HAVING c>1
-                        )""")[0][0]))
-write_csv(OUT/"cdm_duplicate_checks.csv", dupes, ["check","duplicate_groups"])
+    # --- Duplicate keys (light)
+    dupes = [
+        ("CDM_PortfolioDailyValues (portfolio_sk,value_date)", m["CDM_PortfolioDailyValues"]["dup_groups"]),
+        ("CDM_Holdings (portfolio_sk,security_sk,value_date,asof_datetime)", m["CDM_Holdings"]["dup_groups"]),
+        ("CDM_Transactions (portfolio_sk,trade_id)", m["CDM_Transactions"]["dup_groups"]),
+        ("CDM_CashAgenda (portfolio_sk,security_sk,event_date,cash_type)", m["CDM_CashAgenda"]["dup_groups"]),
+    ]
+    write_csv(out/"cdm_duplicate_checks.csv", dupes, ["check","duplicate_groups"])
 
-# --- Distribution by date (daily values) & by portfolio
-by_date = q(cur, """SELECT value_date, COUNT(*) FROM CDM_PortfolioDailyValues
-                    GROUP BY value_date ORDER BY value_date""")
-write_csv(OUT/"pdv_by_date.csv", by_date, ["value_date","rows"])
+    # --- Distribution by date (daily values) & by portfolio
+    write_csv(out/"pdv_by_date.csv", m["CDM_PortfolioDailyValues"]["by_date"], ["value_date","rows"])
+    write_csv(out/"pdv_by_portfolio.csv", m["CDM_PortfolioDailyValues"]["by_portfolio"], ["portfolio_nk","rows"])
 
-by_port = q(cur, """SELECT p.portfolio_nk, COUNT(*) FROM CDM_PortfolioDailyValues d
-                    JOIN CDM_Portfolio p ON p.portfolio_sk = d.portfolio_sk
-                    GROUP BY p.portfolio_nk ORDER BY 2 DESC""")
-write_csv(OUT/"pdv_by_portfolio.csv", by_port, ["portfolio_nk","rows"])
+    # --- Sample ranges (already printed earlier, but export too)
+    ranges = [
+        ("CDM_Holdings","value_date"),
+        ("CDM_PortfolioDailyValues","value_date"),
+        ("CDM_Transactions","trade_date"),
+        ("CDM_Transactions","settle_date"),
+        ("CDM_CashAgenda","event_date")
+    ]
+    r_rows = [(t,c,m[t][f"min:{c}"],m[t][f"max:{c}"]) for t, c in ranges]
+    write_csv(out/"date_ranges.csv", r_rows, ["table","column","min","max"])
 
-# --- Sample ranges (already printed earlier, but export too)
-ranges = [
-    ("CDM_Holdings","value_date"),
-    ("CDM_PortfolioDailyValues","value_date"),
-    ("CDM_Transactions","trade_date"),
-    ("CDM_Transactions","settle_date"),
-    ("CDM_CashAgenda","event_date")
-]
-r_rows=[]
-for t, c in ranges:
-    mn, mx = q(cur, f"SELECT MIN({c}), MAX({c}) FROM {t}")[0]
-    r_rows.append((t,c,mn,mx))
-write_csv(OUT/"date_ranges.csv", r_rows, ["table","column","min","max"])
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Phase-1 data-quality report (CSV files)")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    ap.add_argument("--out", default=str(OUT), help="report folder")
+    ap.add_argument("--no-cache", action="store_true", help="measure every table, ignoring DQ_MetricCache")
+    rm.add_arguments(ap)
+    args = ap.parse_args()
 
-cur.close(); conn.close()
+    rm.start_from_args("report_dq", args)
+    t0 = time.perf_counter()
+    conn = sqlite3.connect(args.db)
+    metrics = dq.run(conn, use_cache=not args.no_cache)
+    with rm.stage("write_reports"):
+        write_reports(metrics, Path(args.out))
+    rm.finish(conn)
+    conn.close()
 
-print("DQ complete. CSVs written to:", OUT)
+    cached = metrics["_cached"]
+    print(f"Tables measured: {len(dq.TABLES) - len(cached)}, from cache: {len(cached)} ({time.perf_counter() - t0:.1f}s)")
+    print("DQ complete. CSVs written to:", args.out)
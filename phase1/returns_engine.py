@@ -0,0 +1,264 @@
+# Portfolio returns from CDM_PortfolioDailyValues, materialized in CDM_PortfolioReturns / CDM_PortfolioMWR.
+# The table is read once, sorted by (portfolio_sk, value_date), into NumPy arrays; every portfolio is then
+# handled in the same vectorized pass, with group boundaries (portfolio / month / quarter / year changes)
+# instead of a Python loop per portfolio:
+#   - daily modified-Dietz return  r = (V_end - V_start - F) / (V_start + w*F), F = inflow - |outflow|;
+#     the denominator is avg_capital when the source delivers it, else V_start + adj_inflow, else w = 0.5.
+#     V_start falls back to the previous day's value_end. Days without a computable return chain at 0.
+#   - chain-linked TWR index (base 100) and MTD/QTD/YTD/ITD returns on every date
+#   - money-weighted returns (IRR, Newton iterations batched over all portfolio x period windows)
+#     for the MTD/QTD/YTD/ITD windows ending on each portfolio's last date
+# Incremental: a portfolio is recomputed only when its PDV rows changed (count / rowid max+sum signature,
+# read off the (portfolio_sk, value_date) index); load_cdm_phase1.py rebuilds partitions by delete+insert,
+# so touched rows always carry new rowids.
+#   python returns_engine.py [--db phase1.db] [--full]
+
+import argparse, sqlite3, time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import bulk_load as bl
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+
+RETURNS_DDL = """
+CREATE TABLE IF NOT EXISTS CDM_PortfolioReturns (
+  portfolio_sk INTEGER NOT NULL,
+  value_date DATE NOT NULL,
+  r_daily DECIMAL(38,10),
+  twr_index DECIMAL(38,10),
+  r_mtd DECIMAL(38,10),
+  r_qtd DECIMAL(38,10),
+  r_ytd DECIMAL(38,10),
+  r_itd DECIMAL(38,10),
+  PRIMARY KEY (portfolio_sk, value_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS CDM_PortfolioMWR (
+  portfolio_sk INTEGER NOT NULL,
+  period VARCHAR(8) NOT NULL,
+  start_date DATE,
+  end_date DATE,
+  mwr_period DECIMAL(38,10),
+  mwr_annual DECIMAL(38,10),
+  PRIMARY KEY (portfolio_sk, period)
+);
+CREATE TABLE IF NOT EXISTS CDM_ReturnsState (
+  portfolio_sk INTEGER PRIMARY KEY,
+  row_count INTEGER,
+  max_rowid INTEGER,
+  sum_rowid INTEGER,
+  computed_at TIMESTAMP
+);
+"""
+
+FLOW_WEIGHT = 0.5        # intraday timing of flows when the source has neither avg_capital nor adj_inflow
+PERIODS = ["MTD", "QTD", "YTD", "ITD"]
+IRR_ITER = 50
+IRR_TOL = 1e-10
+
+def ensure_schema(conn):
+    conn.executescript(RETURNS_DDL)
+    conn.commit()
+
+# --- change detection ---
+def signatures(conn) -> pd.DataFrame:
+    return pd.read_sql("SELECT portfolio_sk, COUNT(*) AS row_count, MAX(rowid) AS max_rowid, SUM(rowid) AS sum_rowid "
+                       "FROM CDM_PortfolioDailyValues GROUP BY portfolio_sk", conn)
+
+def touched_portfolios(conn, sig: pd.DataFrame, full: bool) -> tuple:
+    # (portfolios to recompute, portfolios that no longer have daily values)
+    old = pd.read_sql("SELECT portfolio_sk, row_count, max_rowid, sum_rowid FROM CDM_ReturnsState", conn)
+    if full:
+        return sig["portfolio_sk"].tolist(), old["portfolio_sk"].tolist()
+    m = sig.merge(old, on="portfolio_sk", how="left", suffixes=("", "_old"))
+    same = np.ones(len(m), dtype=bool)
+    for c in ("row_count", "max_rowid", "sum_rowid"):
+        same &= (m[c] == m[f"{c}_old"]).to_numpy()
+    gone = sorted(set(old["portfolio_sk"]) - set(sig["portfolio_sk"]))
+    return m.loc[~same, "portfolio_sk"].tolist(), gone
+
+# --- load ---
+VALUE_COLS = ["value_start", "value_end", "inflow", "outflow", "adj_inflow", "avg_capital"]
+
+def load_values(conn, portfolios=None) -> dict:
+    # rows -> one float matrix (None -> NaN); dates come back as days since 1970 so no string parsing
+    where = ""
+    if portfolios is not None:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS _ret_ports (portfolio_sk INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM _ret_ports")
+        conn.executemany("INSERT INTO _ret_ports VALUES (?)", [(int(p),) for p in portfolios])
+        where = "WHERE portfolio_sk IN (SELECT portfolio_sk FROM _ret_ports)"
+    rows = conn.execute(f"SELECT portfolio_sk, CAST(julianday(value_date) - 2440587.5 AS INTEGER), {', '.join(VALUE_COLS)} "
+                        f"FROM CDM_PortfolioDailyValues {where} ORDER BY portfolio_sk, value_date, rowid").fetchall()
+    m = np.array(rows, dtype="float64").reshape(len(rows), 2 + len(VALUE_COLS))
+    port, day = m[:, 0].astype("int64"), m[:, 1].astype("int64")
+    # a re-delivered day: the latest row (highest rowid, last in the sort) wins
+    last = np.ones(len(rows), dtype=bool)
+    last[:-1] = (port[1:] != port[:-1]) | (day[1:] != day[:-1])
+    arr = {c: m[last, 2 + i] for i, c in enumerate(VALUE_COLS)}
+    arr["portfolio_sk"] = port[last]
+    arr["date"] = day[last].astype("datetime64[D]")
+    return arr
+
+def date_strings(d: np.ndarray) -> np.ndarray:
+    # ISO text for the insert: format each calendar day of the range once, then index
+    if not len(d):
+        return d.astype(str)
+    lo = d.min()
+    return np.datetime_as_string(np.arange(lo, d.max() + 1)).astype(object)[(d - lo).astype("int64")]
+
+# --- vectorized helpers ---
+def group_starts(*keys) -> np.ndarray:
+    # True where any key changes vs the previous row (row 0 always starts a group)
+    n = len(keys[0])
+    s = np.zeros(n, dtype=bool)
+    if n:
+        s[0] = True
+        for k in keys:
+            s[1:] |= k[1:] != k[:-1]
+    return s
+
+def start_index(starts: np.ndarray) -> np.ndarray:
+    # position of each row's group start
+    return np.maximum.accumulate(np.where(starts, np.arange(len(starts)), 0))
+
+def daily_returns(a: dict, new_port: np.ndarray) -> tuple:
+    flow = np.nan_to_num(a["inflow"]) - np.abs(np.nan_to_num(a["outflow"]))
+    prev_end = np.concatenate([[np.nan], a["value_end"][:-1]])
+    prev_end[new_port] = np.nan
+    v0 = np.where(np.isnan(a["value_start"]), prev_end, a["value_start"])
+    v0_or_0 = np.nan_to_num(v0)
+    denom = np.where(~np.isnan(a["avg_capital"]), a["avg_capital"],
+                     np.where(~np.isnan(a["adj_inflow"]), v0_or_0 + a["adj_inflow"], v0_or_0 + FLOW_WEIGHT * flow))
+    pnl = a["value_end"] - v0_or_0 - flow
+    ok = ~np.isnan(pnl) & (denom > 0) & (~np.isnan(v0) | (flow != 0))
+    r = np.full(len(flow), np.nan)
+    r[ok] = pnl[ok] / denom[ok]
+    return r, v0, flow
+
+def chain(r: np.ndarray, new_port: np.ndarray, period_starts: dict) -> dict:
+    # log-space cumulative sums, reset at group boundaries: index and period-to-date returns in one sweep
+    g = np.log1p(np.clip(np.nan_to_num(r), -1 + 1e-12, None))
+    cum = np.cumsum(g)
+    before = cum - g                                  # cumulative log up to (excluding) each row
+    out = {"twr_index": 100.0 * np.exp(cum - before[start_index(new_port)])}
+    out["r_itd"] = out["twr_index"] / 100.0 - 1.0
+    for p, starts in period_starts.items():
+        out[f"r_{p.lower()}"] = np.expm1(cum - before[start_index(starts)])
+    return out
+
+def irr_batched(seg: np.ndarray, t: np.ndarray, cf: np.ndarray, nseg: int, guess: np.ndarray) -> np.ndarray:
+    # Newton on NPV(r) = sum cf * (1+r)^-t for all segments at once; segments that do not converge -> NaN.
+    # Converged segments drop out of the flow arrays, so later iterations only touch the stragglers.
+    r = np.where(np.isfinite(guess), guess, 0.0)
+    done = np.zeros(nseg, dtype=bool)
+    for _ in range(IRR_ITER):
+        rs = 1.0 + r[seg]
+        disc = cf * np.power(rs, -t)
+        f = np.bincount(seg, weights=disc, minlength=nseg)
+        df = np.bincount(seg, weights=-t * disc / rs, minlength=nseg)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(done | (df == 0), 0.0, f / df)
+        r = np.clip(r - step, -0.9999, 1e6)
+        done |= (np.abs(step) < IRR_TOL) & (df != 0)
+        if done.all():
+            break
+        live = ~done[seg]
+        seg, t, cf = seg[live], t[live], cf[live]
+    r[~done] = np.nan
+    return r
+
+def ranges(first: np.ndarray, last: np.ndarray) -> tuple:
+    # concatenated row positions first[i]..last[i] and the window number of each
+    lens = last - first + 1
+    win = np.repeat(np.arange(len(first)), lens)
+    offs = np.concatenate([[0], np.cumsum(lens)[:-1]]) if len(lens) else lens
+    return np.arange(lens.sum()) - np.repeat(offs, lens) + np.repeat(first, lens), win
+
+def money_weighted(a: dict, v0: np.ndarray, flow: np.ndarray, new_port: np.ndarray, period_starts: dict,
+                   ptd: dict) -> pd.DataFrame:
+    # Windows: each portfolio's current MTD/QTD/YTD/ITD period. Investor cash flows: -opening value at the
+    # start of the first day, -net flow within each day (same timing as the Dietz weight), +closing value at
+    # the end of the last day; t in years. Without an opening value (a portfolio's first day, no value_start)
+    # and no flow that day, the window opens at the end of the first day at its value_end -- chain() links
+    # that day at 0 too. A first day with a flow and no opening value starts from 0 (funded by the flow).
+    d = a["date"]
+    port_last = np.append(np.flatnonzero(new_port)[1:] - 1, len(flow) - 1) if len(flow) else np.array([], dtype="int64")
+    starts = {p: (new_port if p == "ITD" else period_starts[p]) for p in PERIODS}
+    first = np.concatenate([start_index(starts[p])[port_last] for p in PERIODS])
+    last = np.tile(port_last, len(PERIODS))
+    twr = np.concatenate([ptd[f"r_{p.lower()}"][port_last] for p in PERIODS])
+    nwin = len(first)
+    idx, win = ranges(first, last)
+    late = np.isnan(v0[first]) & (flow[first] == 0)
+    d0 = d[first] + late.astype("int64")             # day the window opens (at its start)
+    years = ((d[last] - d0).astype("float64") + 1.0) / 365.0
+    opening = np.where(late, a["value_end"][first], np.nan_to_num(v0[first]))
+    closing = a["value_end"][last]
+    has_flow = np.bincount(win, weights=(flow[idx] != 0), minlength=nwin) > 0
+    valid = np.isfinite(opening) & np.isfinite(closing) & ((opening != 0) | has_flow) & (years > 0)
+
+    seg = np.concatenate([np.arange(nwin), win, np.arange(nwin)])
+    t = np.concatenate([np.zeros(nwin), ((d[idx] - d0[win]).astype("float64") + 1.0 - FLOW_WEIGHT) / 365.0, years])
+    cf = np.concatenate([-np.nan_to_num(opening), -flow[idx], np.nan_to_num(closing)])
+    keep = valid[seg] & (cf != 0)  # days without flows add nothing to the NPV
+    # Newton starts from the annualized TWR of the window
+    irr = irr_batched(seg[keep], t[keep], cf[keep], nwin, np.power(1.0 + np.nan_to_num(twr), 1.0 / np.where(valid, years, 1.0)) - 1.0)
+    irr[~valid] = np.nan
+    return pd.DataFrame({"portfolio_sk": a["portfolio_sk"][last], "period": np.repeat(PERIODS, len(port_last)),
+                         "start_date": date_strings(np.minimum(d0, d[last])), "end_date": date_strings(d[last]),
+                         "mwr_period": np.power(1.0 + irr, years) - 1.0, "mwr_annual": irr})
+
+def compute(a: dict) -> tuple:
+    """(daily returns frame, money-weighted frame) for the portfolios in `a` (sorted by portfolio, date)."""
+    port, d = a["portfolio_sk"], a["date"]
+    new_port = group_starts(port)
+    month = d.astype("datetime64[M]").astype("int64")
+    period_starts = {"MTD": group_starts(port, month), "QTD": group_starts(port, month // 3),
+                     "YTD": group_starts(port, d.astype("datetime64[Y]").astype("int64"))}
+    r, v0, flow = daily_returns(a, new_port)
+    ptd = chain(r, new_port, period_starts)
+    daily = pd.DataFrame({"portfolio_sk": port, "value_date": date_strings(d), "r_daily": r, **ptd})
+    mwr = money_weighted(a, v0, flow, new_port, period_starts, ptd)
+    return daily, mwr
+
+def refresh(conn, full: bool = False) -> dict:
+    ensure_schema(conn)
+    sig = signatures(conn)
+    todo, gone = touched_portfolios(conn, sig, full)
+    t0 = time.perf_counter()
+    a = load_values(conn, todo)
+    t1 = time.perf_counter()
+    daily, mwr = compute(a)
+    t2 = time.perf_counter()
+    try:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS _ret_drop (portfolio_sk INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM _ret_drop")
+        conn.executemany("INSERT OR IGNORE INTO _ret_drop VALUES (?)", [(int(p),) for p in list(todo) + list(gone)])
+        for t in ("CDM_PortfolioReturns", "CDM_PortfolioMWR", "CDM_ReturnsState"):
+            conn.execute(f"DELETE FROM {t} WHERE portfolio_sk IN (SELECT portfolio_sk FROM _ret_drop)")
+        bl.append(conn, "CDM_PortfolioReturns", daily)
+        bl.append(conn, "CDM_PortfolioMWR", mwr)
+        state = sig[sig["portfolio_sk"].isin(todo)].assign(computed_at=datetime.now().isoformat(timespec="seconds"))
+        bl.append(conn, "CDM_ReturnsState", state)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return {"portfolios": len(todo), "removed": len(gone), "rows": len(daily),
+            "load_s": t1 - t0, "compute_s": t2 - t1, "write_s": time.perf_counter() - t2}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="TWR / MWR returns from CDM_PortfolioDailyValues (incremental)")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    ap.add_argument("--full", action="store_true", help="recompute every portfolio")
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    with bl.session(conn):
+        res = refresh(conn, args.full)
+    conn.close()
+    print(f"Returns: {res['portfolios']} portfolio(s) recomputed, {res['removed']} removed, {res['rows']} rows "
+          f"(load {res['load_s']:.1f}s, compute {res['compute_s']:.1f}s, write {res['write_s']:.1f}s)")
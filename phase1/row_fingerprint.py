@@ -0,0 +1,257 @@
+# Row fingerprints for the SRC_* landing tables (shared by load_src_phase1.py and the Source Compiler).
+# Custodians resend overlapping extracts (Holdings for an evaluation date already delivered, Movements windows
+# that overlap the previous file). Before a frame is appended, every row is hashed over the table's columns and
+# looked up in the table's fingerprint store; rows already loaded by another live batch are dropped ('drop')
+# or loaded and only counted ('flag'). Counts per batch are kept in SEEN for the loaders' reports.
+#
+# - hash: two independent 64-bit hashes (pd.util.hash_pandas_object, vectorized) of the values as SQLite stores
+#   them (bulk_load.native_column; numbers as floats, text/dates as their stored strings, NULL = ''), so a row
+#   hashes the same from CSV, xlsx, parquet or the legacy loader, and when backfilled from the table itself.
+#   fp is the store key, fp2 must match too (a 64-bit collision is never taken for a duplicate)
+# - store: FP_<table>(fp INTEGER PRIMARY KEY, fp2, batch_id), i.e. the rowid B-tree itself, one row per distinct
+#   SRC row. A chunk is probed through a TEMP table joined on the rowid: memory is one chunk of hashes, however
+#   many hundred million fingerprints are stored
+# - batches: rows of the batch being loaded and of the batch it supersedes (same file) are not duplicates --
+#   a re-delivered file replaces its previous batch (ingest_manifest). Duplicates within one delivery are kept.
+#   The store is written inside the file's load transaction; ingest_manifest forgets the fingerprints of
+#   superseded/failed batches and clears a table's store on a full reload
+# - other owners: FP_<table>_dup(fp, batch_id, n) lists the other live batches that delivered a stored row, with
+#   the copies they dropped (n; 0 in 'flag' mode, their copies are loaded). When the owning batch is forgotten
+#   (re-delivered without the row, failed), the lowest of them takes the fingerprint over and its n dropped
+#   copies are landed again under its batch id, copied from the forgotten batch's row -- so forget() runs
+#   before the batch's rows are deleted
+#   python row_fingerprint.py stats | backfill [--table SRC_Holdings]
+
+import argparse, sqlite3
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+import bulk_load as bl
+import physical_design as phys
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+
+DEFAULT_TABLES = ["SRC_Holdings", "SRC_Movements", "SRC_DailyValues", "SRC_CashAgenda"]  # calendars share dates
+MODES = ("drop", "flag", "off")
+HASH_KEYS = ("srcrowfp-key-001", "srcrowfp-key-002")  # 16 bytes each (siphash); changed keys need a backfill
+SKIP_COLUMNS = {"load_batch_id"}  # + derived key columns (physical_design.KEY_COLUMNS)
+NUMERIC_TYPES = ("INT", "REAL", "FLOA", "DOUB", "DEC", "NUM", "BOOL")
+READ_ROWS = 200000
+
+SEEN: Dict[int, int] = {}  # batch_id -> duplicate rows found (loaders pop it when the file is done)
+
+def store_name(table: str) -> str:
+    return f"FP_{table}"
+
+def dup_store_name(table: str) -> str:
+    return f"FP_{table}_dup"
+
+def _exists(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is not None
+
+def ensure_schema(conn, tables=DEFAULT_TABLES):
+    # a store created next to a table that already has rows is backfilled from it
+    for t in tables:
+        store = store_name(t)
+        if not _exists(conn, t):
+            continue
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {dup_store_name(t)} (fp INTEGER NOT NULL, batch_id INTEGER NOT NULL, "
+                     f"n INTEGER NOT NULL, PRIMARY KEY (fp, batch_id)) WITHOUT ROWID")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{dup_store_name(t).lower()}_batch ON {dup_store_name(t)}(batch_id)")
+        if _exists(conn, store):
+            continue
+        conn.execute(f"CREATE TABLE {store} (fp INTEGER PRIMARY KEY, fp2 INTEGER NOT NULL, batch_id INTEGER NOT NULL)")
+        conn.execute(f"CREATE INDEX ix_{store.lower()}_batch ON {store}(batch_id)")
+        backfill(conn, t)
+    conn.commit()
+
+def fingerprint_columns(conn, table: str) -> List[Tuple[str, bool]]:
+    """[(column, numeric)] hashed for `table`, in schema order."""
+    derived = set(phys.KEY_COLUMNS.get(table, {}))
+    return [(r[1], any(k in (r[2] or "").upper() for k in NUMERIC_TYPES))
+            for r in conn.execute(f"PRAGMA table_info({table})")
+            if r[1] not in SKIP_COLUMNS and r[1] not in derived]
+
+def fingerprints(df: pd.DataFrame, cols: List[Tuple[str, bool]]) -> Tuple[np.ndarray, np.ndarray]:
+    """(fp, fp2) int64 arrays, one per row of df; columns missing from df hash as NULL."""
+    canon = {}
+    for i, (c, numeric) in enumerate(cols):
+        if c in df.columns:
+            v = bl.native_column(df[c])
+        else:
+            v = np.full(len(df), None, dtype=object)
+        if numeric:
+            canon[i] = pd.to_numeric(pd.Series(v, dtype=object), errors="coerce").to_numpy(dtype=np.float64) + 0.0
+        else:
+            t = pd.Series(v, dtype=object)
+            if pd.api.types.infer_dtype(v, skipna=True) not in ("string", "empty"):
+                t = t.map(lambda x: x if x is None else str(x))  # numbers in a text column, as SQLite stores them
+            canon[i] = t.fillna("").to_numpy(dtype=object)
+    frame = pd.DataFrame(canon)
+    out = [pd.util.hash_pandas_object(frame, index=False, hash_key=k).to_numpy().view(np.int64) for k in HASH_KEYS]
+    return out[0], out[1]
+
+def _own_batches(conn, table: str, batch_id: int) -> List[int]:
+    # the batch being loaded + the current batch(es) of the same file, which it replaces
+    row = conn.execute("SELECT path FROM SRC_IngestManifest WHERE batch_id=?", (batch_id,)).fetchone()
+    prev = [] if row is None else [r[0] for r in conn.execute(
+        "SELECT batch_id FROM SRC_IngestManifest WHERE target_table=? AND path=? AND status='current'", (table, row[0]))]
+    return [int(batch_id)] + prev
+
+def _probe(conn, fp: np.ndarray, fp2: np.ndarray):
+    # sorted: appends to the probe B-tree, and the join then seeks the store in key order (page cache hits)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS fp_probe (fp INTEGER PRIMARY KEY, fp2 INTEGER)")
+    conn.execute("DELETE FROM fp_probe")
+    fp, first = np.unique(fp, return_index=True)
+    conn.executemany("INSERT INTO fp_probe (fp, fp2) VALUES (?, ?)", zip(fp.tolist(), fp2[first].tolist()))
+
+def seen(conn, table: str, fp: np.ndarray, fp2: np.ndarray, own: List[int]) -> np.ndarray:
+    """Boolean mask: row already stored by a live ('current') batch other than `own`."""
+    if not len(fp):
+        return np.zeros(0, dtype=bool)
+    _probe(conn, fp, fp2)
+    hits = [r[0] for r in conn.execute(
+        # CROSS JOIN pins the loop order: walk the chunk, seek the store (never scan it), then the owner's batch;
+        # a fingerprint left behind by a retired batch is not a duplicate
+        f"SELECT p.fp FROM fp_probe p CROSS JOIN {store_name(table)} s ON s.fp = p.fp AND s.fp2 = p.fp2 "
+        f"CROSS JOIN SRC_IngestManifest m ON m.batch_id = s.batch_id AND m.status = 'current' "
+        f"WHERE s.batch_id NOT IN ({','.join(map(str, own))})")]
+    return np.isin(fp, np.array(hits, dtype=np.int64))
+
+def remember(conn, table: str, fp: np.ndarray, fp2: np.ndarray, batch_id: int, own: List[int]):
+    # new fingerprints, those of the batch this one replaces and those left behind by retired batches now
+    # belong to batch_id; a fingerprint of another live batch keeps its owner ('flag' mode loads such rows anyway)
+    order = np.argsort(fp, kind="stable")
+    fp, fp2 = fp[order], fp2[order]
+    store = store_name(table)
+    conn.executemany(
+        f"INSERT INTO {store} (fp, fp2, batch_id) VALUES (?, ?, ?) "
+        f"ON CONFLICT(fp) DO UPDATE SET fp2 = excluded.fp2, batch_id = excluded.batch_id "
+        f"WHERE {store}.batch_id IN ({','.join(map(str, own))}) OR NOT EXISTS "
+        f"(SELECT 1 FROM SRC_IngestManifest m WHERE m.batch_id = {store}.batch_id AND m.status = 'current')",
+        zip(fp.tolist(), fp2.tolist(), [int(batch_id)] * len(fp)))
+
+def remember_dup(conn, table: str, fp: np.ndarray, batch_id: int, dropped: bool):
+    # batch_id delivered rows another live batch owns: record it as an other owner (+ the copies it dropped)
+    fp, n = np.unique(fp, return_counts=True)
+    conn.executemany(
+        f"INSERT INTO {dup_store_name(table)} (fp, batch_id, n) VALUES (?, ?, ?) "
+        f"ON CONFLICT(fp, batch_id) DO UPDATE SET n = n + excluded.n",
+        zip(fp.tolist(), [int(batch_id)] * len(fp), (n if dropped else np.zeros_like(n)).tolist()))
+
+def dedupe(conn, table: str, df: pd.DataFrame, batch_id: int, mode: str = "drop") -> Tuple[pd.DataFrame, int]:
+    """Check df (rows about to be appended to `table` under batch_id) against the store. Returns the frame to
+    append (duplicates removed in 'drop' mode) and the duplicate count (also added to SEEN[batch_id])."""
+    if mode == "off" or batch_id is None or df.empty or not _exists(conn, store_name(table)):
+        return df, 0
+    if mode not in MODES:
+        raise RuntimeError(f"dedupe mode {mode!r}: use one of {MODES}")
+    fp, fp2 = fingerprints(df, fingerprint_columns(conn, table))
+    own = _own_batches(conn, table, batch_id)
+    dup = seen(conn, table, fp, fp2, own)
+    n = int(dup.sum())
+    SEEN[batch_id] = SEEN.get(batch_id, 0) + n
+    if n:
+        remember_dup(conn, table, fp[dup], batch_id, mode == "drop")
+    if mode == "drop" and n:
+        df, fp, fp2 = df[~dup], fp[~dup], fp2[~dup]
+    remember(conn, table, fp, fp2, batch_id, own)
+    return df, n
+
+def forget(conn, table: str, batch_ids) -> int:
+    """Drop the fingerprints of superseded / failed batches -- before their rows are deleted: a fingerprint
+    another live batch also delivered passes to it and the copies it dropped are landed again. Returns the
+    rows landed again."""
+    if not batch_ids or not _exists(conn, store_name(table)):
+        return 0
+    store, dups = store_name(table), dup_store_name(table)
+    ids = ",".join(str(int(b)) for b in batch_ids)
+    conn.execute(f"DELETE FROM {dups} WHERE batch_id IN ({ids})")
+    # MIN() picks the row n comes from
+    heirs = conn.execute(f"SELECT d.fp, MIN(d.batch_id), d.n FROM {store} s CROSS JOIN {dups} d ON d.fp = s.fp "
+                         f"WHERE s.batch_id IN ({ids}) GROUP BY d.fp").fetchall()
+    landed = _land_again(conn, table, ids, [h for h in heirs if h[2]])
+    conn.executemany(f"UPDATE {store} SET batch_id = ? WHERE fp = ?", [(b, f) for f, b, _ in heirs])
+    conn.executemany(f"DELETE FROM {dups} WHERE fp = ? AND batch_id = ?", [(f, b) for f, b, _ in heirs])
+    conn.execute(f"DELETE FROM {store} WHERE batch_id IN ({ids})")
+    return landed
+
+def _land_again(conn, table: str, ids: str, heirs: list) -> int:
+    # heirs: [(fp, batch_id, n)]; the rows are copied from a row of the forgotten batches with that fingerprint
+    if not heirs:
+        return 0
+    want = np.array(sorted(h[0] for h in heirs), dtype=np.int64)
+    cols = fingerprint_columns(conn, table)
+    names = ", ".join(f'"{c}"' for c, _ in cols)
+    source = {}
+    for part in pd.read_sql(f"SELECT rowid AS _rowid, {names} FROM {table} WHERE load_batch_id IN ({ids})",
+                            conn, chunksize=READ_ROWS):
+        fp, _ = fingerprints(part, cols)
+        hit = np.isin(fp, want)
+        for f, r in zip(fp[hit].tolist(), part["_rowid"].to_numpy()[hit].tolist()):
+            source.setdefault(f, r)
+    copy = [f'"{r[1]}"' for r in conn.execute(f"PRAGMA table_info({table})") if r[1] != "load_batch_id"]
+    sql = (f"INSERT INTO {table} ({', '.join(copy)}, load_batch_id) "
+           f"SELECT {', '.join(copy)}, ? FROM {table} WHERE rowid = ?")
+    rows = [(b, source[f]) for f, b, n in heirs if f in source for _ in range(n)]
+    conn.executemany(sql, rows)
+    if len(source) < len(heirs):
+        print(f"  [{table}] {len(heirs) - len(source)} row(s) dropped as duplicates of batch(es) {ids} could not be "
+              f"landed again: the rows are no longer in the table")
+    return len(rows)
+
+def clear(conn, table: str):
+    for store in (store_name(table), dup_store_name(table)):
+        if _exists(conn, store):
+            conn.execute(f"DELETE FROM {store}")
+
+def backfill(conn, table: str) -> int:
+    """(Re)build the store of `table` from its rows, read in slices of READ_ROWS. No commit. Dropped copies
+    (FP_<table>_dup n > 0) are not in the table and are kept; the other owners of loaded rows are rebuilt."""
+    store, dups = store_name(table), dup_store_name(table)
+    conn.execute(f"DELETE FROM {store}")
+    conn.execute(f"DELETE FROM {dups} WHERE n = 0")
+    cols = fingerprint_columns(conn, table)
+    names = ", ".join(f'"{c}"' for c, _ in cols)
+    n = 0
+    for part in pd.read_sql(f"SELECT load_batch_id, {names} FROM {table} WHERE load_batch_id IS NOT NULL "
+                            f"ORDER BY load_batch_id", conn, chunksize=READ_ROWS):
+        fp, fp2 = fingerprints(part, cols)
+        bid = part["load_batch_id"].astype("int64").tolist()
+        conn.executemany(f"INSERT OR IGNORE INTO {store} (fp, fp2, batch_id) VALUES (?, ?, ?)",
+                         zip(fp.tolist(), fp2.tolist(), bid))
+        conn.executemany(f"INSERT OR IGNORE INTO {dups} (fp, batch_id, n) SELECT ?, ?, 0 "
+                         f"WHERE EXISTS (SELECT 1 FROM {store} WHERE fp = ? AND batch_id <> ?)",
+                         zip(fp.tolist(), bid, fp.tolist(), bid))
+        n += len(part)
+    return n
+
+def stats(conn, tables=DEFAULT_TABLES) -> pd.DataFrame:
+    rows = []
+    for t in tables:
+        if _exists(conn, store_name(t)):
+            stored = conn.execute(f"SELECT COUNT(*) FROM {store_name(t)}").fetchone()[0]
+            dropped = (conn.execute(f"SELECT SUM(n) FROM {dup_store_name(t)}").fetchone()[0] or 0
+                       if _exists(conn, dup_store_name(t)) else 0)
+            rows.append({"table": t, "rows": conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0],
+                         "fingerprints": stored, "dropped": dropped})
+    return pd.DataFrame(rows, columns=["table", "rows", "fingerprints", "dropped"])
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="SRC_* row fingerprint stores (ingest-time dedupe)")
+    ap.add_argument("cmd", choices=["stats", "backfill"])
+    ap.add_argument("--table", action="append", help="SRC table (repeatable; default: all deduped tables)")
+    ap.add_argument("--db", default=str(DB))
+    args = ap.parse_args()
+    conn = sqlite3.connect(args.db)
+    tables = args.table or DEFAULT_TABLES
+    if args.cmd == "backfill":
+        ensure_schema(conn, tables)
+        for t in tables:
+            if _exists(conn, store_name(t)):
+                print(t, backfill(conn, t), "rows fingerprinted")
+        conn.commit()
+    print(stats(conn, tables).to_string(index=False))
+    conn.close()
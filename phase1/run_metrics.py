@@ -0,0 +1,261 @@
+# Run metrics for the loaders, the Source Compiler, Move-3 and the DQ report: per named stage, calls, wall and
+# CPU time, rows in/out, rows/s and peak memory. Each program wraps its steps in
+#   with rm.stage("parse_dates", rows_in=len(s)) as st:
+#       ...
+#       st.rows_out = n
+# and starts a run with --metrics. Stages with the same name are summed (one row per stage, not per chunk);
+# stages nest (a file stage around its read/parse/append stages). Passing conn= counts the rows a SQL block
+# changed (conn.total_changes). Disabled -- the default -- stage() returns one shared no-op object, so the
+# instrumented code pays a global lookup and a call per stage.
+#
+# Results: RUN_Metrics rows (one per stage per run) and reports/metrics/<program>_<run_id>.json.
+# Peak memory: 'rss' samples the process RSS on a thread (psutil if installed, else /proc/self/statm; the
+# peak is then the process high-water mark during the stage), 'tracemalloc' traces Python + numpy
+# allocations exactly (several times slower: use it on one program at a time), 'off'.
+# --profile-stage NAME runs that stage under cProfile and dumps <program>_<run_id>_<stage>.prof
+# (python -m pstats ...) next to the JSON.
+
+import json, os, threading, time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import psutil  # optional: pip install psutil
+except Exception:
+    psutil = None
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+OUT  = BASE / r"reports\metrics"
+
+METRICS_DDL = """
+CREATE TABLE IF NOT EXISTS RUN_Metrics (
+  run_id VARCHAR(32) NOT NULL,
+  program VARCHAR(64) NOT NULL,
+  stage VARCHAR(128) NOT NULL,
+  parent VARCHAR(128),
+  calls INTEGER,
+  wall_s REAL,
+  cpu_s REAL,
+  rows_in INTEGER,
+  rows_out INTEGER,
+  rows_per_s REAL,
+  peak_mb REAL,
+  started_at TIMESTAMP,
+  PRIMARY KEY (run_id, program, stage)
+);
+CREATE INDEX IF NOT EXISTS ix_run_metrics_stage ON RUN_Metrics(program, stage, run_id);
+"""
+
+SAMPLE_S = 0.02  # RSS sampling interval
+
+class _NullStage:
+    # shared no-op stage of a disabled run: attribute writes are dropped
+    __slots__ = ()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def __setattr__(self, name, value):
+        pass
+
+NULL = _NullStage()
+ACTIVE = None  # the Run being recorded (None = disabled)
+
+def _rss_reader():
+    if psutil is not None:
+        proc = psutil.Process()
+        return lambda: proc.memory_info().rss
+    if os.path.exists("/proc/self/statm"):
+        page = os.sysconf("SC_PAGE_SIZE")
+        def rss():
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * page
+        return rss
+    return None
+
+class Stage:
+    __slots__ = ("run", "name", "rows_in", "rows_out", "conn", "parent", "peak", "_t", "_c", "_changes")
+
+    def __init__(self, run, name: str, rows_in=None, conn=None):
+        self.run, self.name, self.rows_in, self.rows_out, self.conn = run, name, rows_in, None, conn
+        self.parent, self.peak = None, 0
+
+    def __enter__(self):
+        self.run._enter(self)
+        self._changes = self.conn.total_changes if self.conn is not None else None
+        self._c = time.process_time()
+        self._t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._t
+        cpu = time.process_time() - self._c
+        if self._changes is not None and self.rows_out is None:
+            self.rows_out = self.conn.total_changes - self._changes
+        self.run._exit(self, wall, cpu)
+        return False
+
+class Run:
+    def __init__(self, program: str, run_id: str = None, memory: str = "rss", profile_stage: str = None):
+        self.program = program
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.stats = {}   # stage -> dict, in first-seen order
+        self.stack = []
+        self.profile_stage, self.profiler = profile_stage, None
+        self.memory = memory
+        self._rss = _rss_reader() if memory == "rss" else None
+        self._stop = threading.Event()
+        self._sampler = None
+        if memory == "tracemalloc":
+            import tracemalloc
+            self._tm = tracemalloc
+            tracemalloc.start()
+        elif self._rss is not None:
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_S):
+            m = self._rss()
+            for st in tuple(self.stack):
+                if m > st.peak:
+                    st.peak = m
+
+    def _memory(self) -> int:
+        if self.memory == "tracemalloc":
+            return self._tm.get_traced_memory()[1]
+        return self._rss() if self._rss is not None else 0
+
+    def _enter(self, st: Stage):
+        m = self._memory()
+        if self.stack:
+            st.parent = self.stack[-1].name
+            outer = self.stack[-1]
+            outer.peak = max(outer.peak, m)
+        if self.memory == "tracemalloc":
+            self._tm.reset_peak()  # the stage's peak is measured from here (the parent keeps its own so far)
+        st.peak = m
+        self.stack.append(st)
+        if st.name not in self.stats:  # report order: first entered, so a parent precedes its stages
+            self.stats[st.name] = {"parent": st.parent, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                   "rows_in": None, "rows_out": None, "peak_mb": 0.0}
+        if st.name == self.profile_stage and self.profiler is None:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        if st.name == self.profile_stage and not any(s.name == st.name for s in self.stack[:-1]):
+            self.profiler.enable()
+
+    def _exit(self, st: Stage, wall: float, cpu: float):
+        if st.name == self.profile_stage and not any(s.name == st.name for s in self.stack[:-1]):
+            self.profiler.disable()
+        st.peak = max(st.peak, self._memory())
+        self.stack.pop()
+        if self.stack:
+            self.stack[-1].peak = max(self.stack[-1].peak, st.peak)
+        s = self.stats[st.name]
+        s["calls"] += 1
+        s["wall_s"] += wall
+        s["cpu_s"] += cpu
+        for k in ("rows_in", "rows_out"):
+            v = getattr(st, k)
+            if v is not None:
+                s[k] = (s[k] or 0) + int(v)
+        s["peak_mb"] = max(s["peak_mb"], st.peak / 2**20)
+
+    def merge(self, stats: dict):
+        # stages recorded in another process (compiler --workers): summed, peak = max over processes
+        for name, o in stats.items():
+            s = self.stats.setdefault(name, dict(o, calls=0, wall_s=0.0, cpu_s=0.0, rows_in=None, rows_out=None,
+                                                 peak_mb=0.0))
+            for k in ("calls", "wall_s", "cpu_s"):
+                s[k] += o[k]
+            for k in ("rows_in", "rows_out"):
+                if o[k] is not None:
+                    s[k] = (s[k] or 0) + o[k]
+            s["peak_mb"] = max(s["peak_mb"], o["peak_mb"])
+
+    def rows(self) -> list:
+        out = []
+        for name, s in self.stats.items():
+            n = s["rows_out"] if s["rows_out"] is not None else s["rows_in"]
+            out.append({"stage": name, "parent": s["parent"], "calls": s["calls"], "wall_s": round(s["wall_s"], 4),
+                        "cpu_s": round(s["cpu_s"], 4), "rows_in": s["rows_in"], "rows_out": s["rows_out"],
+                        "rows_per_s": round(n / s["wall_s"], 1) if n and s["wall_s"] > 0 else None,
+                        "peak_mb": round(s["peak_mb"], 1) if s["peak_mb"] else None})
+        return out
+
+    def close(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if self.memory == "tracemalloc":
+            self._tm.stop()
+
+def start(program: str, run_id: str = None, memory: str = "rss", profile_stage: str = None) -> Run:
+    global ACTIVE
+    ACTIVE = Run(program, run_id, memory, profile_stage)
+    return ACTIVE
+
+def stage(name: str, rows_in=None, conn=None):
+    run = ACTIVE
+    if run is None:
+        return NULL
+    return Stage(run, name, rows_in, conn)
+
+def ensure_schema(conn):
+    conn.executescript(METRICS_DDL)
+    conn.commit()
+
+def finish(conn=None, out_dir: Path = None, quiet: bool = False) -> list:
+    """Stop recording; write RUN_Metrics (if conn) and the JSON file (+ the cProfile dump). Returns the rows."""
+    global ACTIVE
+    run, ACTIVE = ACTIVE, None
+    if run is None:
+        return []
+    run.close()
+    rows = run.rows()
+    out_dir = Path(out_dir or OUT)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"{run.program}_{run.run_id}"
+    doc = {"run_id": run.run_id, "program": run.program, "started_at": run.started_at,
+           "finished_at": datetime.now().isoformat(timespec="seconds"), "memory": run.memory, "stages": rows}
+    (out_dir / f"{stem}.json").write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    if run.profiler is not None:
+        prof = out_dir / f"{stem}_{run.profile_stage.replace(':', '_')}.prof"
+        run.profiler.dump_stats(str(prof))
+        if not quiet:
+            print("cProfile:", prof)
+    if conn is not None:
+        ensure_schema(conn)
+        conn.executemany(
+            "INSERT OR REPLACE INTO RUN_Metrics (run_id, program, stage, parent, calls, wall_s, cpu_s, rows_in, "
+            "rows_out, rows_per_s, peak_mb, started_at) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+            [(run.run_id, run.program, r["stage"], r["parent"], r["calls"], r["wall_s"], r["cpu_s"], r["rows_in"],
+              r["rows_out"], r["rows_per_s"], r["peak_mb"], run.started_at) for r in rows])
+        conn.commit()
+    if not quiet:
+        print(f"Run metrics ({run.program} {run.run_id}):")
+        print(report(rows))
+    return rows
+
+def report(rows: list) -> str:
+    fmt = lambda v, f: "" if v is None else format(v, f)
+    lines = [f"  {'stage':36s} {'calls':>6s} {'wall_s':>9s} {'cpu_s':>9s} {'rows_out':>10s} {'rows/s':>11s} {'peak_mb':>8s}"]
+    for r in rows:
+        lines.append(f"  {r['stage'][:36]:36s} {r['calls']:6d} {r['wall_s']:9.3f} {r['cpu_s']:9.3f} "
+                     f"{fmt(r['rows_out'] if r['rows_out'] is not None else r['rows_in'], 'd'):>10s} "
+                     f"{fmt(r['rows_per_s'], ',.0f'):>11s} {fmt(r['peak_mb'], '.1f'):>8s}")
+    return "\n".join(lines)
+
+def add_arguments(ap):
+    # --metrics / --metrics-memory / --profile-stage, shared by the instrumented CLIs
+    ap.add_argument("--metrics", action="store_true", help="record per-stage run metrics (RUN_Metrics + JSON)")
+    ap.add_argument("--metrics-memory", choices=["rss", "tracemalloc", "off"], default="rss",
+                    help="peak memory per stage: sampled RSS (default), exact tracemalloc (slower), off")
+    ap.add_argument("--profile-stage", default=None, help="run this stage under cProfile (implies --metrics)")
+
+def start_from_args(program: str, args, run_id: str = None):
+    if args.metrics or args.profile_stage:
+        return start(program, run_id, args.metrics_memory, args.profile_stage)
+    return None
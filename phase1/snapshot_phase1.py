@@ -1,22 +1,80 @@
-import zipfile, time, sys, hashlib, os
+import argparse, json, os, sqlite3, sys, time, hashlib, tempfile, zlib
 from pathlib import Path
 from datetime import datetime
 
 BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
 DB   = BASE / "phase1.db"
 
-# Save the zip at project root to keep phase1 clean (change to BASE if you prefer inside the folder)
-OUT  = BASE.parent / f"phase1_snapshot_{time.strftime('%Y%m%d_%H%M')}.zip"
+# Content-addressed snapshot store at project root (keeps phase1 clean):
+#   blobs/ab/abcd....z        zlib-compressed content, named by the sha256 of the uncompressed bytes
+#   manifests/<id>.json       what a snapshot contains (paths -> blob hashes), + MANIFEST.txt summary text
+# Unchanged sources and unchanged regions of phase1.db are stored once across snapshots.
+#   python snapshot_phase1.py                      # create
+#   python snapshot_phase1.py list
+#   python snapshot_phase1.py restore 20250901_0930 [--to C:\restore\phase1]
+STORE = BASE.parent / "phase1_snapshots"
 
-def sha256_of(path: Path) -> str:
-    h = hashlib.sha256()
+READ_CHUNK = 1024 * 1024
+DB_CHUNK_PAGES = 256     # DB is stored as blobs of this many pages: a day's writes only touch a few of them
+BACKUP_PAGES = 1024      # pages copied per backup step; writers get the db back between steps
+
+def blob_path(digest: str) -> Path:
+    return STORE / "blobs" / digest[:2] / f"{digest}.z"
+
+def put_blob(chunks) -> tuple:
+    """Hash and compress in one pass over `chunks` (iterable of bytes). Returns (sha256, size, stored_new)."""
+    h, z, size = hashlib.sha256(), zlib.compressobj(6), 0
+    tmp_dir = STORE / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in chunks:
+                h.update(chunk)
+                size += len(chunk)
+                out.write(z.compress(chunk))
+            out.write(z.flush())
+        digest = h.hexdigest()
+        target = blob_path(digest)
+        if target.exists():
+            return digest, size, False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, target)
+        return digest, size, True
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def read_chunks(path: Path, size: int = READ_CHUNK):
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+        for chunk in iter(lambda: f.read(size), b""):
+            yield chunk
+
+def backup_db(db_path: Path, dest: Path):
+    # online backup API: a consistent copy even while a loader is writing, taken in page batches
+    src = sqlite3.connect(db_path)
+    dst = sqlite3.connect(dest)
+    try:
+        src.backup(dst, pages=BACKUP_PAGES, sleep=0.01)
+    finally:
+        dst.close()
+        src.close()
+
+def put_db(copy: Path) -> dict:
+    conn = sqlite3.connect(copy)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    conn.close()
+    whole, chunks, size, new = hashlib.sha256(), [], 0, 0
+    for part in read_chunks(copy, page_size * DB_CHUNK_PAGES):
+        whole.update(part)
+        digest, n, stored = put_blob([part])
+        chunks.append(digest)
+        size += n
+        new += stored
+    return {"path": DB.name, "size": size, "sha256": whole.hexdigest(), "page_size": page_size,
+            "chunks": chunks, "new_chunks": new}
 
 def gather_db_summary(db_path: Path) -> str:
-    import sqlite3
     lines = []
     if not db_path.exists():
         return "DB not found; skipping DB summary."
@@ -54,62 +112,118 @@ def gather_db_summary(db_path: Path) -> str:
         lines.append(f"DB summary error: {e}")
     return "\n".join(lines)
 
-def build_manifest() -> str:
+def source_files() -> list:
+    include = list(BASE.glob("*.py")) + list(BASE.glob("*.sql"))
+    for folder in ["reports", "data/source"]:
+        p = BASE / folder
+        if p.exists():
+            include += [f for f in p.rglob("*") if f.is_file()]
+    return sorted(include)
+
+def create() -> str:
+    snap_id = time.strftime("%Y%m%d_%H%M%S")
+    (STORE / "manifests").mkdir(parents=True, exist_ok=True)
     lines = []
     lines.append("==== Leman Quest – Phase 1 Snapshot MANIFEST ====")
     lines.append(f"Created at     : {datetime.now().isoformat(timespec='seconds')}")
-    lines.append(f"Snapshot file  : {OUT}")
+    lines.append(f"Snapshot id    : {snap_id}  ({STORE})")
     lines.append(f"Python         : {sys.version.split()[0]}  ({sys.executable})")
     lines.append(f"Working folder : {BASE}")
     lines.append("")
-    # inventory
     lines.append("Included files:")
-    include = []
-    # top-level files
-    for name in ["phase1.db"]:
-        p = BASE / name
-        if p.exists(): include.append(p)
-    include += list(BASE.glob("*.py"))
-    include += list(BASE.glob("*.sql"))
-    for folder in ["reports", "data/source"]:
-        p = BASE / folder
-        if p.exists():
-            include += [f for f in p.rglob("*") if f.is_file()]
-    for f in sorted(include):
+    files, new_blobs, new_bytes = [], 0, 0
+    for f in source_files():
+        rel = f.relative_to(BASE).as_posix()
         try:
-            size = f.stat().st_size
-            digest = sha256_of(f)
-            lines.append(f"  {f.relative_to(BASE)} | {size} bytes | sha256={digest}")
+            digest, size, stored = put_blob(read_chunks(f))
         except Exception as e:
-            lines.append(f"  {f.relative_to(BASE)} | error: {e}")
+            lines.append(f"  {rel} | error: {e}")
+            continue
+        files.append({"path": rel, "size": size, "sha256": digest})
+        new_blobs += stored
+        new_bytes += size if stored else 0
+        lines.append(f"  {rel} | {size} bytes | sha256={digest}")
+
+    db = None
+    if DB.exists():
+        with tempfile.TemporaryDirectory(dir=STORE) as tmp:
+            copy = Path(tmp) / DB.name
+            backup_db(DB, copy)
+            db = put_db(copy)
+            summary = gather_db_summary(copy)
+        lines.append(f"  {db['path']} | {db['size']} bytes | sha256={db['sha256']} | "
+                     f"{len(db['chunks'])} chunks, {db['new_chunks']} new")
+    else:
+        summary = gather_db_summary(DB)
     lines.append("")
-    lines.append(gather_db_summary(DB))
+    lines.append(summary)
     lines.append("")
     lines.append("Notes:")
-    lines.append("- This snapshot is a portable backup of DB, scripts, reports, and sources.")
-    lines.append("- Restore by unzipping into a workspace; run scripts with the same Python if possible.")
-    return "\n".join(lines)
+    lines.append("- phase1.db is captured with the SQLite online backup API (consistent while loaders write).")
+    lines.append(f"- Restore with: python snapshot_phase1.py restore {snap_id} --to <folder>")
 
-manifest_text = build_manifest()
+    manifest = {"id": snap_id, "created_at": datetime.now().isoformat(timespec="seconds"),
+                "base": str(BASE), "python": sys.version.split()[0],
+                "files": files, "db": db, "manifest_txt": "\n".join(lines)}
+    out = STORE / "manifests" / f"{snap_id}.json"
+    out.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    print(f"Snapshot {snap_id}: {len(files)} files, {new_blobs} new file blobs ({new_bytes} bytes)"
+          + (f", db {len(db['chunks'])} chunks ({db['new_chunks']} new)" if db else ", no db"))
+    print(f"Manifest written to: {out}")
+    return snap_id
 
-with zipfile.ZipFile(OUT, "w", zipfile.ZIP_DEFLATED) as z:
-    # write MANIFEST.txt first
-    z.writestr("MANIFEST.txt", manifest_text)
-    # top-level
-    for name in ["phase1.db"]:
-        p = BASE / name
-        if p.exists():
-            z.write(p, arcname=p.name)
-    for p in BASE.glob("*.py"):
-        z.write(p, arcname=p.name)
-    for p in BASE.glob("*.sql"):
-        z.write(p, arcname=p.name)
-    # folders
-    for folder in ["reports", "data/source"]:
-        p = BASE / folder
-        if p.exists():
-            for f in p.rglob("*"):
-                if f.is_file():
-                    z.write(f, arcname=str(f.relative_to(BASE)))
+def load_manifest(snap_id: str) -> dict:
+    p = STORE / "manifests" / f"{snap_id}.json"
+    if not p.exists():
+        raise SystemExit(f"No snapshot {snap_id} in {STORE / 'manifests'}")
+    return json.loads(p.read_text(encoding="utf-8"))
+
+def read_blob(digest: str):
+    z = zlib.decompressobj()
+    for chunk in read_chunks(blob_path(digest)):
+        yield z.decompress(chunk)
+    yield z.flush()
+
+def write_entry(target: Path, digests: list, sha256: str):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256()
+    with open(target, "wb") as out:
+        for d in digests:
+            for part in read_blob(d):
+                h.update(part)
+                out.write(part)
+    if h.hexdigest() != sha256:
+        raise RuntimeError(f"Checksum mismatch restoring {target}")
+
+def restore(snap_id: str, to: Path):
+    m = load_manifest(snap_id)
+    if to.exists() and any(to.iterdir()):
+        raise SystemExit(f"Restore target {to} is not empty")
+    for f in m["files"]:
+        write_entry(to / f["path"], [f["sha256"]], f["sha256"])
+    if m["db"]:
+        write_entry(to / m["db"]["path"], m["db"]["chunks"], m["db"]["sha256"])
+    (to / "MANIFEST.txt").write_text(m["manifest_txt"], encoding="utf-8")
+    print(f"Snapshot {snap_id} restored to: {to} ({len(m['files'])} files{', phase1.db' if m['db'] else ''})")
+
+def list_snapshots():
+    for p in sorted((STORE / "manifests").glob("*.json")):
+        m = json.loads(p.read_text(encoding="utf-8"))
+        size = sum(f["size"] for f in m["files"]) + (m["db"]["size"] if m["db"] else 0)
+        print(f"  {m['id']}  {m['created_at']}  {len(m['files'])} files  {size} bytes")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Phase-1 snapshots (content-addressed store)")
+    ap.add_argument("command", nargs="?", default="create", choices=["create", "list", "restore"])
+    ap.add_argument("snapshot", nargs="?", help="snapshot id (restore)")
+    ap.add_argument("--to", default=None, help="restore folder (default: next to the store, never the live phase1)")
+    args = ap.parse_args()
 
-print(f"Snapshot written to: {OUT}")
+    if args.command == "create":
+        create()
+    elif args.command == "list":
+        list_snapshots()
+    else:
+        if not args.snapshot:
+            ap.error("restore needs a snapshot id")
+        restore(args.snapshot, Path(args.to) if args.to else BASE.parent / f"phase1_restore_{args.snapshot}")
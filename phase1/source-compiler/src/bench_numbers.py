@@ -0,0 +1,74 @@
+# Benchmark: numeric_parse.parse_numeric vs the previous regex + per-element apply parse_numbers.
+# Synthetic columns in the shapes we receive (plain, EU decimals, Swiss apostrophes, accounting negatives),
+# plus the real numeric columns of Holdings/DailyValues when the source files are present.
+#   python bench_numbers.py --rows 1000000
+
+import argparse, time
+import numpy as np
+import pandas as pd
+import numeric_parse
+from source_compiler import BASE
+
+def legacy_parse_numbers(s: pd.Series) -> pd.Series:
+    # parse_numbers as it was before numeric_parse (kept here as the baseline)
+    x = s.astype(str).str.replace("\u00A0","", regex=False).str.strip()
+    x = x.str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+    x = x.str.replace(r"[^\d,\.\-]", "", regex=True)
+    def _norm(v):
+        if v.count(",")>0 and v.count(".")>0:
+            return v.replace(",","")
+        elif v.count(",")>0 and v.count(".")==0:
+            return v.replace(",",".")
+        return v
+    x = x.apply(_norm)
+    return pd.to_numeric(x, errors="coerce")
+
+def synthetic(rows: int, seed: int = 7) -> dict:
+    rng = np.random.default_rng(seed)
+    v = rng.normal(0, 1e6, rows).round(2)
+    a = np.abs(v)
+    plain = pd.Series(v.astype(str))
+    eu = pd.Series([f"{x:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".") for x in v])
+    swiss = pd.Series([f"{x:,.2f}".replace(",", "'") for x in v])
+    acct = pd.Series([f"({x:,.2f})" if x < 5e5 else f"USD {x:,.2f}" for x in a])
+    return {"plain": plain, "eu_1.234,56": eu, "swiss_1'234.56": swiss, "accounting_(1,234.56)": acct}
+
+def real_columns() -> dict:
+    out = {}
+    for name, rel, cols in [("Holdings", "data/source/portfolio/Holdings.csv", ["Quantity / amount", "Price"]),
+                            ("DailyValues", "data/source/performance/DailyValues.csv", ["Value end", "Inflow", "Outflow"])]:
+        p = BASE / rel
+        if not p.exists():
+            continue
+        df = pd.read_csv(p, sep=";", encoding="cp1252", dtype=str)
+        for c in cols:
+            if c in df.columns:
+                out[f"{name}.{c}"] = df[c]
+    return out
+
+def timed(fn, s: pd.Series, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        res = fn(s)
+        best = min(best, time.perf_counter() - t)
+    return best, res
+
+def main(rows: int, repeat: int):
+    cols = synthetic(rows)
+    cols.update(real_columns())
+    print(f"{'column':28s} {'rows':>9s} {'legacy rows/s':>14s} {'new rows/s':>14s} {'speedup':>8s} {'fail%':>6s} {'diff':>6s}")
+    for name, s in cols.items():
+        t_old, old = timed(legacy_parse_numbers, s, repeat)
+        t_new, (new, failed, n) = timed(numeric_parse.parse_numeric, s, repeat)
+        # rows where the two parsers disagree (the new one fixes EU/Swiss/trailing-minus cases)
+        diff = int((~np.isclose(old.to_numpy(dtype=float), new.to_numpy(), equal_nan=True)).sum())
+        print(f"{name:28s} {len(s):9d} {len(s)/t_old:14,.0f} {len(s)/t_new:14,.0f} {t_old/t_new:7.1f}x "
+              f"{(failed / n if n else 0):6.2%} {diff:6d}")
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=200000, help="rows per synthetic column")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,116 @@
+# Unique-value date parsing for the Source Compiler.
+# Date columns repeat a few hundred distinct strings over many rows: the column is factorized, only the
+# distinct strings are parsed (Excel serials, exact formats, then the dateutil fallback) and the result is
+# broadcast back with an index take. Parsed strings are memoized in a bounded LRU shared by every column,
+# file and calendar load of a run (see run_compiler), so a date already seen in Holdings costs nothing in
+# CashAgenda or the calendars.
+
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+EXCEL_SERIAL = "excel_serial"
+EXTRA_FORMATS = ["%Y-%m-%d %H:%M:%S", "%d.%m.%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S", "%Y.%m.%d %H.%M.%S"]
+
+class DateCache:
+    # string -> datetime.date (or NaT), per parse context (format priority, dayfirst, learned hint)
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._d = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self, maxsize: Optional[int] = None):
+        if maxsize is not None:
+            self.maxsize = maxsize
+        self._d.clear()
+        self.hits = self.misses = 0
+
+    def lookup(self, ctx: tuple, keys) -> Tuple[list, list]:
+        found, missing = [], []
+        d = self._d
+        for i, k in enumerate(keys):
+            v = d.get((ctx, k), d)
+            if v is d:
+                missing.append(i)
+            else:
+                d.move_to_end((ctx, k))
+                found.append((i, v))
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found, missing
+
+    def store(self, ctx: tuple, keys, values):
+        d = self._d
+        for k, v in zip(keys, values):
+            d[(ctx, k)] = v
+        while len(d) > self.maxsize:
+            d.popitem(last=False)
+
+    def __len__(self):
+        return len(self._d)
+
+CACHE = DateCache()
+
+def parse_strings(s0: pd.Series, fmts: List[str], dayfirst: bool, hint: str = None) -> pd.Series:
+    # s0: stripped strings. Returns datetime64 values (NaT where nothing matched).
+    vals = pd.Series(pd.NaT, index=s0.index, dtype="datetime64[ns]")
+
+    # Learned format (format profile) first: a delivery of unchanged shape parses in one pass
+    if hint and hint != EXCEL_SERIAL:
+        vals = pd.to_datetime(s0, format=hint, errors="coerce")
+        if vals.notna().all():
+            return vals
+
+    # Excel serials
+    serial = pd.to_numeric(s0, errors="coerce")
+    mask = serial.ge(25569) & serial.lt(80000)
+    vals.loc[mask] = pd.to_datetime("1899-12-30") + pd.to_timedelta(serial[mask], unit="D")
+
+    remain = vals.isna()
+    if not remain.any():
+        return vals
+
+    # Exact formats (dates + datetimes commonly seen)
+    for f in list(fmts) + EXTRA_FORMATS:
+        hit = pd.to_datetime(s0[remain], format=f, errors="coerce")
+        vals.loc[remain] = vals.loc[remain].fillna(hit)
+        remain = vals.isna()
+        if not remain.any():
+            break
+
+    # ISO 8601 (with timezone)
+    if remain.any():
+        vals.loc[remain] = pd.to_datetime(s0[remain], errors="coerce", utc=False, dayfirst=dayfirst)
+    return vals
+
+def parse_dates_unique(s: pd.Series, fmts: List[str], dayfirst: bool, hint: str = None,
+                       cache: Optional[DateCache] = CACHE) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        # already typed (e.g. native Excel date cells): no string round trip
+        return s.dt.tz_localize(None).dt.date if getattr(s.dt, "tz", None) is not None else s.dt.date
+
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    keys = pd.Index(uniques).astype(str).str.strip()
+    out_u = np.empty(len(keys) + 1, dtype=object)
+    out_u[-1] = pd.NaT  # slot for code -1 (missing input)
+
+    ctx = (tuple(fmts), bool(dayfirst), hint)
+    use_cache = cache is not None and len(keys) <= cache.maxsize
+    if use_cache:
+        found, missing = cache.lookup(ctx, keys)
+        for i, v in found:
+            out_u[i] = v
+    else:
+        missing = list(range(len(keys)))
+
+    if missing:
+        todo = pd.Series(keys[missing], index=missing)
+        parsed = parse_strings(todo, fmts, dayfirst, hint).dt.date.to_numpy(dtype=object)
+        out_u[missing] = parsed
+        if use_cache:
+            cache.store(ctx, todo.tolist(), parsed)
+
+    # broadcast back: code -1 takes the trailing NaT slot
+    return pd.Series(out_u.take(codes), index=s.index)
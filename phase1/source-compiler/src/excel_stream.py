@@ -0,0 +1,167 @@
+# Streaming xlsx reader for the Source Compiler (openpyxl read-only mode): rows are pulled one at a time from
+# the sheet XML and handed on in DataFrames of `chunksize` rows, so a 300k-row workbook never exists as one
+# frame or as a list of every row. Same result layout as read_excel()/pd.read_excel:
+#   - header_row: int or list (multi-row header); a multi-row header is forward-filled across merged cells and
+#     flattened with ' ' like read_excel's MultiIndex join; blank headers become 'Unnamed: i', repeats 'X.1'
+#   - skiprows: int (first n rows) or list of 0-based sheet rows, dropped before the header is located
+#   - sheet: index, name, list of them, or '*' (every sheet). Several sheets are read one after another, or in
+#     `sheet_workers` processes (openpyxl is pure Python); their rows carry the sheet name in SHEET_COLUMN.
+# Cells keep their Excel types: date cells arrive as datetime64 columns (parse_dates skips the string round
+# trip), numbers as floats/ints. Index = 0-based sheet row - header_row - 1, so the quarantine line number
+# (index + header_row + 2) is the Excel row number. Empty rows are dropped (their row numbers are skipped).
+
+import queue, traceback
+from pathlib import Path
+from typing import Iterator, List
+import pandas as pd
+
+SHEET_COLUMN = "_sheet"
+
+def _openpyxl():
+    try:
+        import openpyxl
+    except Exception:
+        raise RuntimeError("Streaming xlsx support requires 'pip install openpyxl'.")
+    return openpyxl
+
+def open_workbook(path: Path):
+    return _openpyxl().load_workbook(path, read_only=True, data_only=True, keep_links=False)
+
+def sheet_names(path: Path, sheet=0) -> List[str]:
+    wb = open_workbook(path)
+    try:
+        names = wb.sheetnames
+    finally:
+        wb.close()
+    if sheet in (None, "*"):
+        return names
+    out = []
+    for s in (sheet if isinstance(sheet, list) else [sheet]):
+        if isinstance(s, int):
+            out.append(names[s])
+        elif s in names:
+            out.append(s)
+        else:
+            raise RuntimeError(f"{path}: no sheet {s!r} (sheets: {names})")
+    return out
+
+def _header_rows(header_row) -> List[int]:
+    return sorted(header_row) if isinstance(header_row, (list, tuple)) else [int(header_row or 0)]
+
+def flatten_header(rows: List[tuple]) -> List[str]:
+    # width = last non-blank header cell (the sheet's used range may run further right)
+    width = max((i + 1 for r in rows for i, v in enumerate(r) if v is not None and str(v).strip() != ""), default=0)
+    rows = [list(r[:width]) + [None] * (width - len(r)) for r in rows]
+    # upper levels of a multi-row header: a merged cell only holds its value in the first column
+    for r in rows[:-1]:
+        for i in range(1, width):
+            if r[i] is None:
+                r[i] = r[i - 1]
+    names, seen = [], {}
+    for i in range(width):
+        parts = [str(r[i]).strip() for r in rows if r[i] is not None and str(r[i]).strip() != ""]
+        name = " ".join(parts) or f"Unnamed: {i}"
+        n = seen.get(name, 0)
+        seen[name] = n + 1
+        names.append(name if n == 0 else f"{name}.{n}")
+    return names
+
+def _frame(rows: list, index: list, cols: List[str], sheet: str = None) -> pd.DataFrame:
+    # DataFrame construction infers per column: datetime cells -> datetime64, numbers -> float/int
+    df = pd.DataFrame.from_records(rows, columns=cols, index=pd.Index(index, dtype="int64"), coerce_float=False)
+    return df if sheet is None else df.assign(**{SHEET_COLUMN: sheet})
+
+def _blank(r: tuple) -> bool:
+    return all(v is None or (isinstance(v, str) and not v.strip()) for v in r)
+
+def iter_sheet(path: Path, sheet, header_row=0, skiprows=None, chunksize: int = 200000,
+               tag: bool = False) -> Iterator[pd.DataFrame]:
+    wanted = _header_rows(header_row)
+    skip = set(range(skiprows)) if isinstance(skiprows, int) else set(skiprows or [])
+    wb = open_workbook(path)
+    try:
+        ws = wb[sheet] if isinstance(sheet, str) else wb.worksheets[sheet]
+        name = ws.title if tag else None
+        rows = ws.iter_rows(values_only=True)
+        header, kept, last_hdr = [], -1, None
+        for pos, r in enumerate(rows):  # locate the header among the rows that are not skipped
+            if pos in skip:
+                continue
+            kept += 1
+            if kept in wanted:
+                header.append(r)
+            if kept == wanted[-1]:
+                last_hdr = pos
+                break
+        if last_hdr is None:
+            return  # sheet shorter than its header
+        cols = flatten_header(header)
+        width = len(cols)
+        buf, idx, emitted = [], [], False
+        for pos, r in enumerate(rows, start=last_hdr + 1):
+            if pos in skip or _blank(r):
+                continue
+            if len(r) != width:
+                r = tuple(r[:width]) + (None,) * (width - len(r))
+            buf.append(r)
+            idx.append(pos - wanted[-1] - 1)  # + header_row + 2 = Excel row number, skipped rows included
+            if len(buf) >= chunksize:
+                yield _frame(buf, idx, cols, name)
+                buf, idx, emitted = [], [], True
+        if buf or not emitted:
+            yield _frame(buf, idx, cols, name)  # an empty sheet still yields its (empty) frame with the header
+    finally:
+        wb.close()
+
+def _sheet_worker(path, sheet, header_row, skiprows, chunksize, results):
+    try:
+        for df in iter_sheet(path, sheet, header_row, skiprows, chunksize, tag=True):
+            results.put(("part", sheet, df))
+        results.put(("done", sheet, None))
+    except BaseException:
+        results.put(("error", sheet, traceback.format_exc()))
+
+def iter_sheets(path: Path, sheet=0, header_row=0, skiprows=None, chunksize: int = 200000,
+                workers: int = 1) -> Iterator[pd.DataFrame]:
+    """Chunks of every requested sheet; with workers > 1 and several sheets, one process per sheet (up to
+    `workers` at a time), chunks yielded as they arrive over a bounded queue."""
+    import multiprocessing as mp
+    names = sheet_names(path, sheet)
+    tag = len(names) > 1 or sheet in (None, "*") or isinstance(sheet, list)
+    if workers <= 1 or len(names) <= 1 or mp.current_process().daemon:
+        for name in names:
+            yield from iter_sheet(path, name, header_row, skiprows, chunksize, tag)
+        return
+
+    ctx = mp.get_context()
+    results = ctx.Queue(maxsize=2 * workers)  # bounds the chunks in flight
+    todo, running, errors = list(names), {}, []
+    try:
+        while todo or running:
+            while todo and len(running) < workers:
+                name = todo.pop(0)
+                p = ctx.Process(target=_sheet_worker, args=(path, name, header_row, skiprows, chunksize, results),
+                                daemon=True)
+                p.start()
+                running[name] = p
+            try:
+                kind, name, df = results.get(timeout=1.0)
+            except queue.Empty:
+                dead = [n for n, p in running.items() if not p.is_alive() and p.exitcode != 0]
+                for n in dead:
+                    errors.append(f"{n}: worker exited with code {running.pop(n).exitcode}")
+                if errors:
+                    break
+                continue
+            if kind == "part":
+                yield df
+            else:
+                running.pop(name).join()
+                if kind == "error":
+                    errors.append(f"{name}:\n{df}")
+                    break
+    finally:
+        for p in running.values():
+            p.terminate()
+    if errors:
+        raise RuntimeError(f"Reading {path} failed:\n" + "\n".join(errors))
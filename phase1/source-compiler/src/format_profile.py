@@ -0,0 +1,118 @@
+# Learned per-source format profiles: the encoding/delimiter/date/decimal conventions that won last time,
+# keyed by a cheap fingerprint of the file header and persisted next to the config.
+# On a later run the profile is tried first; the full trial-and-error search only runs when it fails validation.
+
+import hashlib, json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import pandas as pd
+import numeric_parse
+from date_parse import EXCEL_SERIAL
+
+SAMPLE_ROWS = 500
+
+def profile_path(config_path: Path) -> Path:
+    # source_generic.yaml -> source_generic.profiles.json (same folder)
+    return config_path.with_name(config_path.stem + ".profiles.json")
+
+def load_profiles(config_path: Path) -> Dict[str, dict]:
+    p = profile_path(config_path)
+    if not p.exists():
+        return {}
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return {}  # corrupt cache -> relearn
+
+def save_profiles(config_path: Path, profiles: Dict[str, dict]):
+    p = profile_path(config_path)
+    tmp = p.with_suffix(".tmp")
+    tmp.write_text(json.dumps(profiles, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(p)
+
+def fingerprint(path: Path, nbytes: int = 4096) -> str:
+    # Header line + file type: unchanged for a daily delivery of the same shape, whatever the row content
+    with open(path, "rb") as f:
+        head = f.read(nbytes)
+    first = head.split(b"\n", 1)[0].rstrip(b"\r")
+    return hashlib.sha1(path.suffix.lower().encode() + b"|" + first).hexdigest()
+
+def matches(profile: Optional[dict], path: Path) -> bool:
+    return bool(profile) and profile.get("fingerprint") == fingerprint(path)
+
+def infer_delimiter(path: Path, encoding: str, ncols: int, delims: List[str]) -> Optional[str]:
+    # The sniffing reader does not report its delimiter: recover it from the header line
+    with open(path, "r", encoding=encoding, errors="replace") as f:
+        header = f.readline()
+    if ncols <= 1:
+        return next((d for d in delims if d not in header), delims[0]) if delims else None
+    for d in delims:
+        if header.count(d) == ncols - 1:
+            return d
+    return None
+
+def record_read(profile: Optional[dict], path: Path, encoding: str, delimiter: Optional[str], df: pd.DataFrame):
+    if profile is None or delimiter is None:
+        return
+    new = {
+        "fingerprint": fingerprint(path),
+        "encoding": encoding,
+        "delimiter": delimiter,
+        "columns": [str(c) for c in df.columns],
+    }
+    if any(profile.get(k) != v for k, v in new.items()):
+        profile.clear()  # new shape: date/number conventions must be relearned as well
+        profile.update(new)
+        touch(profile)
+
+def touch(profile: dict):
+    profile["updated"] = datetime.now().isoformat(timespec="seconds")
+    profile["_dirty"] = True
+
+def _sample(s: pd.Series, n: int = SAMPLE_ROWS) -> pd.Series:
+    s0 = s.dropna().astype(str).str.strip()
+    s0 = s0[s0.ne("")]
+    return s0.drop_duplicates().head(n)
+
+def _date_hits(sample: pd.Series, fmt: str) -> int:
+    if fmt == EXCEL_SERIAL:
+        serial = pd.to_numeric(sample, errors="coerce")
+        return int((serial.ge(25569) & serial.lt(80000)).sum())
+    return int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+
+def date_format_for(profile: Optional[dict], col: str, s: pd.Series, fmts: List[str]) -> Optional[str]:
+    # Validate the stored format on a sample of distinct values; relearn it if it no longer parses them all
+    if profile is None:
+        return None
+    sample = _sample(s)
+    if sample.empty:
+        return None
+    known = profile.setdefault("dates", {}).get(col)
+    if known and _date_hits(sample, known) == len(sample):
+        return known
+    best, best_hits = None, 0
+    for f in [EXCEL_SERIAL] + list(fmts):
+        hits = _date_hits(sample, f)
+        if hits > best_hits:
+            best, best_hits = f, hits
+        if hits == len(sample):
+            break
+    if best and best != known:
+        profile["dates"][col] = best
+        touch(profile)
+    return best
+
+def number_convention_for(profile: Optional[dict], col: str, s: pd.Series) -> Optional[Dict[str, str]]:
+    if profile is None:
+        return None
+    known = profile.setdefault("numbers", {}).get(col)
+    sample = numeric_parse.sample_values(s)
+    # Without any ',' in the sample there is no evidence against the stored convention
+    if known and not sample.str.contains(",", regex=False).any():
+        return known
+    conv = numeric_parse.infer_convention(sample, prepared=True)
+    if known != conv:
+        profile["numbers"][col] = conv
+        touch(profile)
+    return conv
@@ -0,0 +1,191 @@
+# Compiled ingestion plan of the Source Compiler: source_generic.yaml is validated and turned into an
+# immutable plan once per run (cached by config hash), before any file is read. Per file it holds
+#   - lookup: normalized header -> (canonical field, alias rank), restricted to the fields the file uses
+#     (map / required / required_any, value_date+evaluation_date, calendar extras)
+#   - columns: typed column program (canonical, parser, SRC target column or None = checks only)
+#   - required / required_any with the parser of each field (dates: parsed value present; text: non-empty)
+#   - dedupe: row fingerprint mode for the target table (drop / flag / off, see phase1/row_fingerprint.py)
+# transform_frame() executes it; nothing in the config is looked up per file or per chunk.
+#
+# Alias conflicts (one header listed under several canonicals, e.g. 'date' under value_date and event_date)
+# are resolved per file, deterministically: a field the file maps beats one it only requires, then the
+# field listing the header earlier in its aliases, then config order. Several headers of one file aliasing
+# the same field: the earlier alias wins (e.g. 'purchase date' over 'booking date'), whatever the column order.
+# Repeated keys in header_aliases add up (see load_config); any other repeated key is a config error.
+#   python source_compiler.py --check     (validate + print the plan and its conflicts, reads no file)
+
+import hashlib, json
+from collections import namedtuple
+from typing import Dict, List
+import row_fingerprint as rf  # phase1/ (on sys.path via source_compiler)
+
+DATE_FIELDS = ("value_date", "evaluation_date", "trade_date", "settle_date", "event_date")
+NUMBER_FIELDS = ("qty_raw", "price_raw", "value_end", "inflow", "outflow", "amount_raw")
+CALENDAR_INTS = ("day", "month", "week", "quarter", "year")
+CALENDAR_BOOLS = ("is_month_end", "is_year_end")
+FILE_TYPES = ("csv", "xlsx", "xlsm", "xls", "parquet", "pdf")
+DEFAULT_DATE_FORMATS = ["%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%m/%d/%Y", "%Y%m%d"]
+
+Plan = namedtuple("Plan", "key files conflicts")  # files: {name: FilePlan}; conflicts: [(file, header, chosen, others)]
+FilePlan = namedtuple("FilePlan", "name item target_table calendar lookup columns required required_any "
+                                  "outputs fmts dayfirst min_date_rate dedupe")
+Column = namedtuple("Column", "canon parser target")
+
+_PLANS: Dict[str, Plan] = {}
+
+def config_key(cfg: dict) -> str:
+    return hashlib.sha256(json.dumps(cfg, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def parser_for(canon: str) -> str:
+    if canon in DATE_FIELDS:
+        return "date"
+    if canon in NUMBER_FIELDS:
+        return "number"
+    if canon in CALENDAR_INTS:
+        return "int"
+    if canon in CALENDAR_BOOLS:
+        return "bool"
+    return "text"
+
+def norm(a) -> str:
+    return str(a).strip().lower()
+
+def merge_duplicate(key, old, new, where: str = ""):
+    # repeated mapping key while loading the config: lists add up (header_aliases "ADDITIVE" blocks)
+    if isinstance(old, list) and isinstance(new, list):
+        return old + [x for x in new if x not in old]
+    raise RuntimeError(f"Config: key {key!r} given twice{where}")
+
+def dedupe_mode(v) -> str:
+    # YAML reads a bare off/on as booleans
+    return {False: "off", True: "drop"}.get(v, v) if isinstance(v, bool) else str(v)
+
+def _wanted(item: dict) -> List[str]:
+    # fields the file uses, in a stable order: map, required, required_any, then the implied ones
+    out = list(item.get("map", {})) + list(item.get("required", []))
+    out += [c for g in item.get("required_any", []) for c in g]
+    if any(c in ("value_date", "evaluation_date") for c in out):
+        out += ["value_date", "evaluation_date"]  # value_date falls back to evaluation_date
+    if item.get("calendar", False):
+        out += ["value_date"] + list(CALENDAR_INTS) + list(CALENDAR_BOOLS)
+    seen = set()
+    return [c for c in out if not (c in seen or seen.add(c))]
+
+def _lookup(item: dict, aliases: Dict[str, List[str]], conflicts: list) -> Dict[str, tuple]:
+    wanted = _wanted(item)
+    mapped = set(item.get("map", {}))
+    order = {c: i for i, c in enumerate(aliases)}
+    candidates = {}  # header -> [(canonical, rank in its alias list)]
+    for canon in wanted:
+        for rank, a in enumerate([canon] + list(aliases.get(canon, []))):
+            cands = candidates.setdefault(norm(a), [])
+            if all(c != canon for c, _ in cands):  # a field listing its own name keeps rank 0
+                cands.append((canon, rank))
+    lookup = {}
+    for header, cands in candidates.items():
+        cands.sort(key=lambda cr: (cr[0] not in mapped, cr[1], order.get(cr[0], len(order))))
+        lookup[header] = cands[0]
+        if len(cands) > 1:
+            conflicts.append((item["name"], header, cands[0][0], [c for c, _ in cands[1:]]))
+    return lookup
+
+def _validate(cfg: dict) -> List[str]:
+    errors = []
+    aliases = cfg.get("header_aliases", {})
+    if not isinstance(aliases, dict) or not all(isinstance(v, list) for v in aliases.values()):
+        errors.append("header_aliases must map each canonical field to a list of headers")
+        aliases = {}
+    dd = cfg.get("dedupe", {}) or {}
+    if dedupe_mode(dd.get("mode", "drop")) not in rf.MODES:
+        errors.append(f"dedupe.mode {dd.get('mode')!r} not one of {rf.MODES}")
+    files = cfg.get("files")
+    if not isinstance(files, list) or not files:
+        return errors + ["files: no source files configured"]
+    names = set()
+    for i, item in enumerate(files):
+        name = item.get("name") if isinstance(item, dict) else None
+        where = f"files[{i}] ({name or 'no name'})"
+        if name is None:
+            errors.append(f"{where}: name missing")
+            continue
+        if name in names:
+            errors.append(f"{where}: name used twice")
+        names.add(name)
+        for key in ("path", "target_table"):
+            if not item.get(key):
+                errors.append(f"{where}: {key} missing")
+        if dedupe_mode(item.get("dedupe", "drop")) not in rf.MODES:
+            errors.append(f"{where}: dedupe {item.get('dedupe')!r} not one of {rf.MODES}")
+        ftype = (item.get("file_type") or "csv").lower()
+        if ftype not in FILE_TYPES:
+            errors.append(f"{where}: file_type {ftype!r} not supported ({', '.join(FILE_TYPES)})")
+        if not isinstance(item.get("map", {}), dict):
+            errors.append(f"{where}: map must be {{canonical: target column}}")
+            continue
+        groups = item.get("required_any", [])
+        if not isinstance(item.get("required", []), list) or not all(isinstance(g, list) for g in groups):
+            errors.append(f"{where}: required is a list, required_any a list of lists")
+            continue
+        known = set(aliases) | (set(CALENDAR_INTS + CALENDAR_BOOLS + ("date",)) if item.get("calendar") else set())
+        used = list(item.get("map", {})) + list(item.get("required", [])) + [c for g in groups for c in g]
+        unknown = sorted({c for c in used if c not in known})
+        if unknown:
+            errors.append(f"{where}: field(s) {unknown} not in header_aliases")
+        targets = list(item.get("map", {}).values())
+        if len(set(targets)) != len(targets):
+            errors.append(f"{where}: map writes a target column twice")
+    return errors
+
+def compile_plan(cfg: dict) -> Plan:
+    """Validated, immutable plan for `cfg` (cached by config hash). Raises RuntimeError listing every
+    config error."""
+    key = config_key(cfg)
+    if key in _PLANS:
+        return _PLANS[key]
+    errors = _validate(cfg)
+    if errors:
+        raise RuntimeError("Source Compiler config errors:\n  - " + "\n  - ".join(errors))
+
+    aliases = cfg.get("header_aliases", {})
+    fmts = tuple(cfg.get("date_format_priority", DEFAULT_DATE_FORMATS))
+    dayfirst = bool(cfg.get("dayfirst_default", True))
+    min_date_rate = float(cfg.get("dq_thresholds", {}).get("min_date_parse_rate", 0.9))
+    dd = cfg.get("dedupe", {}) or {}
+    dd_tables = set(dd.get("tables", rf.DEFAULT_TABLES))
+    files, conflicts = {}, []
+    for item in cfg["files"]:
+        colmap = item.get("map", {})
+        columns = tuple(Column(c, parser_for(c), colmap.get(c)) for c in _wanted(item))
+        parsers = {c.canon: c.parser for c in columns}
+        files[item["name"]] = FilePlan(
+            name=item["name"], item=item, target_table=item["target_table"],
+            calendar=bool(item.get("calendar", False)),
+            lookup=_lookup(item, aliases, conflicts), columns=columns,
+            required=tuple((c, parsers[c]) for c in item.get("required", [])),
+            required_any=tuple(tuple((c, parsers[c]) for c in g) for g in item.get("required_any", [])),
+            outputs=tuple(colmap.items()), fmts=list(fmts), dayfirst=dayfirst, min_date_rate=min_date_rate,
+            dedupe=dedupe_mode(item.get("dedupe", dd.get("mode", "drop"))) if item["target_table"] in dd_tables else "off")
+    plan = Plan(key=key, files=files, conflicts=tuple(conflicts))
+    _PLANS[key] = plan
+    return plan
+
+def resolve_columns(fplan: FilePlan, headers) -> Dict[str, str]:
+    """canonical -> normalized header of this frame; the best-ranked alias wins when several headers match."""
+    best = {}
+    for h in headers:
+        hit = fplan.lookup.get(h)
+        if hit is not None and (hit[0] not in best or hit[1] < best[hit[0]][1]):
+            best[hit[0]] = (h, hit[1])
+    return {canon: h for canon, (h, _) in best.items()}
+
+def describe(plan: Plan) -> str:
+    lines = [f"Plan {plan.key}: {len(plan.files)} file(s)"]
+    for fp_ in plan.files.values():
+        typed = ", ".join(f"{c.canon}:{c.parser}" + (f"->{c.target}" if c.target and c.target != c.canon else "")
+                          for c in fp_.columns)
+        lines.append(f"  {fp_.name} -> {fp_.target_table}{' (calendar)' if fp_.calendar else ''}"
+                     f" [dedupe {fp_.dedupe}]: {typed}")
+    if plan.conflicts:
+        lines.append("Alias conflicts (resolved per file):")
+        lines += [f"  {f}: '{h}' -> {chosen} (not {', '.join(others)})" for f, h, chosen, others in plan.conflicts]
+    return "\n".join(lines)
@@ -0,0 +1,117 @@
+# Vectorized, locale-aware numeric parsing for the Source Compiler.
+# The decimal/thousands convention is decided once per column from a sample of distinct values,
+# then the whole column is converted with string-array operations (Arrow compute kernels when pyarrow is installed).
+#
+# Handled: parentheses negatives "(1,234.50)", leading/trailing minus "1234-", currency symbols and codes
+# ("$", "€", "CHF"), apostrophe / NBSP / thin-space group separators ("1'234.50", "1 234,50").
+# Values whose digit grouping is inconsistent with the column convention (e.g. identifiers like
+# "26.032172.000.0") become NaN instead of a wrong number, and count as parse failures.
+
+import re
+from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+
+# Optional Arrow-backed strings: str.* ops run as pyarrow compute kernels instead of per-element Python
+try:
+    import pyarrow  # noqa: F401
+    STR_DTYPE = "string[pyarrow]"
+except Exception:
+    STR_DTYPE = "string"
+
+SAMPLE_ROWS = 500
+_GROUP_SEPS = "[\\s\u00A0\u202F\u2009\u2007'\u2019\u02BC`]"  # removed outright: never a decimal mark
+_KEEP = r"[^\d.,\-]"                                         # currency symbols/codes, parens, '+'
+
+def _prepare(s: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    x = s.astype(STR_DTYPE).str.strip()
+    x = x.str.replace(_GROUP_SEPS, "", regex=True)
+    paren = x.str.startswith("(") & x.str.endswith(")")
+    x = x.str.replace(_KEEP, "", regex=True)
+    neg = paren | x.str.startswith("-") | x.str.endswith("-")
+    x = x.str.replace(r"^-+|-+$", "", regex=True)
+    return x, neg.fillna(False).astype(bool)
+
+def _sample(x: pd.Series, n: int = SAMPLE_ROWS) -> pd.Series:
+    x = x.dropna()
+    return x[x.ne("")].drop_duplicates().head(n).astype(str)
+
+def sample_values(s: pd.Series, n: int = SAMPLE_ROWS) -> pd.Series:
+    # distinct raw values from the head of the column, cleaned; only the sample is prepared
+    head = s.dropna().head(n * 40).astype(str)
+    return _sample(_prepare(_sample(head, n))[0], n)
+
+def _grouped(values: pd.Series, sep: str) -> bool:
+    return bool(values.str.fullmatch(rf"\d{{1,3}}(?:{re.escape(sep)}\d{{3}})+").all())
+
+def infer_convention(s: pd.Series, prepared: bool = False) -> Dict[str, str]:
+    # Decide which of ',' / '.' is the decimal mark (and which one groups thousands) from a sample
+    sample = _sample(s) if prepared else sample_values(s)
+    has_c = sample.str.contains(",", regex=False)
+    has_d = sample.str.contains(".", regex=False)
+    both = sample[has_c & has_d]
+    if not both.empty:
+        # the right-most separator is the decimal mark
+        comma_last = (both.str.rfind(",") > both.str.rfind(".")).mean() > 0.5
+        return {"decimal": ",", "thousands": "."} if comma_last else {"decimal": ".", "thousands": ","}
+    commas = sample[has_c]
+    if not commas.empty:
+        # comma only: a decimal mark unless it repeats within a value
+        if commas.str.count(",").gt(1).any():
+            return {"decimal": ".", "thousands": ","}
+        return {"decimal": ",", "thousands": ""}
+    multi_dot = sample[sample.str.count(r"\.").gt(1)]
+    if not multi_dot.empty and _grouped(multi_dot, "."):
+        return {"decimal": ",", "thousands": "."}
+    return {"decimal": ".", "thousands": ","}
+
+def _pattern(decimal: str, thousands: str) -> str:
+    d = re.escape(decimal)
+    int_part = rf"(?:\d{{1,3}}(?:{re.escape(thousands)}\d{{3}})+|\d+)" if thousands else r"\d+"
+    # grouped: Arrow's fullmatch anchors as ^...$ without wrapping alternations
+    return rf"(?:{int_part}(?:{d}\d*)?|{d}\d+)"
+
+def _to_float(y: pd.Series) -> np.ndarray:
+    # y holds validated "digits[.digits]" strings or NA
+    if STR_DTYPE == "string[pyarrow]":
+        try:
+            import pyarrow as pa, pyarrow.compute as pc
+            return pc.cast(pa.array(y.astype(STR_DTYPE).array), pa.float64()).to_numpy(zero_copy_only=False)
+        except Exception:
+            pass
+    return pd.to_numeric(y, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+def parse_numeric(s: pd.Series, decimal: str = None, thousands: str = None) -> Tuple[pd.Series, int, int]:
+    """Return (float64 series, failed, non_empty): failure rate = failed / non_empty."""
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        return pd.to_numeric(s, errors="coerce").astype("float64"), 0, int(s.notna().sum())
+
+    if decimal is None:
+        conv = infer_convention(s)
+        decimal, thousands = conv["decimal"], conv["thousands"]
+
+    x = s.astype(STR_DTYPE).str.strip()
+    # Plain numerals need no cleaning; a '.' is only a plain decimal point when it is the decimal mark
+    plain_re = r"-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?" if decimal == "." else r"-?\d+"
+    plain = x.str.fullmatch(plain_re).fillna(False).to_numpy(dtype=bool)
+    vals = np.full(len(s), np.nan)
+    vals[plain] = _to_float(x[plain])
+
+    rest = x.notna().to_numpy(dtype=bool) & ~plain
+    if rest.any():
+        xr, neg = _prepare(x[rest])
+        valid = xr.str.fullmatch(_pattern(decimal, thousands)).fillna(False).astype(bool)
+        yr = xr.where(valid)
+        if thousands:
+            yr = yr.str.replace(thousands, "", regex=False)
+        if decimal != ".":
+            yr = yr.str.replace(decimal, ".", regex=False)
+        vr = _to_float(yr)
+        vals[rest] = np.where(neg.to_numpy(), -vr, vr)
+    out = pd.Series(vals, index=s.index)
+
+    raw = x.str.lower()
+    nonempty = raw.notna() & ~raw.isin(["", "nan", "none", "null", "n/a", "-"])
+    n = int(nonempty.sum())
+    failed = int((nonempty & out.isna()).sum())
+    return out, failed, n
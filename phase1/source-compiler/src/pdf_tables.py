@@ -0,0 +1,156 @@
+# PDF tables for the Source Compiler (pdfplumber): page-parallel extraction with a per-page result cache.
+#   - pages: "1,3-5", a list of 1-based pages, or "all"/"*"
+#   - flavor: 'lattice' (ruling lines) or 'stream' (text alignment) -> pdfplumber table settings; `table_settings`
+#     overrides keys for every page, `page_settings` {"12-14": {...}} for some pages only
+#   - pages still to extract are split into contiguous ranges over `workers` processes (0 = all cores); each
+#     process opens the document itself
+#   - cache: one JSON per (file sha256, page, settings) under cache_dir, so a re-run reads every page from the
+#     cache and a settings change redoes only the pages it applies to. Delete the folder to clear it.
+# Header reconciliation (page order, whatever order the workers finish in): the first row of the first table
+# is the header; a later page whose first row repeats it (case/whitespace-insensitive) drops that row, any
+# other page is a continuation and all its rows are data. Rows are padded/cut to the header width; blank
+# header cells become 'Unnamed: i', repeats 'X.1'. Every row carries its 1-based page in PAGE_COLUMN.
+
+import hashlib, json, os
+from pathlib import Path
+from typing import Dict, List, Optional
+import pandas as pd
+from excel_stream import flatten_header
+
+PAGE_COLUMN = "_page"
+FLAVORS = {
+    "lattice": {"vertical_strategy": "lines", "horizontal_strategy": "lines"},
+    "stream": {"vertical_strategy": "text", "horizontal_strategy": "text"},
+}
+MIN_PAGES_PER_WORKER = 4  # fewer pages than this per process are extracted in the calling process
+
+def _pdfplumber():
+    try:
+        import pdfplumber
+    except Exception:
+        raise RuntimeError("PDF support requires 'pip install pdfplumber' (or use CSV/XLSX).")
+    return pdfplumber
+
+def _page_spec(spec, n_pages: int) -> List[int]:
+    # 1-based spec -> sorted 0-based page indexes
+    if spec is None or (isinstance(spec, str) and spec.strip().lower() in ("all", "*")):
+        return list(range(n_pages))
+    sel = set()
+    if isinstance(spec, str):
+        for chunk in spec.split(","):
+            if "-" in chunk:
+                a, b = chunk.split("-")
+                sel.update(range(int(a) - 1, int(b)))
+            elif chunk.strip():
+                sel.add(int(chunk) - 1)
+    else:
+        sel.update(int(p) - 1 for p in spec)
+    bad = [p + 1 for p in sel if p < 0 or p >= n_pages]
+    if bad:
+        raise RuntimeError(f"PDF has {n_pages} page(s); no page(s) {sorted(bad)}")
+    return sorted(sel)
+
+def page_count(path: Path) -> int:
+    with _pdfplumber().open(str(path)) as pdf:
+        return len(pdf.pages)
+
+def page_settings_map(pages: List[int], n_pages: int, flavor: str = "lattice", table_settings: dict = None,
+                      page_settings: dict = None) -> Dict[int, dict]:
+    if flavor not in FLAVORS:
+        raise RuntimeError(f"Unknown pdf_flavor {flavor!r} (use {sorted(FLAVORS)})")
+    base = {**FLAVORS[flavor], **(table_settings or {})}
+    out = {p: dict(base) for p in pages}
+    for spec, extra in (page_settings or {}).items():
+        for p in _page_spec(str(spec), n_pages):
+            if p in out:
+                out[p].update(extra)
+    return out
+
+def settings_key(settings: dict) -> str:
+    # the extractor version is part of the key: an upgrade may change what a page yields
+    doc = {"settings": settings, "pdfplumber": getattr(_pdfplumber(), "__version__", "")}
+    return hashlib.sha1(json.dumps(doc, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def file_sha(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _cache_file(cache_dir: Path, sha: str, page: int, key: str) -> Path:
+    return Path(cache_dir) / sha[:2] / sha / f"p{page + 1:05d}_{key}.json"
+
+def _extract(path: str, jobs: list) -> Dict[int, Optional[list]]:
+    # one process: open the document once, extract its pages (largest table per page, as before)
+    with _pdfplumber().open(path) as pdf:
+        return {p: pdf.pages[p].extract_table(settings) for p, settings in jobs}
+
+def extract_pages(path: Path, jobs: list, workers: int = 0) -> Dict[int, Optional[list]]:
+    """{page: table rows or None} for [(page, settings), ...], in contiguous ranges over worker processes."""
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(jobs) // MIN_PAGES_PER_WORKER)
+    if workers <= 1 or mp.current_process().daemon:
+        return _extract(str(path), jobs)
+    size = -(-len(jobs) // workers)
+    ranges = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+    out = {}
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=mp.get_context()) as ex:
+        for part in ex.map(_extract, [str(path)] * len(ranges), ranges):
+            out.update(part)
+    return out
+
+def _norm(row) -> list:
+    return [" ".join(str(c).split()).lower() if c is not None else "" for c in row]
+
+def assemble(tables: List[tuple]) -> pd.DataFrame:
+    """[(page, rows), ...] in page order -> one frame with the reconciled header (see the top of the file)."""
+    header, data, pages = None, [], []
+    for page, rows in tables:
+        if not rows:
+            continue
+        if header is None:
+            header = [" ".join(str(c).split()) if c is not None else None for c in rows[0]]
+            key, rows = _norm(rows[0]), rows[1:]
+        elif _norm(rows[0]) == key:
+            rows = rows[1:]  # header repeated on this page
+        data += rows
+        pages += [page + 1] * len(rows)
+    if header is None:
+        return pd.DataFrame()
+    cols = flatten_header([header])
+    width = len(cols)
+    data = [list(r[:width]) + [None] * (width - len(r)) for r in data]
+    df = pd.DataFrame(data, columns=cols)
+    df[PAGE_COLUMN] = pages
+    return df
+
+def read_tables(path: Path, pages="1", flavor: str = "lattice", table_settings: dict = None,
+                page_settings: dict = None, workers: int = 0, cache_dir: Path = None) -> pd.DataFrame:
+    path = Path(path)
+    n_pages = page_count(path)
+    sel = _page_spec(pages, n_pages)
+    settings = page_settings_map(sel, n_pages, flavor, table_settings, page_settings)
+    keys = {p: settings_key(s) for p, s in settings.items()}
+    sha = file_sha(path) if cache_dir else None
+
+    tables, todo = {}, []
+    for p in sel:
+        f = _cache_file(cache_dir, sha, p, keys[p]) if cache_dir else None
+        if f is not None and f.exists():
+            tables[p] = json.loads(f.read_text(encoding="utf-8"))["rows"]
+        else:
+            todo.append((p, settings[p]))
+    if todo:
+        fresh = extract_pages(path, todo, workers)
+        for p, rows in fresh.items():
+            tables[p] = rows
+            if cache_dir:
+                f = _cache_file(cache_dir, sha, p, keys[p])
+                f.parent.mkdir(parents=True, exist_ok=True)
+                tmp = f.with_suffix(".tmp")
+                tmp.write_text(json.dumps({"page": p + 1, "settings": settings[p], "rows": rows}), encoding="utf-8")
+                tmp.replace(f)
+    return assemble([(p, tables[p]) for p in sel])
@@ -0,0 +1,213 @@
+# Quarantine store of the Source Compiler: rejected rows are appended to SRC_Quarantine (phase1.db), never
+# overwritten. One row per rejected source record: compiler run, SRC_IngestManifest batch, source name/path,
+# source line number, reason code and the raw values as read (JSON object keyed by the original headers).
+# Rows are written in slices of WRITE_ROWS inside the file's load transaction, so a delivery that rejects
+# millions of rows costs one slice of JSON at a time (plus the chunk being parsed, with --stream).
+#
+# Line numbers: record i (0-based, as read) is line i + 2 of a CSV (one header line, one line per record),
+# row i + header_row + 2 of a sheet, row i + 1 of a Parquet file / PDF table.
+#
+# Fixing rows: export them, correct the CSV, and re-drive it. The fixed rows go through process_file() as a
+# new manifest batch ('<path>#quarantine@<time>'), so the CDM refresh picks them up. Rows that fail again
+# are quarantined again under that batch. When the original file is reloaded, redrive batches of its old
+# batch are retired and its open rejects marked 'superseded' (retire_redrives) -- the new delivery replaces them.
+#   python quarantine.py counts [--by reason source_name run_id]
+#   python quarantine.py export fixes.csv --source Holdings [--reason missing_required] [--run 20250901_0930]
+#   python quarantine.py redrive fixes.csv
+
+import argparse, json, sqlite3
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+
+BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
+DB   = BASE / "phase1.db"
+
+QUARANTINE_DDL = """
+CREATE TABLE IF NOT EXISTS SRC_Quarantine (
+  q_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  run_id VARCHAR(32),
+  batch_id INTEGER,
+  source_name VARCHAR(128),
+  path VARCHAR(512),
+  line_no INTEGER,
+  reason VARCHAR(64) NOT NULL,
+  raw_json TEXT,
+  status VARCHAR(16) NOT NULL DEFAULT 'open',
+  redrive_batch_id INTEGER,
+  quarantined_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_src_quarantine_reason ON SRC_Quarantine(reason, source_name);
+CREATE INDEX IF NOT EXISTS ix_src_quarantine_source ON SRC_Quarantine(source_name, batch_id);
+CREATE INDEX IF NOT EXISTS ix_src_quarantine_run ON SRC_Quarantine(run_id);
+CREATE INDEX IF NOT EXISTS ix_src_quarantine_batch ON SRC_Quarantine(batch_id);
+"""
+
+WRITE_ROWS = 50000          # rejected rows JSON-encoded per insert slice
+READ_ROWS = 50000           # rows fetched per slice by export()
+META = ["q_id", "source_name", "line_no", "reason"]
+GROUPS = ["reason", "source_name", "path", "run_id", "batch_id", "status"]
+LOADER = "quarantine"       # SRC_IngestManifest.loader of redrive batches
+
+def ensure_schema(conn):
+    conn.executescript(QUARANTINE_DDL)
+    conn.commit()
+
+def new_run_id() -> str:
+    return datetime.now().strftime("%Y%m%d_%H%M%S")
+
+def line_offset(item: dict, cfg: dict = None) -> int:
+    ftype = (item.get("file_type") or "csv").lower()
+    if ftype in ("xlsx", "xlsm", "xls"):
+        hdr = item.get("header_row", (cfg or {}).get("file_defaults", {}).get("header_row", 0))
+        return int(max(hdr) if isinstance(hdr, (list, tuple)) else hdr) + 2  # last row of a multi-row header
+    return 1 if ftype in ("parquet", "pdf") else 2
+
+def _unique(cols) -> list:
+    # JSON objects need distinct keys: a repeated header gets a ' (2)' suffix
+    seen, out = {}, []
+    for c in map(str, cols):
+        seen[c] = seen.get(c, 0) + 1
+        out.append(c if seen[c] == 1 else f"{c} ({seen[c]})")
+    return out
+
+def write(conn, item: dict, reason: str, raw: pd.DataFrame, batch_id=None, run_id=None, cfg: dict = None) -> int:
+    """Append the rejected raw rows (index = 0-based record number in the source); no commit."""
+    if raw is None or raw.empty:
+        return 0
+    off = line_offset(item, cfg)
+    now = datetime.now().isoformat(timespec="seconds")
+    sql = ("INSERT INTO SRC_Quarantine (run_id, batch_id, source_name, path, line_no, reason, raw_json, status, "
+           "quarantined_at) VALUES (?,?,?,?,?,?,?,'open',?)")
+    for start in range(0, len(raw), WRITE_ROWS):
+        part = raw.iloc[start:start + WRITE_ROWS]
+        part = part.set_axis(_unique(part.columns), axis=1)
+        # one C-level to_json per slice, split into the per-row objects (JSON escapes embedded newlines)
+        lines = part.to_json(orient="records", lines=True, date_format="iso", force_ascii=False).split("\n")
+        lines = [s for s in lines if s]
+        conn.executemany(sql, [(run_id, batch_id, item.get("name"), item.get("path"), int(i) + off, reason, js, now)
+                               for i, js in zip(part.index, lines)])
+    return len(raw)
+
+def _where(reason=None, source_name=None, run_id=None, batch_id=None, status="open") -> tuple:
+    conds, params = [], []
+    for col, v in (("reason", reason), ("source_name", source_name), ("run_id", run_id),
+                   ("batch_id", batch_id), ("status", status)):
+        if v is not None:
+            conds.append(f"{col} = ?")
+            params.append(v)
+    return (" WHERE " + " AND ".join(conds) if conds else ""), params
+
+def counts(conn, by=("reason", "source_name"), **filters) -> pd.DataFrame:
+    """Rejected rows grouped by any of GROUPS, e.g. counts(conn, ["run_id", "reason"], status=None)."""
+    by = [b for b in by if b in GROUPS] or ["reason"]
+    where, params = _where(**filters)
+    cols = ", ".join(by)
+    return pd.read_sql(f"SELECT {cols}, COUNT(*) AS rows FROM SRC_Quarantine{where} GROUP BY {cols} "
+                       f"ORDER BY {cols}", conn, params=params)
+
+def iter_rows(conn, **filters):
+    """DataFrames of READ_ROWS rejected rows: q_id, source_name, line_no, reason + the raw columns."""
+    where, params = _where(**filters)
+    cur = conn.execute(f"SELECT q_id, source_name, line_no, reason, raw_json FROM SRC_Quarantine{where} "
+                       f"ORDER BY q_id", params)
+    while True:
+        rows = cur.fetchmany(READ_ROWS)
+        if not rows:
+            return
+        meta = pd.DataFrame.from_records([r[:4] for r in rows], columns=META)
+        raw = pd.DataFrame.from_records([json.loads(r[4]) for r in rows])
+        yield pd.concat([meta, raw], axis=1)
+
+def export(conn, out: Path, **filters) -> int:
+    # streamed: one slice in memory; the header is the first slice's (export one source at a time)
+    n = 0
+    for df in iter_rows(conn, **filters):
+        df.to_csv(out, index=False, encoding="utf-8", mode="a" if n else "w", header=not n)
+        n += len(df)
+    return n
+
+def redrive(conn, cfg: dict, fixed: pd.DataFrame, run_id: str = None) -> dict:
+    """Run corrected rows (q_id + raw columns, as written by export) through process_file(), one new
+    manifest batch per source. Returns {source_name: rows appended}."""
+    import ingest_manifest as im
+    import source_compiler as sc
+    run_id = run_id or new_run_id()
+    fixed = fixed.assign(q_id=pd.to_numeric(fixed["q_id"]).astype("int64"))
+    ids = fixed["q_id"].tolist()
+    meta = pd.concat([pd.read_sql(f"SELECT q_id, source_name, line_no FROM SRC_Quarantine WHERE q_id IN "
+                                  f"({','.join(map(str, ids[i:i + READ_ROWS]))}) AND status = 'open'", conn)
+                      for i in range(0, len(ids), READ_ROWS)] or [pd.DataFrame(columns=META[:3])])
+    fixed = fixed.merge(meta, on="q_id", suffixes=("_export", ""))  # rows already redriven drop out here
+    items = {i["name"]: i for i in cfg.get("files", [])}
+    out = {}
+    for name, grp in fixed.groupby("source_name"):
+        item = items.get(name)
+        if item is None:
+            raise RuntimeError(f"Quarantined source {name} is not in the compiler config")
+        raw = grp.drop(columns=[c for c in grp.columns if c in META or c.endswith("_export")])
+        raw = raw.dropna(axis=1, how="all")  # columns of other sources in a mixed export
+        raw.index = grp["line_no"].astype(int).to_numpy() - line_offset(item, cfg)  # keep the source line numbers
+        info = {"path": f"{item['path']}#quarantine@{datetime.now().isoformat(timespec='microseconds')}",
+                "size": None, "mtime": None, "sha": None}
+        bid = im.begin_batch(conn, info, item["target_table"], LOADER, name)
+        try:
+            n = sc.process_file(cfg, item, conn, batch_id=bid, frames=[raw], run_id=run_id)
+            conn.executemany("UPDATE SRC_Quarantine SET status = 'redriven', redrive_batch_id = ? WHERE q_id = ?",
+                             [(bid, int(q)) for q in grp["q_id"]])
+        except Exception:
+            im.fail_batch(conn, bid, item["target_table"])
+            raise
+        im.finish_batch(conn, bid, item["target_table"], n)
+        out[name] = n
+    return out
+
+def retire_redrives(conn) -> int:
+    # redrive batches whose original batch was superseded by a new delivery of the file: drop their rows.
+    # Their fingerprints are forgotten first: rows the new delivery dropped as duplicates of the redrive are
+    # landed again under its batch (row_fingerprint.forget)
+    import row_fingerprint as rf  # phase1/ (on sys.path via source_compiler)
+    stale = conn.execute(
+        "SELECT DISTINCT r.batch_id, r.target_table FROM SRC_Quarantine q "
+        "JOIN SRC_IngestManifest r ON r.batch_id = q.redrive_batch_id AND r.status = 'current' "
+        "JOIN SRC_IngestManifest o ON o.batch_id = q.batch_id AND o.status <> 'current'").fetchall()
+    for bid, target in stale:
+        rf.forget(conn, target, [bid])
+        conn.execute(f"DELETE FROM {target} WHERE load_batch_id = ?", (bid,))
+        conn.execute("UPDATE SRC_IngestManifest SET status = 'superseded' WHERE batch_id = ?", (bid,))
+    # open rejects of a replaced delivery are no longer actionable
+    conn.execute("UPDATE SRC_Quarantine SET status = 'superseded' WHERE status = 'open' AND batch_id IN "
+                 "(SELECT batch_id FROM SRC_IngestManifest WHERE status = 'superseded')")
+    conn.commit()
+    return len(stale)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Source Compiler quarantine: counts, export, redrive")
+    ap.add_argument("command", choices=["counts", "export", "redrive"])
+    ap.add_argument("file", nargs="?", help="CSV to export to / redrive from")
+    ap.add_argument("--db", default=str(DB), help="SQLite database file")
+    ap.add_argument("--config", default=str(BASE / r"source-compiler\config\source_generic.yaml"))
+    ap.add_argument("--by", nargs="*", default=["reason", "source_name"], help=f"counts grouping: {GROUPS}")
+    ap.add_argument("--source", default=None, help="source name (config files: name)")
+    ap.add_argument("--reason", default=None)
+    ap.add_argument("--run", default=None, help="run id (YYYYMMDD_HHMMSS)")
+    ap.add_argument("--all", action="store_true", help="include redriven rows")
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    ensure_schema(conn)
+    filters = {"reason": args.reason, "source_name": args.source, "run_id": args.run,
+               "status": None if args.all else "open"}
+    if args.command == "counts":
+        print(counts(conn, args.by, **filters).to_string(index=False))
+    elif not args.file:
+        ap.error(f"{args.command} needs a CSV file")
+    elif args.command == "export":
+        print(f"{export(conn, Path(args.file), **filters)} row(s) written to {args.file}")
+    else:
+        import source_compiler as sc
+        fixed = pd.read_csv(args.file, dtype=str, keep_default_na=False, na_values=[""])
+        print("Redriven:", redrive(conn, sc.load_config(Path(args.config)), fixed))
+        print("Still open:")
+        print(counts(conn, ["source_name", "reason"], status="open").to_string(index=False))
+    conn.close()
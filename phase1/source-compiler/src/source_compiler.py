@@ -1,8 +1,22 @@
-import json, csv, re
+import json, csv, re, codecs, queue, threading, sys, traceback
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Iterator
 import pandas as pd
 import sqlite3
+import format_profile as fp
+import numeric_parse
+import date_parse
+import excel_stream
+import pdf_tables
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # phase1/: modules shared with the Move-2 loader
+import ingest_manifest as im
+import bulk_load as bl
+import physical_design as phys
+import quarantine as qr
+import run_metrics as rm
+import row_fingerprint as rf
+import ingest_plan as ip
 
 # Optional YAML; falls back to JSON if not installed
 try:
@@ -12,16 +26,31 @@ except Exception:
 
 BASE = Path(r"C:\Users\Dick\pyproj_finrep\phase1")
 DB   = BASE / "phase1.db"
-QDIR = BASE / r"source-compiler\quarantine"
-QDIR.mkdir(exist_ok=True, parents=True)
+LOADER = "compiler"  # SRC_IngestManifest.loader
+
+def _pairs(pairs, where: str = "") -> dict:
+    # repeated keys: header_aliases lists add up, anything else is an error (see ingest_plan.merge_duplicate)
+    out = {}
+    for k, v in pairs:
+        out[k] = ip.merge_duplicate(k, out[k], v, where) if k in out else v
+    return out
+
+if yaml:
+    class _ConfigLoader(yaml.SafeLoader):
+        def construct_mapping(self, node, deep=False):
+            self.flatten_mapping(node)
+            return _pairs(((self.construct_object(k, deep=deep), self.construct_object(v, deep=deep))
+                           for k, v in node.value), f" (line {node.start_mark.line + 1})")
+    _ConfigLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+                                  lambda loader, node: loader.construct_mapping(node, deep=True))
 
 def load_config(path: Path) -> dict:
     if path.suffix.lower() in (".yml", ".yaml"):
         if not yaml:
             raise RuntimeError("PyYAML not installed. Either install: pip install pyyaml OR use a .json config.")
-        return yaml.safe_load(path.read_text(encoding="utf-8"))
+        return yaml.load(path.read_text(encoding="utf-8"), Loader=_ConfigLoader)
     else:
-        return json.loads(path.read_text(encoding="utf-8"))
+        return json.loads(path.read_text(encoding="utf-8"), object_pairs_hook=_pairs)
 
 def sniff_read_csv(path: Path, encs: List[str], delims: List[str]) -> pd.DataFrame:
     for enc in encs:
@@ -45,36 +74,28 @@ def read_excel(path, sheet=0, header_row=0, skiprows=None, encs=None, delims=Non
         df.columns = [" ".join([str(x) for x in tup if str(x)!='nan']).strip() for tup in df.columns]
     return df
 
-def read_pdf_tables(path, pages="1", flavor="lattice"):
-    # Keep simple to avoid heavy system deps: try pdfplumber first (pip install pdfplumber)
+def read_pdf_tables(path, pages="1", flavor="lattice", table_settings=None, page_settings=None, workers=0,
+                    cache_dir=None):
+    # pdfplumber, pages extracted in parallel processes and cached per (file hash, page, settings): see pdf_tables
+    return pdf_tables.read_tables(path, pages=pages, flavor=flavor, table_settings=table_settings,
+                                  page_settings=page_settings, workers=workers, cache_dir=cache_dir)
+
+def pdf_cache_dir(cfg: dict):
+    # file_defaults.pdf_cache: folder relative to BASE (default source-compiler/cache/pdf); false = no cache
+    c = cfg.get("file_defaults", {}).get("pdf_cache", "source-compiler/cache/pdf")
+    return (BASE / c) if c else None
+
+def _read_with_profile(path: Path, profile: dict):
+    # Fast path: last run's winning encoding/delimiter, validated against the recorded header
+    if not fp.matches(profile, path):
+        return None
     try:
-        import pdfplumber
+        df = pd.read_csv(path, sep=profile["delimiter"], encoding=profile["encoding"], engine="c", low_memory=False)
     except Exception:
-        raise RuntimeError("PDF support requires 'pip install pdfplumber' (or use CSV/XLSX).")
-    out = []
-    with pdfplumber.open(str(path)) as pdf:
-        sel = []
-        if isinstance(pages,str):
-            # parse simple "1,3-5"
-            for chunk in pages.split(","):
-                if "-" in chunk:
-                    a,b = chunk.split("-")
-                    sel += list(range(int(a)-1, int(b)))  # 0-based
-                else:
-                    sel.append(int(chunk)-1)
-        else:
-            sel = [p-1 for p in pages]
-        for i in sel:
-            table = pdf.pages[i].extract_table()
-            if table and len(table)>1:
-                hdr = table[0]
-                rows = table[1:]
-                out.append(pd.DataFrame(rows, columns=hdr))
-    if not out:
-        return pd.DataFrame()
-    return pd.concat(out, ignore_index=True)
-
-def load_dataframe(item, cfg):
+        return None
+    return df if [str(c) for c in df.columns] == profile.get("columns") else None
+
+def load_dataframe(item, cfg, profile=None):
     path = BASE / item["path"]
     encs = cfg.get("encoding_priority", ["utf-8","cp1252","latin1"])
     delims = cfg.get("delimiter_priority", [",",";","|","\t"])
@@ -99,46 +120,222 @@ def load_dataframe(item, cfg):
         if del_list:
             delims = del_list + [d for d in delims if d not in del_list]
 
-        # try sniff first, then forced delimiters across encodings
-        try:
-            return pd.read_csv(path, sep=None, engine="python", encoding=encs[0])
-        except Exception:
-            pass
+        if profile is not None:
+            df = _read_with_profile(path, profile)
+            if df is not None:
+                return df
+
+        # try sniff first (unless the file pins its delimiter: the sniffer splits a lone 'Date' header on 't'),
+        # then forced delimiters across encodings
+        if not del_list:
+            try:
+                df = pd.read_csv(path, sep=None, engine="python", encoding=encs[0])
+                fp.record_read(profile, path, encs[0], fp.infer_delimiter(path, encs[0], df.shape[1], delims), df)
+                return df
+            except Exception:
+                pass
 
         last_err = None
         for enc in encs:
             for d in delims:
                 try:
-                    return pd.read_csv(path, sep=d, engine="python", encoding=enc)
+                    df = pd.read_csv(path, sep=d, engine="python", encoding=enc)
+                    fp.record_read(profile, path, enc, d, df)
+                    return df
                 except Exception as e:
                     last_err = e
                     continue
         raise last_err or RuntimeError(f"Failed to read {path}")
 
-    elif ftype in ("xlsx","xls"):
+    elif ftype in ("xlsx","xlsm"):
+        # same streaming reader as --stream, chunks joined (typed cells, several sheets)
+        chunks = list(iter_excel_chunks(item, cfg, prefetch=False))
+        return pd.concat(chunks) if len(chunks) > 1 else (chunks[0] if chunks else pd.DataFrame())
+    elif ftype == "xls":
         return read_excel(path, sheet=item.get("sheet", cfg.get("file_defaults",{}).get("sheet",0)),
                           header_row=item.get("header_row", cfg.get("file_defaults",{}).get("header_row",0)),
                           skiprows=item.get("skiprows", cfg.get("file_defaults",{}).get("skiprows",[])))
+    elif ftype == "parquet":
+        pf = parquet_file(path)
+        return pf.read(columns=parquet_columns(item, cfg, pf.schema_arrow.names)).to_pandas(date_as_object=False)
     elif ftype == "pdf":
+        d = cfg.get("file_defaults", {})
         return read_pdf_tables(path,
-                               pages=item.get("pdf_pages", cfg.get("file_defaults",{}).get("pdf_pages","1")),
-                               flavor=item.get("pdf_flavor", cfg.get("file_defaults",{}).get("pdf_flavor","lattice")))
+                               pages=item.get("pdf_pages", d.get("pdf_pages","1")),
+                               flavor=item.get("pdf_flavor", d.get("pdf_flavor","lattice")),
+                               table_settings=item.get("pdf_table_settings", d.get("pdf_table_settings")),
+                               page_settings=item.get("pdf_page_settings"),
+                               workers=item.get("pdf_workers", d.get("pdf_workers", 0)),
+                               cache_dir=pdf_cache_dir(cfg))
     else:
         raise RuntimeError(f"Unsupported file_type={ftype} for {item.get('name')}")
 
 # end update
 
+# --- Parquet: typed columns, so no dialect/date-format guessing; only the columns the file maps are read
+def parquet_file(path: Path):
+    try:
+        import pyarrow.parquet as pq
+    except Exception:
+        raise RuntimeError("Parquet support requires 'pip install pyarrow' (or use CSV/XLSX).")
+    return pq.ParquetFile(path)
+
+def parquet_columns(item, cfg, names: List[str]):
+    # Column projection: explicit `columns:` list, else every column whose header aliases to a field the
+    # file uses (map / required / required_any). Calendars keep all columns (their layout is guessed later).
+    if item.get("columns"):
+        return list(item["columns"])
+    if item.get("calendar", False):
+        return None
+    wanted = set(item.get("map", {})) | set(item.get("required", [])) | {c for g in item.get("required_any", []) for c in g}
+    aliases = cfg.get("header_aliases", {})
+    keep = {str(a).strip().lower() for canon in wanted for a in [canon] + aliases.get(canon, [])}
+    cols = [n for n in names if norm_header(n) in keep]
+    return cols or None
+
+def iter_parquet_chunks(item, cfg) -> Iterator[pd.DataFrame]:
+    # row groups are decoded one at a time and sliced to `chunksize` rows: bounded memory like the CSV stream
+    pf = parquet_file(BASE / item["path"])
+    st = stream_settings(item, cfg)
+    batches = pf.iter_batches(batch_size=st["chunksize"], columns=parquet_columns(item, cfg, pf.schema_arrow.names))
+    start = 0
+    for batch in _prefetch(batches, st["prefetch"]):
+        df = batch.to_pandas(date_as_object=False)
+        df.index += start  # row numbers run on across batches (quarantine line numbers)
+        start += len(df)
+        yield df
+
+# --- xlsx: openpyxl read-only rows in chunks (see excel_stream); sheet/header_row/skiprows from file_defaults
+def iter_excel_chunks(item, cfg, prefetch: bool = True) -> Iterator[pd.DataFrame]:
+    d = cfg.get("file_defaults", {})
+    st = stream_settings(item, cfg)
+    chunks = excel_stream.iter_sheets(BASE / item["path"], sheet=item.get("sheet", d.get("sheet", 0)),
+                                      header_row=item.get("header_row", d.get("header_row", 0)),
+                                      skiprows=item.get("skiprows", d.get("skiprows", [])),
+                                      chunksize=st["chunksize"], workers=st["sheet_workers"])
+    yield from _prefetch(chunks, st["prefetch"] if prefetch else 0)
+
+# --- Streaming CSV path: sniff the dialect from the head of the file, then parse with the C engine in chunks
+def _priority(override, defaults: List[str]) -> List[str]:
+    lst = override if isinstance(override, list) else ([override] if override else [])
+    return lst + [x for x in defaults if x not in lst]
+
+def sniff_dialect(path: Path, encs: List[str], delims: List[str], nbytes: int = 65536):
+    with open(path, "rb") as f:
+        raw = f.read(nbytes)
+    for enc in encs:
+        try:
+            # incremental decode tolerates a multi-byte char cut at the end of the sample
+            text = codecs.getincrementaldecoder(enc)().decode(raw, final=False)
+        except (UnicodeDecodeError, LookupError):
+            continue
+        lines = text.splitlines()
+        if len(lines) > 1 and len(raw) == nbytes:
+            lines = lines[:-1]  # drop the partial last line
+        sample = "\n".join(lines)
+        try:
+            return enc, csv.Sniffer().sniff(sample, delimiters="".join(delims)).delimiter
+        except csv.Error:
+            pass
+        # Sniffer gives up on single-column files: fall back to the header line
+        header = lines[0] if lines else ""
+        hits = [d for d in delims if d in header]
+        return enc, (hits[0] if hits else delims[0])
+    raise RuntimeError(f"Failed to decode head of {path} with encodings={encs}")
+
+def _prefetch(it: Iterator, depth: int) -> Iterator:
+    # Read ahead on a background thread so parsing the next chunk overlaps with transform + SQL append.
+    # The bounded queue keeps at most `depth` chunks in flight.
+    if depth <= 0:
+        yield from it
+        return
+    q = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def worker():
+        try:
+            for x in it:
+                if stop.is_set():
+                    break
+                q.put(x)
+            q.put(done)
+        except BaseException as e:
+            q.put(e)
+
+    t = threading.Thread(target=worker, daemon=True)
+    t.start()
+    try:
+        while True:
+            x = q.get()
+            if x is done:
+                break
+            if isinstance(x, BaseException):
+                raise x
+            yield x
+    finally:
+        stop.set()
+        while t.is_alive():
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                t.join(0.05)
+
+def stream_settings(item, cfg) -> dict:
+    st = dict(cfg.get("streaming", {}) or {})
+    enabled = item.get("streaming", st.get("enabled", False))
+    return {
+        "enabled": bool(enabled) and (item.get("file_type") or "csv").lower() in ("csv", "parquet", "xlsx", "xlsm")
+                   and not item.get("calendar", False),
+        "chunksize": int(item.get("chunksize", st.get("chunksize", 200000))),
+        "sniff_bytes": int(st.get("sniff_bytes", 65536)),
+        "prefetch": int(st.get("prefetch", 2)),
+        "sheet_workers": int(item.get("sheet_workers", st.get("sheet_workers", 1))),
+    }
+
+def iter_csv_chunks(item, cfg, profile=None) -> Iterator[pd.DataFrame]:
+    path = BASE / item["path"]
+    st = stream_settings(item, cfg)
+    encs = _priority(item.get("encoding"), cfg.get("encoding_priority", ["utf-8","cp1252","latin1"]))
+    delims = _priority(item.get("delimiter"), cfg.get("delimiter_priority", [",",";","|","\t"]))
+    if fp.matches(profile, path):
+        enc, sep = profile["encoding"], profile["delimiter"]
+    else:
+        enc, sep = sniff_dialect(path, encs, delims, st["sniff_bytes"])
+    # dtype=str: type inference per chunk is unstable; parse_dates/parse_numbers do the typing
+    reader = pd.read_csv(path, sep=sep, encoding=enc, engine="c", dtype=str, chunksize=st["chunksize"])
+    first = True
+    for chunk in _prefetch(iter(reader), st["prefetch"]):
+        if first:
+            fp.record_read(profile, path, enc, sep, chunk)
+            first = False
+        yield chunk
+
+def iter_dataframes(item, cfg, profile=None) -> Iterator[pd.DataFrame]:
+    if stream_settings(item, cfg)["enabled"]:
+        ftype = (item.get("file_type") or "csv").lower()
+        if ftype == "parquet":
+            yield from iter_parquet_chunks(item, cfg)
+        elif ftype in ("xlsx", "xlsm"):
+            yield from iter_excel_chunks(item, cfg)
+        else:
+            yield from iter_csv_chunks(item, cfg, profile)
+    else:
+        yield load_dataframe(item, cfg, profile)
+
+def norm_header(c) -> str:
+    return (
+        str(c)
+        .strip()
+        .lower()
+        .replace("\u00A0", " ")
+        .replace("  "," ")
+    )
+
 def normalize_headers(df: pd.DataFrame) -> pd.DataFrame:
     norm = {}
     for c in df.columns:
-        c2 = (
-            str(c)
-            .strip()
-            .lower()
-            .replace("\u00A0", " ")
-            .replace("  "," ")
-        )
-        norm[c2] = c
+        norm[norm_header(c)] = c
     df.columns = list(norm.keys())
     return df
 
@@ -156,118 +353,79 @@ def alias_columns(df: pd.DataFrame, header_aliases: Dict[str, List[str]]) -> Dic
             mapping[canon] = c
     return mapping  # canonical -> df-column-name(normalized)
 
-def parse_dates(s: pd.Series, fmts: List[str], dayfirst: bool) -> pd.Series:
-    s0 = s.astype(str).str.strip()
-    vals = pd.Series(pd.NaT, index=s.index)
-
-    # Excel serials
-    serial = pd.to_numeric(s0, errors="coerce")
-    mask = serial.ge(25569) & serial.lt(80000)
-    vals.loc[mask] = pd.to_datetime("1899-12-30") + pd.to_timedelta(serial[mask], unit="D")
-
-    remain = vals.isna()
-
-    # Exact formats (dates + datetimes commonly seen)
-    fmts_ext = fmts + ["%Y-%m-%d %H:%M:%S", "%d.%m.%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S", "%Y.%m.%d %H.%M.%S"]
-    for f in fmts_ext:
-        hit = pd.to_datetime(s0[remain], format=f, errors="coerce")
-        vals.loc[remain] = vals.loc[remain].fillna(hit)
-        remain = vals.isna()
-        if not remain.any():
-            break
-
-    # ISO 8601 (with timezone)
-    if remain.any():
-        vals.loc[remain] = pd.to_datetime(s0[remain], errors="coerce", utc=False, dayfirst=dayfirst)
-
-    return vals.dt.date  # truncate to date for SRC/CDM
-
-
-def parse_numbers(s: pd.Series) -> pd.Series:
-    # Locale tolerant: remove NBSP, spaces, currency, handle parentheses
-    x = s.astype(str).str.replace("\u00A0","", regex=False).str.strip()
-    x = x.str.replace(r"^\((.*)\)$", r"-\1", regex=True)
-    x = x.str.replace(r"[^\d,\.\-]", "", regex=True)
-    # Prefer dot as decimal; remove thousand-separators
-    # If both comma & dot exist, assume comma thousands and dot decimal
-    def _norm(v):
-        if v.count(",")>0 and v.count(".")>0:
-            return v.replace(",","")
-        elif v.count(",")>0 and v.count(".")==0:
-            return v.replace(",",".")
-        return v
-    x = x.apply(_norm)
-    return pd.to_numeric(x, errors="coerce")
+def parse_dates(s: pd.Series, fmts: List[str], dayfirst: bool, hint: str = None) -> pd.Series:
+    # Parses distinct values only, memoized across columns/files of the run (see date_parse)
+    return date_parse.parse_dates_unique(s, fmts, dayfirst, hint)  # truncated to date for SRC/CDM
+
+def parse_numbers(s: pd.Series, decimal: str = None, thousands: str = None) -> pd.Series:
+    # Locale tolerant, vectorized (see numeric_parse): convention inferred per column unless given
+    return numeric_parse.parse_numeric(s, decimal, thousands)[0]
 
 def append_sql(conn, table: str, df: pd.DataFrame) -> int:
-    cols = set(r[1] for r in conn.execute(f"PRAGMA table_info({table})"))
-    keep = [c for c in df.columns if c in cols]
-    if not keep:
-        return 0
-    df[keep].to_sql(table, conn, if_exists="append", index=False)
-    return len(df)
+    # executemany into the open transaction (committed per file by the manifest); see bulk_load.py
+    return bl.append(conn, table, phys.add_keys(table, df))
 
-def quarantine_write(name: str, reason: str, df: pd.DataFrame):
-    out = QDIR / f"{name}_{reason}.csv"
-    df.to_csv(out, index=False, encoding="utf-8")
+def transform_frame(fplan, df: pd.DataFrame, profile=None, stats=None):
+    # Returns (frame to append or None, [(reason, rejected rows as read), ...]); called once per file or once per chunk.
+    # Executes the file's compiled plan (ingest_plan.FilePlan): lookup, typed columns, required checks, outputs.
+    # `stats` (optional dict) accumulates numeric parse failures per column: {col: [failed, non_empty]}
+    rejects = []
+    fmts, dayfirst = fplan.fmts, fplan.dayfirst
 
-def process_file(cfg: dict, item: dict, conn) -> int:
-    path = BASE / item["path"]
-    encs = cfg.get("encoding_priority", ["utf-8","cp1252","latin1"])
-    delims = cfg.get("delimiter_priority", [",",";","|","\t"])
-    hdr_aliases = cfg.get("header_aliases", {})
-    fmts = cfg.get("date_format_priority", ["%Y-%m-%d","%d.%m.%Y","%d/%m/%Y","%m/%d/%Y","%Y%m%d"])
-    dayfirst = bool(cfg.get("dayfirst_default", True))
-    dq = cfg.get("dq_thresholds", {})
-    min_date_rate = float(dq.get("min_date_parse_rate", 0.9))
+    def dates(col, s):
+        with rm.stage("parse_dates", rows_in=len(s)):
+            if pd.api.types.is_datetime64_any_dtype(s):  # typed cells (xlsx dates, parquet): no format to learn
+                return parse_dates(s, fmts, dayfirst)
+            return parse_dates(s, fmts, dayfirst, hint=fp.date_format_for(profile, col, s, fmts))
 
-    if not path.exists():
-        return 0
+    raw = df.copy(deep=False)  # original headers/values for the quarantine (normalize_headers renames in place)
 
-    df = load_dataframe(item, cfg)
     # Guard against sniffer splitting 'Date' -> 'Da'/'te'
-    if item.get("calendar", False) and df.shape[1] == 2:
+    if fplan.calendar and df.shape[1] == 2:
         cols_l = [str(c).strip().lower() for c in df.columns]
         if set(cols_l) == {"da", "te"} or set(cols_l) == {"da", "e"}:
-            df = pd.DataFrame({"Date": df.iloc[:, 0].astype(str) + df.iloc[:, 1].astype(str)})
+            df = pd.DataFrame({"Date": df.iloc[:, 0].astype(str) + df.iloc[:, 1].fillna("").astype(str)})
+
+    with rm.stage("headers"):
+        df = normalize_headers(df)
 
-    df = normalize_headers(df)
+        alias_map = ip.resolve_columns(fplan, df.columns)
+        # Build canonical dataframe from alias map (plan column order)
+        canon_df = pd.DataFrame(index=df.index)
+        for col in fplan.columns:
+            if col.canon in alias_map:
+                canon_df[col.canon] = df[alias_map[col.canon]]
 
-    alias_map = alias_columns(df, hdr_aliases)
-    # Build canonical dataframe from alias map
-    canon_df = pd.DataFrame()
-    for canon, df_col in alias_map.items():
-        canon_df[canon] = df[df_col]
+    # Calendars: keep a raw 'date' column too, so required_any [value_date, date] passes instead of
+    # rejecting (and then loading) every row
+    if fplan.calendar and "date" in df.columns and "date" not in canon_df.columns:
+        canon_df["date"] = df["date"]
 
-    # --- REQUIRED-ANY SUPPORT (e.g., value_date OR evaluation_date) ---
-    req_any = item.get("required_any", [])
     # normalize date columns early
-    for dcol in ("value_date","evaluation_date","trade_date","settle_date","event_date"):
-        if dcol in canon_df.columns:
-            canon_df[dcol] = parse_dates(canon_df[dcol], fmts, dayfirst)
+    for col in fplan.columns:
+        if col.parser == "date" and col.canon in canon_df.columns:
+            canon_df[col.canon] = dates(col.canon, canon_df[col.canon])
 
-    # rows that satisfy at least one in each OR-group
+    def present(col, parser):
+        if parser == "date":
+            return canon_df[col].notna()
+        return canon_df[col].notna() & canon_df[col].astype(str).str.strip().ne("")  # empty cell = NaN
+
+    # --- REQUIRED-ANY SUPPORT (e.g., value_date OR evaluation_date): at least one in each OR-group
     ok_mask = pd.Series(True, index=canon_df.index)
-    for group in req_any:
+    for group in fplan.required_any:
         group_ok = pd.Series(False, index=canon_df.index)
-        for col in group:
+        for col, parser in group:
             if col in canon_df.columns:
-                if col in ("value_date","evaluation_date","trade_date","settle_date","event_date"):
-                    group_ok |= canon_df[col].notna()
-                else:
-                    group_ok |= canon_df[col].astype(str).str.strip().ne("")
+                group_ok |= present(col, parser)
         ok_mask &= group_ok
 
     # apply standard required (AND) checks
-    req = item.get("required", [])
     missing_rows = pd.Series(False, index=canon_df.index)
-    for r in req:
-        if r not in canon_df.columns:
-            canon_df[r] = pd.NA
-        if r in ("value_date","trade_date","settle_date","event_date","evaluation_date"):
-            missing_rows |= canon_df[r].isna()
-        else:
-            missing_rows |= canon_df[r].astype(str).str.strip().eq("")
+    for col, parser in fplan.required:
+        if col not in canon_df.columns:
+            canon_df[col] = pd.NA
+        missing_rows |= ~present(col, parser)
 
     # combine: row is bad if AND-missing OR fails any OR-group
     missing_rows |= ~ok_mask
@@ -283,11 +441,11 @@ def process_file(cfg: dict, item: dict, conn) -> int:
 
     # Quarantine missing required
     if missing_rows.any():
-        quarantine_write(item["name"], "missing_required", canon_df[missing_rows])
+        rejects.append(("missing_required", raw[missing_rows]))
         canon_df = canon_df[~missing_rows]
 
     # Calendar files: normalize to SRC_GenericCalendar
-    if item.get("calendar", False):
+    if fplan.calendar:
         # If aliasing didn't give us value_date or date, but the source file is a single-column calendar,
         # take that lone column as the date column deterministically.
         if "value_date" not in canon_df.columns and "date" not in canon_df.columns:
@@ -299,75 +457,302 @@ def process_file(cfg: dict, item: dict, conn) -> int:
 
         # detect a date column (canonical or raw)
         if "value_date" in canon_df.columns:
-            canon_df["date"] = parse_dates(canon_df["value_date"], fmts, dayfirst)
+            canon_df["date"] = dates("date", canon_df["value_date"])
         elif "date" in canon_df.columns:
-            canon_df["date"] = parse_dates(canon_df["date"], fmts, dayfirst)
+            canon_df["date"] = dates("date", canon_df["date"])
         else:
             # last resort: if source still has exactly one column, use it
             if df.shape[1] == 1:
-                canon_df["date"] = parse_dates(df.iloc[:, 0], fmts, dayfirst)
+                canon_df["date"] = dates("date", df.iloc[:, 0])
 
         # Optional ints/bools
-        for col in ("day","month","week","quarter","year"):
-            if col in canon_df.columns:
-                canon_df[col] = pd.to_numeric(canon_df[col], errors="coerce").astype("Int64")
-        for col in ("is_month_end","is_year_end"):
-            if col in canon_df.columns:
-                canon_df[col] = canon_df[col].astype(str).str.strip().str.lower().isin(("1","true","yes","y"))
-        to_keep = [c for c in ("date","day","month","week","quarter","year","is_month_end","is_year_end") if c in canon_df.columns]
+        for col in fplan.columns:
+            if col.canon not in canon_df.columns:
+                continue
+            if col.parser == "int":
+                canon_df[col.canon] = pd.to_numeric(canon_df[col.canon], errors="coerce").astype("Int64")
+            elif col.parser == "bool":
+                canon_df[col.canon] = canon_df[col.canon].astype(str).str.strip().str.lower().isin(("1","true","yes","y"))
+        # SRC_GenericCalendar names the date cal_date (as load_src_phase1.py writes it)
+        canon_df = canon_df.rename(columns={"date": "cal_date"})
+        to_keep = [c for c in ("cal_date",) + ip.CALENDAR_INTS + ip.CALENDAR_BOOLS if c in canon_df.columns]
         canon_df = canon_df[to_keep]
 
         # Check parse rate
-        if "date" in canon_df.columns:
-            rate = float(canon_df["date"].notna().mean())
-            if rate < min_date_rate:
-                quarantine_write(item["name"], "calendar_low_date_parse", canon_df)
-                return 0
-        return append_sql(conn, item["target_table"], canon_df)
+        if "cal_date" in canon_df.columns:
+            rate = float(canon_df["cal_date"].notna().mean())
+            if rate < fplan.min_date_rate:
+                rejects.append(("calendar_low_date_parse", raw))
+                return None, rejects
+        return canon_df, rejects
 
     # Non-calendar files
-    # Parse dates & numbers for known canonical fields
-    for dcol in ("value_date","trade_date","settle_date","event_date","evaluation_date"):
-        if dcol in canon_df.columns:
-            canon_df[dcol] = parse_dates(canon_df[dcol], fmts, dayfirst)
-    for ncol in ("qty_raw","price_raw","value_end","inflow","outflow","amount_raw"):
-        if ncol in canon_df.columns:
-            canon_df[ncol] = parse_numbers(canon_df[ncol])
+    # Parse numbers for the plan's numeric fields (dates were already parsed before the required checks)
+    for col in fplan.columns:
+        if col.parser == "number" and col.canon in canon_df.columns:
+            ncol = col.canon
+            with rm.stage("parse_numbers", rows_in=len(canon_df)):
+                conv = fp.number_convention_for(profile, ncol, canon_df[ncol])
+                canon_df[ncol], failed, n = numeric_parse.parse_numeric(canon_df[ncol], **(conv or {}))
+            if stats is not None:
+                acc = stats.setdefault(ncol, [0, 0])
+                acc[0] += failed
+                acc[1] += n
 
     # Map canonical -> target columns
-    colmap = item.get("map", {})
-    out_df = pd.DataFrame()
-    for canon, tgt in colmap.items():
-        if canon in canon_df.columns:
-            out_df[tgt] = canon_df[canon]
-
-    return append_sql(conn, item["target_table"], out_df)
-
-def run_compiler(config_path: Path):
+    with rm.stage("map"):
+        out_df = pd.DataFrame()
+        for canon, tgt in fplan.outputs:
+            if canon in canon_df.columns:
+                out_df[tgt] = canon_df[canon]
+
+    return out_df, rejects
+
+def iter_file_results(cfg: dict, fplan, profile=None, stats=None, frames=None) -> Iterator[tuple]:
+    # Read + transform only (no DB writes): yields (out_df or None, rejects) per frame of the file of `fplan`.
+    # Runs in the calling process or in a --workers process; write_result() applies each result.
+    # `frames` replaces the file read (quarantine redrive: corrected rows indexed by source record number).
+    # Stages 'read' (file read / next chunk, incl. the wait on the prefetch thread) and 'transform'.
+    frames = iter_dataframes(fplan.item, cfg, profile) if frames is None else iter(frames)
+    while True:
+        with rm.stage("read") as st:
+            df = next(frames, None)
+            st.rows_out = 0 if df is None else len(df)
+        if df is None:
+            return
+        with rm.stage("transform", rows_in=len(df)) as st:
+            out_df, rejects = transform_frame(fplan, df, profile, stats)
+            st.rows_out = 0 if out_df is None else len(out_df)
+        yield out_df, rejects
+        if out_df is None:
+            return
+
+def write_result(conn, cfg: dict, fplan, out_df, rejects, batch_id=None, run_id=None):
+    # Single-writer side: SRC_Quarantine + row fingerprints + SRC rows. Returns rows appended, None when the
+    # file is rejected. Rows another delivery already loaded are dropped/flagged here (row_fingerprint.py)
+    item = fplan.item
+    for reason, rej in rejects:
+        with rm.stage("quarantine", rows_in=len(rej)):
+            qr.write(conn, item, reason, rej, batch_id, run_id, cfg)
+    if out_df is None:
+        return None
+    if batch_id is not None and fplan.dedupe != "off":
+        with rm.stage("dedupe", rows_in=len(out_df)) as st:
+            out_df, _ = rf.dedupe(conn, item["target_table"], out_df, batch_id, fplan.dedupe)
+            st.rows_out = len(out_df)
+    if batch_id is not None:
+        out_df = out_df.assign(load_batch_id=batch_id)
+    with rm.stage("append_sql", rows_in=len(out_df)) as st:
+        n = st.rows_out = append_sql(conn, item["target_table"], out_df)
+    return n
+
+def process_file(cfg: dict, item: dict, conn, profile=None, stats=None, batch_id=None, frames=None,
+                 run_id=None, plan=None) -> int:
+    path = BASE / item["path"]
+    if frames is None and not path.exists():
+        return 0
+    fplan = (plan or ip.compile_plan(cfg)).files[item["name"]]
+
+    total = 0
+    with rm.stage(f"file:{item['name']}") as st:
+        for out_df, rejects in iter_file_results(cfg, fplan, profile, stats, frames):
+            n = write_result(conn, cfg, fplan, out_df, rejects, batch_id, run_id)
+            if n is None:
+                total = 0
+                break
+            total += n
+        st.rows_out = total
+    return total
+
+# --- Parallel mode (--workers N) ---
+# Workers parse/normalize/validate whole files and stream their results back over one bounded queue;
+# the main process stays the only SQLite writer (manifest, quarantine, appends, one commit per file).
+_RESULTS = None
+
+def _worker_init(results, date_cache_size: int, metrics_memory: str = None):
+    global _RESULTS
+    _RESULTS = results
+    date_parse.CACHE.clear(date_cache_size)
+    if metrics_memory:
+        rm.start("compiler_worker", memory=metrics_memory)  # stages go back with each file's "done"
+
+def _worker_run(cfg: dict, fplan, profile):
+    name, stats = fplan.name, {}
+    try:
+        for out_df, rejects in iter_file_results(cfg, fplan, profile, stats):
+            _RESULTS.put(("part", name, out_df, rejects))
+        timings = None
+        if rm.ACTIVE is not None:
+            timings, rm.ACTIVE.stats = rm.ACTIVE.stats, {}
+        _RESULTS.put(("done", name, profile, stats, timings))
+    except BaseException:
+        _RESULTS.put(("error", name, traceback.format_exc()))
+
+def _run_parallel(cfg: dict, plan, todo: list, conn, profiles: dict, use_profiles: bool, workers: int, done,
+                  run_id=None):
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+
+    ctx = mp.get_context()
+    results = ctx.Queue(maxsize=2 * workers)  # bounds the frames in flight
+    state = {item["name"]: {"item": item, "batch": bid, "count": 0, "stopped": False}
+             for item, bid in todo}
+    errors = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_worker_init,
+                             initargs=(results, int(cfg.get("date_cache_size", 100000)),
+                                       rm.ACTIVE.memory if rm.ACTIVE is not None else None)) as ex:
+        futures = {ex.submit(_worker_run, cfg, plan.files[item["name"]],
+                             profiles.get(item["name"]) if use_profiles else None): item["name"]
+                   for item, _ in todo}
+        pending = set(state)
+        while pending:
+            try:
+                msg = results.get(timeout=1.0)
+            except queue.Empty:
+                # a worker that died without reporting (killed, unpicklable args) would block us forever
+                lost = [(f, n) for f, n in futures.items() if n in pending and f.done() and f.exception()]
+                if not lost:
+                    continue
+                msg = ("error", lost[0][1], repr(lost[0][0].exception()))
+            kind, name = msg[0], msg[1]
+            st = state[name]
+            if kind == "part":
+                if st["stopped"]:
+                    continue
+                n = write_result(conn, cfg, plan.files[name], msg[2], msg[3], st["batch"], run_id)
+                if n is None:
+                    st["count"], st["stopped"] = 0, True
+                else:
+                    st["count"] += n
+            elif kind == "done":
+                pending.discard(name)
+                if use_profiles:
+                    profiles[name] = msg[2]
+                if msg[4] and rm.ACTIVE is not None:
+                    rm.ACTIVE.merge(msg[4])
+                done(st["item"], st["batch"], st["count"], msg[3])
+            else:
+                pending.discard(name)
+                im.fail_batch(conn, st["batch"], st["item"]["target_table"])
+                errors.append(f"{name}:\n{msg[2]}")
+    if errors:
+        raise RuntimeError("Source Compiler worker(s) failed:\n" + "\n".join(errors))
+
+def run_compiler(config_path: Path, stream: bool = None, use_profiles: bool = None, full: bool = None,
+                 workers: int = None):
     cfg = load_config(config_path)
+    if stream is not None:
+        cfg.setdefault("streaming", {})["enabled"] = stream
+    with rm.stage("plan"):
+        plan = ip.compile_plan(cfg)  # config errors stop the run here, before any file is read
+    if use_profiles is None:
+        use_profiles = bool(cfg.get("profile_cache", True))
+    profiles = fp.load_profiles(config_path) if use_profiles else {}
+    date_parse.CACHE.clear(int(cfg.get("date_cache_size", 100000)))  # memo lives for one run
+    if full is None:
+        full = not bool(cfg.get("incremental", True))
+    if workers is None:
+        workers = int(cfg.get("workers", 1))
     conn = sqlite3.connect(DB)
     totals = {}
-    try:
-        for t in cfg.get("truncate_before_load", []):
-            try:
-                conn.execute(f"DELETE FROM {t}")
-            except Exception:
-                pass
-        conn.commit()
+    run_id = rm.ACTIVE.run_id if rm.ACTIVE is not None else qr.new_run_id()  # SRC_Quarantine / RUN_Metrics run
+
+    def done(item, batch_id, count, stats):
+        with rm.stage("finish_batch"):  # supersede + commit
+            im.finish_batch(conn, batch_id, item["target_table"], count)
+        totals[item["name"]] = count
+        dup = rf.SEEN.pop(batch_id, 0)
+        if dup:
+            mode = plan.files[item["name"]].dedupe
+            print(f"  [{item['name']}] {dup} row(s) already loaded by another delivery "
+                  f"({'dropped' if mode == 'drop' else 'loaded, flagged'})")
+        for col, (failed, n) in stats.items():
+            if failed:
+                print(f"  [{item['name']}] {col}: {failed}/{n} values unparseable ({failed / n:.2%})")
 
-        for item in cfg.get("files", []):
-            count = process_file(cfg, item, conn)
-            totals[item["name"]] = count
+    try:
+        with bl.session(conn, cfg.get("bulk_load")):  # load PRAGMAs + cached schemas for the run
+            im.ensure_schema(conn)
+            phys.ensure(conn)
+            qr.ensure_schema(conn)
+            rf.ensure_schema(conn, sorted({f.target_table for f in plan.files.values() if f.dedupe != "off"}))
+            im.recover(conn)
+            if full:
+                im.reset(conn, cfg.get("truncate_before_load", []))
+
+            skipped, todo = [], []
+            for item in cfg.get("files", []):
+                path, target = BASE / item["path"], item["target_table"]
+                if not path.exists():
+                    totals[item["name"]] = 0
+                    continue
+                # Manifest: unchanged content -> keep the current batch; changed -> load, then swap batches
+                with rm.stage("manifest_check"):  # stat + content hash
+                    info = im.check(conn, target, path, BASE, LOADER)
+                if not info["changed"]:
+                    totals[item["name"]] = 0
+                    skipped.append(item["name"])
+                    continue
+                if use_profiles:
+                    profiles.setdefault(item["name"], {})
+                todo.append((item, im.begin_batch(conn, info, target, LOADER, item["name"])))
+
+            if workers > 1 and len(todo) > 1:
+                _run_parallel(cfg, plan, todo, conn, profiles, use_profiles, min(workers, len(todo)), done, run_id)
+            else:
+                for item, batch_id in todo:
+                    stats = {}
+                    try:
+                        count = process_file(cfg, item, conn, profile=profiles.get(item["name"]), stats=stats,
+                                             batch_id=batch_id, run_id=run_id, plan=plan)
+                    except Exception:
+                        im.fail_batch(conn, batch_id, item["target_table"])
+                        raise
+                    done(item, batch_id, count, stats)
+            totals = {item["name"]: totals.get(item["name"], 0) for item in cfg.get("files", [])}  # config order
+            if todo:
+                qr.retire_redrives(conn)  # redrives of a file that was just redelivered
+                with rm.stage("analyze"):
+                    phys.analyze(conn)  # planner statistics for Move-3
+                rejected = qr.counts(conn, ["source_name", "reason"], run_id=run_id)
+                if not rejected.empty:
+                    print(f"Quarantined (SRC_Quarantine, run {run_id}):")
+                    print(rejected.to_string(index=False))
+            if skipped:
+                print("Unchanged since last load (skipped):", skipped)
     finally:
         conn.commit()
         conn.close()
+        dirty = [p.pop("_dirty", False) for p in profiles.values()]
+        if use_profiles and any(dirty):
+            fp.save_profiles(config_path, profiles)
     return totals
 
 if __name__ == "__main__":
     import argparse
     p = argparse.ArgumentParser()
     p.add_argument("--config", default=str(BASE / r"source-compiler\config\source_generic.yaml"))
+    p.add_argument("--stream", action="store_true", default=None, help="chunked C-engine CSV reads (overrides streaming.enabled)")
+    p.add_argument("--no-profile", dest="profiles", action="store_false", default=None,
+                   help="ignore the learned format profiles and run the full encoding/delimiter/date search")
+    p.add_argument("--full", action="store_true", default=None,
+                   help="truncate_before_load tables and reload every file (ignores the ingestion manifest)")
+    p.add_argument("--workers", type=int, default=None,
+                   help="parse files in N processes (one SQLite writer); 1 = sequential (overrides workers:)")
+    p.add_argument("--check", action="store_true",
+                   help="validate the config and print the compiled plan (alias conflicts included); reads no file")
+    rm.add_arguments(p)
     args = p.parse_args()
-    totals = run_compiler(Path(args.config))
+    if args.check:
+        print(ip.describe(ip.compile_plan(load_config(Path(args.config)))))
+        sys.exit(0)
+    rm.start_from_args("compiler", args)
+    totals = run_compiler(Path(args.config), stream=args.stream, use_profiles=args.profiles, full=args.full,
+                          workers=args.workers)
     print("Compiler totals:", totals)
-    print("Quarantine folder:", QDIR)
+    print(f"Date cache: {date_parse.CACHE.hits} hits, {date_parse.CACHE.misses} parsed")
+    print("Quarantine: python quarantine.py counts | export <csv> | redrive <csv>")
+    if rm.ACTIVE is not None:
+        conn = sqlite3.connect(DB)
+        rm.finish(conn)
+        conn.close()